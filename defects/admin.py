@@ -1,6 +1,10 @@
 from django.contrib import admin
+from django.utils.html import format_html, format_html_join
 
-from .models import Attachment, Comment, Defect, DefectHistory, Project, ProjectStage
+from .archive import unpack_events
+
+from .models import Attachment, AttachmentBlob, Comment, Defect, DefectHistory, DefectHistoryArchive, DefectStatusRollup, ExportJob, Project, ProjectStage, ReportState
+from .pagination import EstimatedCountPaginator
 
 
 @admin.register(Project)
@@ -33,11 +37,30 @@ class DefectAdmin(admin.ModelAdmin):
 	search_fields = ('title', 'description')
 	autocomplete_fields = ('executor',)
 	inlines = (AttachmentInline, CommentInline)
+	# Без точного COUNT(*) по всей таблице на каждой странице списка
+	paginator = EstimatedCountPaginator
+	show_full_result_count = False
 
 
 @admin.register(Attachment)
 class AttachmentAdmin(admin.ModelAdmin):
-	list_display = ('defect', 'file', 'uploaded_at')
+	list_display = ('defect', 'original_name', 'file', 'uploaded_at')
+	raw_id_fields = ('blob',)
+
+
+@admin.register(AttachmentBlob)
+class AttachmentBlobAdmin(admin.ModelAdmin):
+	list_display = ('sha256', 'size', 'refcount', 'derivatives_status', 'created_at')
+	list_filter = ('derivatives_status',)
+	search_fields = ('sha256',)
+	# Счётчик ссылок ведёт defects.blobs, копии — worker run_derivative_jobs
+	readonly_fields = (
+		'sha256', 'file', 'size', 'refcount', 'created_at',
+		'derivatives_status', 'thumbnail', 'preview', 'derivatives_error',
+	)
+
+	def has_add_permission(self, request):
+		return False
 
 
 @admin.register(Comment)
@@ -51,3 +74,56 @@ class DefectHistoryAdmin(admin.ModelAdmin):
 	list_display = ('defect', 'action', 'changed_by', 'created_at')
 	list_filter = ('action', 'created_at')
 	search_fields = ('defect__title', 'changed_by__username')
+	paginator = EstimatedCountPaginator
+	show_full_result_count = False
+
+
+@admin.register(DefectHistoryArchive)
+class DefectHistoryArchiveAdmin(admin.ModelAdmin):
+	"""Только чтение: архив пишет команда archive_defect_history."""
+
+	list_display = ('defect', 'events_count', 'first_event_at', 'last_event_at', 'archived_at')
+	search_fields = ('defect__title',)
+	raw_id_fields = ('defect',)
+	fields = ('defect', 'events_count', 'first_event_at', 'last_event_at', 'archived_at', 'events')
+	readonly_fields = fields
+
+	def has_add_permission(self, request):
+		return False
+
+	def has_change_permission(self, request, obj=None):
+		return False
+
+	@admin.display(description='События')
+	def events(self, obj):
+		actions = dict(DefectHistory.Action.choices)
+		rows = format_html_join(
+			'',
+			'<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>',
+			(
+				(event['created_at'], actions.get(event['action'], event['action']), event['changed_by_id'] or '—', event['changes'])
+				for event in unpack_events(obj.data)
+			),
+		)
+		return format_html('<table><tr><th>Когда</th><th>Действие</th><th>Пользователь (id)</th><th>Изменения</th></tr>{}</table>', rows)
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+	list_display = ('id', 'user', 'format', 'status', 'processed_rows', 'total_rows', 'created_at', 'expires_at')
+	list_filter = ('status', 'format')
+	search_fields = ('user__username',)
+	readonly_fields = ('created_at', 'started_at', 'finished_at')
+
+
+@admin.register(DefectStatusRollup)
+class DefectStatusRollupAdmin(admin.ModelAdmin):
+	list_display = ('project', 'status', 'priority', 'total')
+	list_filter = ('status', 'priority', 'project')
+	readonly_fields = ('project', 'status', 'priority', 'total')
+
+
+@admin.register(ReportState)
+class ReportStateAdmin(admin.ModelAdmin):
+	list_display = ('name', 'watermark', 'updated_at')
+	readonly_fields = ('name', 'watermark', 'state', 'updated_at')
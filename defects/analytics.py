@@ -0,0 +1,225 @@
+"""Сводная аналитика по дефектам за один проход по таблице.
+
+Нужные колонки выбираются одним запросом (курсором, без создания моделей) и
+порциями упаковываются в матрицу int32: статус и приоритет — коды, даты — номер
+дня от 1970-01-01 по местному времени. Все разрезы (проекты, исполнители,
+приоритеты, сроки, недели) считаются по ней векторно через NumPy: np.bincount
+по составному индексу вместо GROUP BY на каждый виджет.
+
+Дата закрытия в модели не хранится, поэтому для закрытых дефектов она
+приближённо берётся из updated_at.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.utils import timezone
+
+from .models import Defect, Project
+
+
+ANALYTICS_CHUNK_SIZE = 10_000
+ANALYTICS_WEEKS = 12
+# Больше строк на графике не читается: остальные сворачиваются в «Прочие»
+ANALYTICS_TOP_ROWS = 15
+
+STATUS_KEYS = [key for key, _ in Defect.Status.choices]
+PRIORITY_KEYS = [key for key, _ in Defect.Priority.choices]
+_STATUS_CODES = {key: code for code, key in enumerate(STATUS_KEYS)}
+_PRIORITY_CODES = {key: code for code, key in enumerate(PRIORITY_KEYS)}
+
+_OPEN_CODES = [STATUS_KEYS.index(status) for status in Defect.OPEN_STATUSES]
+_CLOSED_CODE = STATUS_KEYS.index(Defect.Status.CLOSED)
+
+_EPOCH = dt.datetime(1970, 1, 1)
+_EPOCH_UTC = _EPOCH.replace(tzinfo=dt.timezone.utc)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+
+# Колонки матрицы в порядке values_list
+PROJECT, EXECUTOR, STATUS, PRIORITY, DEADLINE, CREATED, UPDATED = range(7)
+
+
+@dataclass
+class Pivot:
+	"""Разрез для графика: подписи строк и серии значений по ним."""
+
+	labels: list[str]
+	series: dict[str, list[int]] = field(default_factory=dict)
+
+
+@dataclass
+class DefectBreakdowns:
+	total: int
+	by_project: Pivot
+	by_executor: Pivot
+	by_priority: Pivot
+	deadlines: Pivot
+	weekly: Pivot
+
+	def as_dict(self) -> dict:
+		return asdict(self)
+
+
+def _days(values) -> np.ndarray:
+	"""date -> номер дня от 1970-01-01."""
+
+	return np.fromiter((value.toordinal() for value in values), dtype=np.int64, count=len(values)) - _EPOCH_ORDINAL
+
+
+def _local_days(values, utc_offset: int) -> np.ndarray:
+	"""datetime из БД (UTC: naive в SQLite, aware в PostgreSQL) -> номер местного дня.
+
+	Разность с эпохой заметно дешевле, чем np.array(..., dtype='datetime64').
+	"""
+
+	epoch = _EPOCH_UTC if values[0].tzinfo else _EPOCH
+	seconds = np.fromiter(((value - epoch).total_seconds() for value in values), dtype=np.float64, count=len(values))
+	return ((seconds + utc_offset) // 86400).astype(np.int64)
+
+
+def load_defect_matrix(queryset, *, chunk_size: int = ANALYTICS_CHUNK_SIZE) -> np.ndarray:
+	"""Матрица (N, 7) int32: проект, исполнитель (0 — не назначен), код статуса,
+	код приоритета и номера дней deadline, создания и обновления."""
+
+	qs = queryset.order_by().values_list(
+		'project_id', 'executor_id', 'status', 'priority', 'deadline', 'created_at', 'updated_at'
+	)
+	sql, params = qs.query.sql_with_params()
+	# Смещение берётся на текущий момент: для зоны без перехода на летнее время
+	# (Europe/Moscow) это точное значение
+	utc_offset = int(timezone.localtime().utcoffset().total_seconds())
+
+	parts = []
+	# chunked_cursor — серверный курсор на PostgreSQL, как у QuerySet.iterator()
+	with connections[qs.db].chunked_cursor() as cursor:
+		cursor.execute(sql, params)
+		while chunk := cursor.fetchmany(chunk_size):
+			projects, executors, statuses, priorities, deadlines, created, updated = zip(*chunk)
+			part = np.empty((len(chunk), 7), dtype=np.int32)
+			part[:, PROJECT] = projects
+			part[:, EXECUTOR] = [executor or 0 for executor in executors]
+			part[:, STATUS] = [_STATUS_CODES[status] for status in statuses]
+			part[:, PRIORITY] = [_PRIORITY_CODES[priority] for priority in priorities]
+			part[:, DEADLINE] = _days(deadlines)
+			part[:, CREATED] = _local_days(created, utc_offset)
+			part[:, UPDATED] = _local_days(updated, utc_offset)
+			parts.append(part)
+	if not parts:
+		return np.empty((0, 7), dtype=np.int32)
+	return np.concatenate(parts)
+
+
+def _week_index(days: np.ndarray) -> np.ndarray:
+	# 1970-01-01 — четверг: сдвиг на 3 дня выравнивает недели по понедельникам
+	return (days.astype(np.int64) + 3) // 7
+
+
+def _crosstab(keys: np.ndarray, codes: np.ndarray, width: int) -> tuple[np.ndarray, np.ndarray]:
+	"""Уникальные ключи и матрица (ключ x код) числа строк."""
+
+	unique, inverse = np.unique(keys, return_inverse=True)
+	counts = np.bincount(inverse * width + codes, minlength=len(unique) * width)
+	return unique, counts.reshape(len(unique), width)
+
+
+def _top_rows(labels: list[str], table: np.ndarray, limit: int) -> tuple[list[str], np.ndarray]:
+	"""Оставляет limit самых больших строк, остальные суммирует в «Прочие»."""
+
+	order = np.argsort(-table.sum(axis=1), kind='stable')
+	if len(order) <= limit:
+		return [labels[i] for i in order], table[order]
+	head, tail = order[:limit], order[limit:]
+	return [labels[i] for i in head] + ['Прочие'], np.vstack([table[head], table[tail].sum(axis=0)])
+
+
+def _pivot(labels: list[str], table: np.ndarray, columns: list[str]) -> Pivot:
+	return Pivot(labels=labels, series={column: table[:, i].tolist() for i, column in enumerate(columns)})
+
+
+def compute_breakdowns(
+	queryset=None,
+	*,
+	today: dt.date | None = None,
+	weeks: int = ANALYTICS_WEEKS,
+	top: int = ANALYTICS_TOP_ROWS,
+) -> DefectBreakdowns:
+	"""Считает все разрезы аналитики по дефектам из queryset (по умолчанию — все)."""
+
+	if queryset is None:
+		queryset = Defect.objects.all()
+	today = np.datetime64(today or timezone.localdate(), 'D').astype(np.int64)
+	matrix = load_defect_matrix(queryset)
+
+	status = matrix[:, STATUS]
+	is_open = np.isin(status, _OPEN_CODES)
+	is_closed = status == _CLOSED_CODE
+	deadline = matrix[:, DEADLINE]
+	updated = matrix[:, UPDATED]
+	overdue = is_open & (deadline < today)
+	closed_late = is_closed & (updated > deadline)
+
+	status_labels = [label for _, label in Defect.Status.choices]
+
+	project_ids, by_project = _crosstab(matrix[:, PROJECT], status, len(STATUS_KEYS))
+	names = Project.objects.in_bulk(project_ids.tolist())
+	project_labels = [names[pk].name if pk in names else f'#{pk}' for pk in project_ids.tolist()]
+	project_labels, by_project = _top_rows(project_labels, by_project, top)
+
+	# По исполнителю: открытые (в срок / просроченные) и закрытые
+	executor_codes = np.where(overdue, 1, np.where(is_open, 0, np.where(is_closed, 2, 3)))
+	executor_ids, by_executor = _crosstab(matrix[:, EXECUTOR], executor_codes, 4)
+	# Исполнители, у которых только отменённые дефекты, на графике не нужны
+	active = by_executor[:, :3].any(axis=1)
+	executor_ids, by_executor = executor_ids[active], by_executor[active, :3]
+	usernames = dict(
+		get_user_model().objects.filter(pk__in=executor_ids.tolist()).values_list('pk', 'username')
+	)
+	executor_labels = [usernames.get(pk, 'Не назначен' if not pk else f'#{pk}') for pk in executor_ids.tolist()]
+	executor_labels, by_executor = _top_rows(executor_labels, by_executor, top)
+
+	by_priority = np.bincount(
+		matrix[:, PRIORITY] * len(STATUS_KEYS) + status,
+		minlength=len(PRIORITY_KEYS) * len(STATUS_KEYS),
+	).reshape(len(PRIORITY_KEYS), len(STATUS_KEYS))
+
+	deadlines = Pivot(
+		labels=['Открыты, в срок', 'Открыты, просрочены', 'Закрыты в срок', 'Закрыты с опозданием'],
+		series={
+			'Количество': [
+				int(np.count_nonzero(is_open & ~overdue)),
+				int(np.count_nonzero(overdue)),
+				int(np.count_nonzero(is_closed & ~closed_late)),
+				int(np.count_nonzero(closed_late)),
+			]
+		},
+	)
+
+	# Последние `weeks` недель, включая текущую
+	last_week = int(_week_index(today))
+	first_week = last_week - weeks + 1
+	created_weeks = _week_index(matrix[:, CREATED]) - first_week
+	closed_weeks = _week_index(updated[is_closed]) - first_week
+	created_weeks = created_weeks[(created_weeks >= 0) & (created_weeks < weeks)]
+	closed_weeks = closed_weeks[(closed_weeks >= 0) & (closed_weeks < weeks)]
+	week_starts = (np.arange(first_week, last_week + 1) * 7 - 3).astype('datetime64[D]')
+	weekly = Pivot(
+		labels=[str(day) for day in week_starts],
+		series={
+			'Создано': np.bincount(created_weeks, minlength=weeks).tolist(),
+			'Закрыто': np.bincount(closed_weeks, minlength=weeks).tolist(),
+		},
+	)
+
+	return DefectBreakdowns(
+		total=len(matrix),
+		by_project=_pivot(project_labels, by_project, status_labels),
+		by_executor=_pivot(executor_labels, by_executor, ['Открыты, в срок', 'Просрочены', 'Закрыты']),
+		by_priority=_pivot([label for _, label in Defect.Priority.choices], by_priority, status_labels),
+		deadlines=deadlines,
+		weekly=weekly,
+	)
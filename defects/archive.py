@@ -0,0 +1,150 @@
+"""Архивация истории закрытых и отменённых дефектов.
+
+В архив уходят события DefectHistory старше заданного возраста у дефектов,
+которые закрыты или отменены и с тех пор не менялись. События одного
+дефекта упаковываются в DefectHistoryArchive (JSON, сжатый zlib) и удаляются
+из DefectHistory в одной транзакции с записью архива — событие не может
+пропасть или задвоиться при сбое посреди запуска.
+
+Архив читается по запросу: load_archived_history() восстанавливает события
+как несохранённые экземпляры DefectHistory, поэтому их выводят те же шаблоны,
+что и живую историю (карточка дефекта, админка).
+
+Агрегаты SLA (defects.sla) перед архивацией догоняются инкрементально, так
+что перенесённые события в отчёте уже учтены; полный пересчёт (--full)
+видит только живую историю. Если архивированный дефект переоткроют, его
+лента в инкрементальном режиме начнётся с первого живого события.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+import zlib
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import bump_version
+from .models import Defect, DefectHistory, DefectHistoryArchive
+from .sla import update_sla_report
+
+
+ARCHIVE_STATUSES = (Defect.Status.CLOSED, Defect.Status.CANCELLED)
+# Дефектов в одной транзакции архивации
+ARCHIVE_BATCH_SIZE = 200
+
+_EVENT_FIELDS = ('id', 'action', 'changes', 'created_at', 'changed_by_id')
+
+
+@dataclass
+class ArchiveResult:
+	defects: int = 0
+	events: int = 0
+	raw_bytes: int = 0
+	compressed_bytes: int = 0
+
+
+def pack_events(events: list[dict]) -> tuple[bytes, int]:
+	"""Сжатый JSON событий и размер несжатого JSON."""
+
+	raw = json.dumps(events, ensure_ascii=False, separators=(',', ':'), default=str).encode()
+	return zlib.compress(raw, 9), len(raw)
+
+
+def unpack_events(data: bytes) -> list[dict]:
+	return json.loads(zlib.decompress(bytes(data)))
+
+
+def archivable_defects(cutoff: dt.datetime, *, using: str = 'default'):
+	"""Закрытые/отменённые до cutoff дефекты, у которых есть события старше cutoff."""
+
+	old_events = DefectHistory.objects.using(using).filter(defect=OuterRef('pk'), created_at__lt=cutoff)
+	return Defect.objects.using(using).filter(status__in=ARCHIVE_STATUSES, updated_at__lt=cutoff).filter(Exists(old_events))
+
+
+def _archive_batch(defect_ids: list[int], cutoff: dt.datetime, result: ArchiveResult, *, dry_run: bool, using: str) -> None:
+	events = DefectHistory.objects.using(using).filter(defect_id__in=defect_ids, created_at__lt=cutoff)
+	grouped: dict[int, list[dict]] = {}
+	for row in events.order_by('defect_id', 'created_at', 'id').values('defect_id', *_EVENT_FIELDS):
+		defect_id = row.pop('defect_id')
+		row['created_at'] = row['created_at'].isoformat()
+		grouped.setdefault(defect_id, []).append(row)
+
+	archives = []
+	for defect_id, rows in grouped.items():
+		data, raw_size = pack_events(rows)
+		result.defects += 1
+		result.events += len(rows)
+		result.raw_bytes += raw_size
+		result.compressed_bytes += len(data)
+		archives.append(
+			DefectHistoryArchive(
+				defect_id=defect_id,
+				events_count=len(rows),
+				first_event_at=parse_datetime(rows[0]['created_at']),
+				last_event_at=parse_datetime(rows[-1]['created_at']),
+				data=data,
+			)
+		)
+	if dry_run or not archives:
+		return
+	DefectHistoryArchive.objects.using(using).bulk_create(archives)
+	# Тот же предикат, что и при чтении: на секционированной таблице
+	# условие по created_at отсекает секции свежих месяцев
+	events.delete()
+
+
+def archive_defect_history(
+	*,
+	older_than: dt.timedelta | None = None,
+	batch_size: int = ARCHIVE_BATCH_SIZE,
+	dry_run: bool = False,
+	using: str = 'default',
+) -> ArchiveResult:
+	"""Переносит старую историю закрытых/отменённых дефектов в архив."""
+
+	if older_than is None:
+		older_than = dt.timedelta(days=settings.HISTORY_ARCHIVE_AFTER_DAYS)
+	cutoff = timezone.now() - older_than
+	result = ArchiveResult()
+	if not dry_run:
+		update_sla_report(using=using)
+	defect_ids = list(archivable_defects(cutoff, using=using).order_by('pk').values_list('pk', flat=True))
+	for start in range(0, len(defect_ids), batch_size):
+		with transaction.atomic(using=using):
+			_archive_batch(defect_ids[start:start + batch_size], cutoff, result, dry_run=dry_run, using=using)
+	if result.events and not dry_run:
+		bump_version()
+	return result
+
+
+def archived_events_count(defect: Defect) -> int:
+	return sum(defect.history_archives.values_list('events_count', flat=True))
+
+
+def load_archived_history(defect: Defect) -> list[DefectHistory]:
+	"""Архивные события дефекта, новые сверху (как DefectHistory.Meta.ordering)."""
+
+	rows = [row for archive in defect.history_archives.all() for row in unpack_events(archive.data)]
+	users = get_user_model().objects.in_bulk({row['changed_by_id'] for row in rows if row['changed_by_id']})
+	entries = []
+	for row in rows:
+		entry = DefectHistory(
+			id=row['id'],
+			defect=defect,
+			action=row['action'],
+			changes=row['changes'],
+			created_at=parse_datetime(row['created_at']),
+			changed_by_id=row['changed_by_id'],
+		)
+		# Удалённый пользователь — как SET_NULL в живой истории
+		entry.changed_by = users.get(row['changed_by_id'])
+		entries.append(entry)
+	entries.sort(key=lambda entry: (entry.created_at, entry.id), reverse=True)
+	return entries
@@ -0,0 +1,491 @@
+"""Резервные копии БД (команда backup_db).
+
+SQLite копируется онлайн через backup API (sqlite3.Connection.backup)
+порциями по pages страниц: между порциями блокировка снимается, и запись в
+рабочую базу продолжается. Если базу изменило другое соединение, SQLite
+начинает копирование заново — копия всегда согласована, но при непрерывной
+записи пошаговая копия может не закончиться никогда. Поэтому после
+BACKUP_MAX_RESTARTS перезапусков копия делается одним шагом: в режиме WAL
+это одна читающая транзакция, писатели не ждут; в режиме журнала отката
+запись ждёт конца копирования. Готовый файл потоково сжимается (gzip/xz) без
+чтения в память.
+
+PostgreSQL выгружается pg_dump в формате directory с -j N параллельными
+процессами; каждая таблица сжимается самим pg_dump (-Z). Такой дамп
+восстанавливается pg_restore тоже параллельно.
+
+Старые копии удаляются по числу хранимых (retention): в out_dir остаётся
+keep последних копий каждого вида. Имя копии несёт метку времени stamp; ту же
+метку получает снимок медиа (defects.media_backup), снятый тем же запуском.
+
+Рядом с каждой копией лежит манифест <копия>.manifest.json: число строк в
+каждой таблице моделей на момент копии. Для SQLite строки считаются в самой
+копии, для PostgreSQL — в том же снимке (pg_export_snapshot), который
+выгружает pg_dump. По манифесту restore_db и verify_backup проверяют, что
+восстановленная база совпадает с исходной.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import lzma
+import os
+import shutil
+import subprocess
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+from django.apps import apps
+
+
+BACKUP_PAGES_PER_STEP = 1024
+BACKUP_MAX_RESTARTS = 3
+COPY_CHUNK_SIZE = 1024 * 1024
+COMPRESSIONS = {'gzip': '.gz', 'xz': '.xz', 'none': ''}
+
+SQLITE_PREFIX = 'db_'
+POSTGRES_PREFIX = 'pg_'
+MANIFEST_SUFFIX = '.manifest.json'
+
+
+class BackupError(Exception):
+	"""Копию создать не удалось (нет pg_dump, ошибка дампа и т.п.)."""
+
+
+class _BackupRestarted(Exception):
+	pass
+
+
+@dataclass
+class BackupResult:
+	path: Path
+	source_bytes: int
+	size_bytes: int
+	seconds: float
+	row_counts: dict[str, int] = field(default_factory=dict)
+
+	@property
+	def throughput(self) -> float:
+		"""МБ/с по объёму исходной БД."""
+
+		return self.source_bytes / 1024 / 1024 / self.seconds if self.seconds else 0.0
+
+
+def timestamp() -> str:
+	return datetime.now().strftime('%Y%m%d_%H%M%S')
+
+
+def path_size(path: Path) -> int:
+	if path.is_dir():
+		return sum(item.stat().st_size for item in path.rglob('*') if item.is_file())
+	return path.stat().st_size
+
+
+def model_tables() -> dict[str, str]:
+	"""Метка модели (app_label.Model) -> таблица, включая автоматические таблицы M2M."""
+
+	return {
+		model._meta.label: model._meta.db_table
+		for model in apps.get_models(include_auto_created=True)
+		if model._meta.managed and not model._meta.proxy
+	}
+
+
+def count_rows(cursor, existing_tables: set[str], quote_name) -> dict[str, int]:
+	"""Число строк по моделям; модели без таблицы в базе пропускаются."""
+
+	counts = {}
+	for label, table in sorted(model_tables().items()):
+		if table in existing_tables:
+			cursor.execute(f'SELECT COUNT(*) FROM {quote_name(table)}')
+			counts[label] = cursor.fetchone()[0]
+	return counts
+
+
+def _sqlite_quote(name: str) -> str:
+	return '"{}"'.format(name.replace('"', '""'))
+
+
+def sqlite_row_counts(path: Path) -> dict[str, int]:
+	import sqlite3
+
+	database = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+	try:
+		cursor = database.cursor()
+		cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+		existing = {row[0] for row in cursor.fetchall()}
+		return count_rows(cursor, existing, _sqlite_quote)
+	finally:
+		database.close()
+
+
+def manifest_path(backup: Path) -> Path:
+	return backup.with_name(backup.name + MANIFEST_SUFFIX)
+
+
+def write_backup_manifest(result: BackupResult, *, vendor: str) -> Path:
+	path = manifest_path(result.path)
+	data = {
+		'vendor': vendor,
+		'backup': result.path.name,
+		'source_bytes': result.source_bytes,
+		'size_bytes': result.size_bytes,
+		'seconds': round(result.seconds, 3),
+		'rows': result.row_counts,
+	}
+	path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+	return path
+
+
+def read_backup_manifest(backup: Path) -> dict | None:
+	path = manifest_path(backup)
+	if not path.exists():
+		return None
+	return json.loads(path.read_text(encoding='utf-8'))
+
+
+def compare_row_counts(expected: dict[str, int], actual: dict[str, int]) -> list[tuple[str, int | None, int | None]]:
+	"""Расхождения (модель, в манифесте, в восстановленной базе)."""
+
+	return [
+		(label, expected.get(label), actual.get(label))
+		for label in sorted(expected.keys() | actual.keys())
+		if expected.get(label) != actual.get(label)
+	]
+
+
+def _open_compressed(path: Path, compression: str):
+	if compression == 'gzip':
+		# mtime=0: одинаковая БД даёт байт в байт одинаковый архив
+		return gzip.GzipFile(path, 'wb', compresslevel=6, mtime=0)
+	if compression == 'xz':
+		return lzma.open(path, 'wb', preset=6)
+	return open(path, 'wb')
+
+
+def compress_file(src: Path, dst: Path, compression: str) -> None:
+	"""Потоковое сжатие src в dst порциями по COPY_CHUNK_SIZE."""
+
+	with open(src, 'rb') as source, _open_compressed(dst, compression) as target:
+		shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+
+
+def decompress_file(src: Path, dst: Path) -> None:
+	"""Обратное к compress_file; сжатие определяется по расширению src."""
+
+	opener = {'.gz': gzip.open, '.xz': lzma.open}.get(src.suffix, open)
+	with opener(src, 'rb') as source, open(dst, 'wb') as target:
+		shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+
+
+def backup_sqlite(
+	connection,
+	out_dir: Path,
+	*,
+	compression: str = 'gzip',
+	pages: int = BACKUP_PAGES_PER_STEP,
+	name: str | None = None,
+	stamp: str | None = None,
+) -> BackupResult:
+	"""Онлайн-копия SQLite-базы соединения Django (sqlite3 backup API).
+
+	Копирует отдельное соединение с теми же параметрами: у соединения Django
+	может быть открыта транзакция, и шаги копии ждали бы её бесконечно.
+	"""
+
+	import sqlite3
+
+	name = name or f'{SQLITE_PREFIX}{stamp or timestamp()}.sqlite3{COMPRESSIONS[compression]}'
+	dst = out_dir / name
+	tmp = out_dir / f'.{name}.tmp'
+	started = time.perf_counter()
+	source = connection.get_new_connection(connection.get_connection_params())
+	remaining = None
+	restarts = 0
+
+	def progress(status, left, total):
+		nonlocal remaining, restarts
+		# Осталось больше, чем после прошлого шага: другое соединение изменило базу
+		if remaining is not None and left > remaining:
+			restarts += 1
+			if restarts >= BACKUP_MAX_RESTARTS:
+				raise _BackupRestarted
+		remaining = left
+
+	try:
+		target = sqlite3.connect(tmp)
+		try:
+			try:
+				source.backup(target, pages=pages, progress=progress)
+			except _BackupRestarted:
+				source.backup(target, pages=-1)
+		finally:
+			target.close()
+			source.close()
+		source_bytes = tmp.stat().st_size
+		row_counts = sqlite_row_counts(tmp)
+		if compression == 'none':
+			os.replace(tmp, dst)
+		else:
+			compress_file(tmp, dst, compression)
+	finally:
+		tmp.unlink(missing_ok=True)
+	return BackupResult(dst, source_bytes, dst.stat().st_size, time.perf_counter() - started, row_counts)
+
+
+def _pg_env(settings_dict: dict) -> dict:
+	env = os.environ.copy()
+	if settings_dict.get('PASSWORD'):
+		env['PGPASSWORD'] = str(settings_dict['PASSWORD'])
+	return env
+
+
+def _pg_connection_args(settings_dict: dict) -> list[str]:
+	return [
+		'--host',
+		str(settings_dict.get('HOST') or 'localhost'),
+		'--port',
+		str(settings_dict.get('PORT') or 5432),
+		'--username',
+		str(settings_dict.get('USER') or ''),
+	]
+
+
+def _pg_tables(cursor) -> set[str]:
+	cursor.execute(
+		"SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+		"WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p')"
+	)
+	return {row[0] for row in cursor.fetchall()}
+
+
+def _run_pg(cmd: list[str], settings_dict: dict, tool: str) -> None:
+	try:
+		proc = subprocess.run(cmd, env=_pg_env(settings_dict), capture_output=True, text=True, check=False)
+	except FileNotFoundError as exc:
+		raise BackupError(
+			f'{tool} не найден. Установите PostgreSQL client tools '
+			f'или запустите {tool} внутри контейнера (см. docs/backup.md).'
+		) from exc
+	if proc.returncode != 0:
+		raise BackupError(f'{tool} failed: {proc.stderr.strip() or proc.stdout.strip()}')
+
+
+def backup_postgres(
+	connection,
+	out_dir: Path,
+	*,
+	jobs: int = 1,
+	compress_level: int = 6,
+	name: str | None = None,
+	stamp: str | None = None,
+) -> BackupResult:
+	"""pg_dump --format=directory -j jobs; размер источника — pg_database_size().
+
+	Строки для манифеста считаются в транзакции REPEATABLE READ, чей снимок
+	экспортируется и передаётся pg_dump --snapshot: дамп и счётчики видят
+	одни и те же данные, сколько бы ни писали в базу во время выгрузки.
+	"""
+
+	from django.db import transaction
+
+	settings_dict = connection.settings_dict
+	dst = out_dir / (name or f'{POSTGRES_PREFIX}{stamp or timestamp()}.dir')
+	started = time.perf_counter()
+	with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+		cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+		cursor.execute('SELECT pg_export_snapshot(), pg_database_size(current_database())')
+		snapshot, source_bytes = cursor.fetchone()
+		row_counts = count_rows(cursor, _pg_tables(cursor), connection.ops.quote_name)
+
+		cmd = [
+			'pg_dump',
+			'--format=directory',
+			f'--jobs={jobs}',
+			f'--compress={compress_level}',
+			f'--snapshot={snapshot}',
+			'--file',
+			str(dst),
+			*_pg_connection_args(settings_dict),
+			str(settings_dict.get('NAME') or ''),
+		]
+		try:
+			_run_pg(cmd, settings_dict, 'pg_dump')
+		except BackupError:
+			shutil.rmtree(dst, ignore_errors=True)
+			raise
+	return BackupResult(dst, source_bytes, path_size(dst), time.perf_counter() - started, row_counts)
+
+
+def list_backups(out_dir: Path, prefix: str) -> list[Path]:
+	"""Копии с данным префиксом от старых к новым (имя несёт метку времени), без манифестов."""
+
+	if not out_dir.is_dir():
+		return []
+	return sorted(
+		path
+		for path in out_dir.iterdir()
+		if path.name.startswith(prefix) and not path.name.endswith(MANIFEST_SUFFIX)
+	)
+
+
+def rotate_backups(out_dir: Path, prefix: str, keep: int) -> list[Path]:
+	"""Удаляет копии с данным префиксом (и их манифесты), кроме keep последних."""
+
+	if keep <= 0:
+		return []
+	removed = list_backups(out_dir, prefix)[:-keep]
+	for path in removed:
+		if path.is_dir():
+			shutil.rmtree(path)
+		else:
+			path.unlink()
+		manifest_path(path).unlink(missing_ok=True)
+	return removed
+
+
+def backup_vendor(backup: Path) -> str:
+	"""sqlite или postgresql по виду копии: каталог или .dump — дамп pg_dump."""
+
+	if backup.is_dir() or backup.suffix == '.dump':
+		return 'postgresql'
+	return 'sqlite'
+
+
+@dataclass
+class RestoreResult:
+	seconds: float
+	row_counts: dict[str, int]
+
+
+def restore_sqlite(backup: Path, connection) -> RestoreResult:
+	"""Восстанавливает копию в базу соединения через backup API.
+
+	Файл базы не подменяется: копия переливается в открытую базу, поэтому
+	файлы -wal/-shm и другие соединения остаются согласованными.
+	"""
+
+	import sqlite3
+	import tempfile
+
+	started = time.perf_counter()
+	with tempfile.TemporaryDirectory() as tmp:
+		plain = Path(tmp) / 'restore.sqlite3'
+		decompress_file(backup, plain)
+		source = sqlite3.connect(plain)
+		target = connection.get_new_connection(connection.get_connection_params())
+		try:
+			source.backup(target)
+		finally:
+			source.close()
+			target.close()
+	# Соединение Django могло держать кэш схемы старой базы
+	connection.close()
+	with connection.cursor() as cursor:
+		existing = set(connection.introspection.table_names(cursor))
+		row_counts = count_rows(cursor, existing, connection.ops.quote_name)
+	return RestoreResult(time.perf_counter() - started, row_counts)
+
+
+def restore_postgres(backup: Path, settings_dict: dict, *, jobs: int = 1, dbname: str | None = None) -> float:
+	"""pg_restore -j jobs (каталог или custom-формат) в dbname; секунды."""
+
+	cmd = [
+		'pg_restore',
+		f'--jobs={jobs}',
+		'--clean',
+		'--if-exists',
+		'--no-owner',
+		'--exit-on-error',
+		*_pg_connection_args(settings_dict),
+		'--dbname',
+		dbname or str(settings_dict.get('NAME') or ''),
+		str(backup),
+	]
+	started = time.perf_counter()
+	_run_pg(cmd, settings_dict, 'pg_restore')
+	return time.perf_counter() - started
+
+
+@dataclass
+class VerifyResult:
+	backup: Path
+	restore_seconds: float
+	check_seconds: float
+	row_counts: dict[str, int]
+	expected: dict[str, int] | None
+	mismatches: list[tuple[str, int | None, int | None]]
+	integrity: str = 'ok'
+
+	@property
+	def ok(self) -> bool:
+		return not self.mismatches and self.integrity == 'ok'
+
+
+def verify_sqlite(backup: Path) -> VerifyResult:
+	"""Распаковывает копию во временный файл, проверяет integrity_check и строки."""
+
+	import sqlite3
+	import tempfile
+
+	manifest = read_backup_manifest(backup)
+	expected = manifest['rows'] if manifest else None
+	with tempfile.TemporaryDirectory() as tmp:
+		plain = Path(tmp) / 'verify.sqlite3'
+		started = time.perf_counter()
+		decompress_file(backup, plain)
+		restored = time.perf_counter()
+		database = sqlite3.connect(plain)
+		try:
+			integrity = '; '.join(row[0] for row in database.execute('PRAGMA integrity_check'))
+			row_counts = sqlite_row_counts(plain)
+		except sqlite3.DatabaseError as exc:
+			# Битая копия: не падаем, а сообщаем как непройденную проверку
+			integrity, row_counts = str(exc), {}
+		finally:
+			database.close()
+		checked = time.perf_counter()
+	return VerifyResult(
+		backup=backup,
+		restore_seconds=restored - started,
+		check_seconds=checked - restored,
+		row_counts=row_counts,
+		expected=expected,
+		mismatches=compare_row_counts(expected, row_counts) if expected is not None else [],
+		integrity=integrity,
+	)
+
+
+def verify_postgres(backup: Path, connection, *, jobs: int = 1) -> VerifyResult:
+	"""pg_restore -j в одноразовую базу <NAME>_verify_<метка>, подсчёт строк, DROP DATABASE."""
+
+	manifest = read_backup_manifest(backup)
+	expected = manifest['rows'] if manifest else None
+	scratch = f"{connection.settings_dict['NAME']}_verify_{timestamp()}"
+	quoted = connection.ops.quote_name(scratch)
+	with connection.cursor() as cursor:
+		cursor.execute(f'CREATE DATABASE {quoted}')
+	try:
+		restore_seconds = restore_postgres(backup, connection.settings_dict, jobs=jobs, dbname=scratch)
+		started = time.perf_counter()
+		scratch_connection = connection.__class__({**connection.settings_dict, 'NAME': scratch}, alias='verify_backup')
+		try:
+			with scratch_connection.cursor() as cursor:
+				row_counts = count_rows(cursor, _pg_tables(cursor), scratch_connection.ops.quote_name)
+		finally:
+			scratch_connection.close()
+		check_seconds = time.perf_counter() - started
+	finally:
+		with connection.cursor() as cursor:
+			cursor.execute(f'DROP DATABASE IF EXISTS {quoted}')
+	return VerifyResult(
+		backup=backup,
+		restore_seconds=restore_seconds,
+		check_seconds=check_seconds,
+		row_counts=row_counts,
+		expected=expected,
+		mismatches=compare_row_counts(expected, row_counts) if expected is not None else [],
+	)
@@ -0,0 +1,258 @@
+"""Контентно-адресуемое хранение вложений.
+
+Файл вложения хранится один раз по пути из SHA-256 содержимого
+(blobs/ab/cd/<sha256>.<ext>) и описывается строкой AttachmentBlob со
+счётчиком ссылок; Attachment ссылается на blob и помнит исходное имя файла.
+Одно и то же фото, приложенное к десяти дефектам, занимает место на диске
+(и в резервных копиях) один раз.
+
+Хеш считается upload handler'ами (FILE_UPLOAD_HANDLERS в настройках) по мере
+поступления частей загрузки, поэтому файл после загрузки повторно не
+читается. Для файлов, пришедших не через запрос (команды, тесты), хеш
+считается чтением по частям.
+
+Счётчик ссылок меняется в транзакции вместе с вложением под блокировкой
+строки blob; файл удаляется после коммита, когда на него не осталось ссылок.
+Режим выключается настройкой ATTACHMENT_CONTENT_ADDRESSED — тогда файлы
+сохраняются по-старому, в attachments/defect_<id>/.
+
+Уже загруженные файлы переводятся в хранилище командой dedupe_attachments.
+Новые blob'ы с фотографиями встают в очередь уменьшенных копий
+(defects.derivatives).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import posixpath
+import shutil
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import F
+
+from .derivatives import delete_derivative_files, initial_derivatives_status
+from .models import Attachment, AttachmentBlob, Defect
+
+
+BLOB_ROOT = 'blobs'
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class HashingUploadMixin:
+	"""Считает SHA-256 загружаемого файла по частям, пока они поступают.
+
+	Хеш получают только части, которые handler забрал себе (вернул None из
+	receive_data_chunk), поэтому при цепочке «память → временный файл» файл
+	хешируется один раз. Готовый файл получает атрибут sha256.
+	"""
+
+	def new_file(self, *args, **kwargs):
+		self.hasher = hashlib.sha256()
+		return super().new_file(*args, **kwargs)
+
+	def receive_data_chunk(self, raw_data, start):
+		rest = super().receive_data_chunk(raw_data, start)
+		if rest is None:
+			self.hasher.update(raw_data)
+		return rest
+
+	def file_complete(self, file_size):
+		uploaded = super().file_complete(file_size)
+		if uploaded is not None:
+			uploaded.sha256 = self.hasher.hexdigest()
+		return uploaded
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+	pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+	pass
+
+
+@dataclass
+class DedupeResult:
+	files: int = 0
+	attachments: int = 0
+	duplicates: int = 0
+	bytes_freed: int = 0
+	missing: int = 0
+
+
+def blob_path(digest: str, filename: str = '') -> str:
+	"""blobs/ab/cd/<sha256><.ext>: два уровня каталогов, чтобы не копить файлы в одном."""
+
+	ext = posixpath.splitext(filename)[1].lower()
+	if not ext[1:].isalnum() or len(ext) > 10:
+		ext = ''
+	return f'{BLOB_ROOT}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+
+def file_digest(fileobj) -> tuple[str, int]:
+	"""SHA-256 и размер файла чтением по частям (для файлов не из запроса)."""
+
+	hasher = hashlib.sha256()
+	size = 0
+	if hasattr(fileobj, 'seek'):
+		fileobj.seek(0)
+	while chunk := fileobj.read(HASH_CHUNK_SIZE):
+		hasher.update(chunk)
+		size += len(chunk)
+	if hasattr(fileobj, 'seek'):
+		fileobj.seek(0)
+	return hasher.hexdigest(), size
+
+
+def _storage():
+	return AttachmentBlob._meta.get_field('file').storage
+
+
+def _local_path(storage, name: str) -> str | None:
+	try:
+		return storage.path(name)
+	except NotImplementedError:
+		return None
+
+
+def _acquire_blob(digest: str, size: int, filename: str, content, *, references: int, using: str) -> tuple[AttachmentBlob, bool]:
+	"""Строка blob с digest (создаётся при необходимости) с refcount += references.
+
+	Вызывается в транзакции: строка блокируется до коммита, поэтому
+	параллельное удаление последней ссылки не удалит файл из-под вложения.
+	Если content передан, файл нового blob записывается в хранилище.
+	"""
+
+	blob, created = AttachmentBlob.objects.using(using).select_for_update().get_or_create(
+		sha256=digest,
+		defaults={
+			'size': size,
+			'file': blob_path(digest, filename),
+			'derivatives_status': initial_derivatives_status(filename),
+		},
+	)
+	if created and content is not None:
+		storage = _storage()
+		# Файл мог остаться от откатившейся транзакции: содержимое то же по построению
+		if not storage.exists(blob.file.name):
+			saved = storage.save(blob.file.name, content)
+			if saved != blob.file.name:
+				storage.delete(saved)
+				raise RuntimeError(f'Blob path is taken concurrently: {blob.file.name}')
+	AttachmentBlob.objects.using(using).filter(pk=blob.pk).update(refcount=F('refcount') + references)
+	return blob, created
+
+
+def store_attachment(defect: Defect, uploaded, *, using: str = 'default') -> Attachment:
+	"""Сохраняет загруженный файл как вложение дефекта (с дедупликацией, если она включена)."""
+
+	original_name = os.path.basename(uploaded.name)
+	if not settings.ATTACHMENT_CONTENT_ADDRESSED:
+		attachment = Attachment(defect=defect, file=uploaded, original_name=original_name)
+		attachment.save(using=using)
+		return attachment
+
+	digest = getattr(uploaded, 'sha256', None)
+	if digest:
+		size = uploaded.size
+	else:
+		digest, size = file_digest(uploaded)
+	with transaction.atomic(using=using):
+		blob, _ = _acquire_blob(digest, size, original_name, uploaded, references=1, using=using)
+		attachment = Attachment(defect=defect, blob=blob, file=blob.file.name, original_name=original_name)
+		attachment.save(using=using)
+	return attachment
+
+
+def _delete_blob_file(digest: str, name: str, using: str) -> None:
+	# Между коммитом и этим вызовом тот же файл мог загрузить кто-то ещё
+	if not AttachmentBlob.objects.using(using).filter(sha256=digest).exists():
+		storage = _storage()
+		storage.delete(name)
+		delete_derivative_files(storage, digest)
+
+
+def release_blob(blob_id: int, *, using: str = 'default') -> None:
+	"""Снимает ссылку вложения; последняя ссылка удаляет blob и (после коммита) файл."""
+
+	with transaction.atomic(using=using):
+		blob = AttachmentBlob.objects.using(using).select_for_update().filter(pk=blob_id).first()
+		if blob is None:
+			return
+		if blob.refcount > 1:
+			AttachmentBlob.objects.using(using).filter(pk=blob.pk).update(refcount=F('refcount') - 1)
+			return
+		digest, name = blob.sha256, blob.file.name
+		blob.delete(using=using)
+		transaction.on_commit(lambda: _delete_blob_file(digest, name, using), using=using)
+
+
+def _link_into_blob(storage, old: str, new: str) -> None:
+	"""Делает файл old доступным и по пути blob new; old не трогается.
+
+	Старый путь удаляется только после коммита: при откате строки вложений
+	по-прежнему ссылаются на него, а оставшийся файл blob подберёт повтор.
+	"""
+
+	old_path, new_path = _local_path(storage, old), _local_path(storage, new)
+	if old_path and new_path:
+		os.makedirs(os.path.dirname(new_path), exist_ok=True)
+		try:
+			# Файловое хранилище: жёсткая ссылка, без копии данных
+			os.link(old_path, new_path)
+		except OSError:
+			shutil.copyfile(old_path, new_path)
+		return
+	with storage.open(old, 'rb') as source:
+		storage.save(new, source)
+
+
+def dedupe_attachments(*, dry_run: bool = False, using: str = 'default') -> DedupeResult:
+	"""Переводит вложения со старыми путями в контентно-адресуемое хранилище.
+
+	Первый файл с данным содержимым связывается жёсткой ссылкой (или
+	копируется) с путём blob, остальные копии становятся лишними. Старые пути
+	удаляются после коммита. Каждый файл обрабатывается в своей транзакции,
+	поэтому прерванный запуск можно просто повторить.
+	"""
+
+	result = DedupeResult()
+	storage = _storage()
+	seen: set[str] = set()
+	legacy = Attachment.objects.using(using).filter(blob__isnull=True)
+	# Список имён целиком: по ходу обхода строки этой же выборки обновляются
+	for name in list(legacy.order_by('file').values_list('file', flat=True).distinct()):
+		if not name or not storage.exists(name):
+			result.missing += 1
+			continue
+		with storage.open(name, 'rb') as fileobj:
+			digest, size = file_digest(fileobj)
+		result.files += 1
+		if dry_run:
+			if digest in seen or AttachmentBlob.objects.using(using).filter(sha256=digest).exists():
+				result.duplicates += 1
+				result.bytes_freed += size
+			seen.add(digest)
+			result.attachments += legacy.filter(file=name).count()
+			continue
+
+		with transaction.atomic(using=using):
+			rows = legacy.select_for_update().filter(file=name)
+			count = len(rows)
+			if not count:
+				continue
+			blob, created = _acquire_blob(digest, size, name, None, references=count, using=using)
+			rows.filter(original_name='').update(original_name=posixpath.basename(name))
+			legacy.filter(file=name).update(blob=blob, file=blob.file.name)
+			result.attachments += count
+			if created and not storage.exists(blob.file.name):
+				_link_into_blob(storage, name, blob.file.name)
+			else:
+				result.duplicates += 1
+				result.bytes_freed += size
+			transaction.on_commit(lambda name=name: storage.delete(name), using=using)
+	return result
@@ -0,0 +1,183 @@
+"""Кэш read-only агрегатов (аналитика и т.п.) с версионной инвалидацией.
+
+Ключ агрегата: имя, версия пространства имён, роль и область видимости
+пользователя, хэш параметров. При изменении данных версия увеличивается
+(bump_version) — старые ключи перестают читаться и доживают до TTL. Удалять
+ключи по шаблону не нужно, поэтому схема одинаково работает с locmem,
+файловым и Redis-кэшем.
+
+Версия, однако, видна только процессам с общим кэшем. У locmem она своя в
+каждом worker'е gunicorn: bump_version в одном процессе не доходит до
+остальных. Поэтому кэш фрагментов и версии в ETag (defects.conditional)
+включаются только для общего кэша (is_shared_cache); агрегаты в locmem
+устаревают не дольше AGGREGATE_CACHE_TTL.
+
+Версию поднимают сигналы Defect/Project (defects.signals) и
+log_defect_event. Массовые операции в обход save() должны вызывать
+bump_version() сами.
+
+Отдельное пространство имён FRAGMENTS_NAMESPACE версионирует кэш фрагментов
+шаблонов ({% cache %}): строки таблиц дефектов ключуются по pk и updated_at,
+а версия поднимается, когда меняются связанные данные — проекты и
+пользователи (названия, адреса, логины в строках и списке исполнителей).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from .permissions import is_customer, is_engineer, is_manager
+
+
+T = TypeVar('T')
+
+DEFECTS_NAMESPACE = 'defects'
+FRAGMENTS_NAMESPACE = 'fragments'
+_MISSING = object()
+
+# Имена кэшируемых агрегатов (для счётчиков и команды aggregate_cache_stats)
+ANALYTICS_STATUS = 'analytics-status'
+ANALYTICS_BREAKDOWNS = 'analytics-breakdowns'
+AGGREGATE_NAMES = (ANALYTICS_STATUS, ANALYTICS_BREAKDOWNS)
+
+
+def _cache():
+	return caches[settings.AGGREGATE_CACHE_ALIAS]
+
+
+def is_shared_cache() -> bool:
+	"""Видят ли все процессы одни и те же ключи (file, redis), а не свою копию."""
+
+	return not isinstance(_cache(), (LocMemCache, DummyCache))
+
+
+def _version_key(namespace: str) -> str:
+	return f'agg:version:{namespace}'
+
+
+def get_version(namespace: str = DEFECTS_NAMESPACE) -> int:
+	cache = _cache()
+	key = _version_key(namespace)
+	version = cache.get(key)
+	if version is None:
+		# Стартуем с текущего времени, а не с 1: если ключ версии вытеснен из кэша,
+		# новая версия не совпадёт ни с одной из уже записанных
+		cache.add(key, time.time_ns() // 1000, timeout=None)
+		version = cache.get(key)
+	return version
+
+
+def _bump(namespace: str) -> None:
+	cache = _cache()
+	try:
+		cache.incr(_version_key(namespace))
+	except ValueError:
+		get_version(namespace)
+
+
+def bump_version(namespace: str = DEFECTS_NAMESPACE) -> None:
+	"""Инвалидирует все агрегаты пространства имён.
+
+	Версия поднимается сразу и ещё раз после коммита: иначе агрегат,
+	пересчитанный параллельным запросом до коммита, остался бы в кэше под
+	новой версией со старыми данными.
+	"""
+
+	_bump(namespace)
+	transaction.on_commit(lambda: _bump(namespace))
+
+
+def user_scope(user) -> str:
+	"""Роль и область видимости: от них зависит, какие дефекты попадут в агрегат."""
+
+	if is_manager(user):
+		return 'manager:all'
+	if is_customer(user):
+		return 'customer:all'
+	if is_engineer(user):
+		return f'engineer:{user.pk}'
+	return 'anonymous'
+
+
+def aggregate_cache_key(name: str, user, params: dict[str, Any] | None = None, *, namespace: str = DEFECTS_NAMESPACE) -> str:
+	digest = hashlib.sha1(json.dumps(params or {}, sort_keys=True, default=str).encode()).hexdigest()[:16]
+	return f'agg:{name}:v{get_version(namespace)}:{user_scope(user)}:{digest}'
+
+
+def _count(name: str, outcome: str) -> None:
+	cache = _cache()
+	key = f'agg:stats:{name}:{outcome}'
+	if not cache.add(key, 1, timeout=None):
+		try:
+			cache.incr(key)
+		except ValueError:
+			cache.set(key, 1, timeout=None)
+
+
+def cached_aggregate(
+	name: str,
+	user,
+	compute: Callable[[], T],
+	*,
+	params: dict[str, Any] | None = None,
+	timeout: int | None = None,
+	namespace: str = DEFECTS_NAMESPACE,
+) -> T:
+	"""Возвращает агрегат из кэша или считает его через compute() и кладёт в кэш.
+
+	Значение должно сериализоваться pickle (dict/list/dataclass).
+	"""
+
+	cache = _cache()
+	key = aggregate_cache_key(name, user, params, namespace=namespace)
+	value = cache.get(key, _MISSING)
+	if value is not _MISSING:
+		_count(name, 'hit')
+		return value
+
+	_count(name, 'miss')
+	value = compute()
+	cache.set(key, value, settings.AGGREGATE_CACHE_TTL if timeout is None else timeout)
+	return value
+
+
+def cache_stats(names=AGGREGATE_NAMES) -> dict[str, dict[str, int]]:
+	"""Счётчики попаданий/промахов по именам агрегатов (общие для всех процессов)."""
+
+	cache = _cache()
+	stats = {}
+	for name in names:
+		hits = cache.get(f'agg:stats:{name}:hit', 0)
+		misses = cache.get(f'agg:stats:{name}:miss', 0)
+		total = hits + misses
+		stats[name] = {'hit': hits, 'miss': misses, 'hit_ratio': round(hits / total, 3) if total else 0.0}
+	return stats
+
+
+def reset_cache_stats(names=AGGREGATE_NAMES) -> None:
+	_cache().delete_many([f'agg:stats:{name}:{outcome}' for name in names for outcome in ('hit', 'miss')])
+
+
+def fragment_cache_context() -> dict[str, Any]:
+	"""Переменные для {% cache %} в шаблонах: TTL и версия связанных данных.
+
+	Без общего кэша TTL 0: фрагменты рендерятся каждый раз, иначе worker,
+	не видевший bump_version, отдавал бы устаревшие строки.
+	"""
+
+	if not is_shared_cache():
+		return {'fragment_ttl': 0, 'fragment_version': 0}
+	return {
+		'fragment_ttl': settings.FRAGMENT_CACHE_TTL,
+		'fragment_version': get_version(FRAGMENTS_NAMESPACE),
+	}
@@ -0,0 +1,119 @@
+"""Conditional GET (ETag / Last-Modified) для страниц дефектов и проектов.
+
+Валидаторы считаются до рендера и только индексными запросами:
+- карточка дефекта — updated_at и последние даты комментариев, вложений и
+  истории (индексы (defect, created_at) / (defect, uploaded_at));
+- списки — последний updated_at по области видимости роли (индексы
+  (updated_at), (executor, updated_at), (project, updated_at)).
+
+Удаления и изменения связанных данных (проекты, этапы, пользователи) не
+двигают updated_at, поэтому в ETag входят и версии из defects.cache. Кроме
+того, в ETag входят роль, id пользователя, секрет CSRF (формы на странице
+содержат токен) и строка запроса: совпасть может только ETag той же страницы
+того же пользователя, поэтому 304 никогда не отдаёт чужое представление.
+
+Ответ всегда `Cache-Control: private, no-cache`: общий кэш страницу не
+хранит, браузер переспрашивает сервер при каждом открытии.
+
+Версии согласованы между worker'ами только в общем кэше (file, redis). С
+locmem ETag не выдаётся и 304 не бывает: иначе worker, не видевший
+bump_version после удаления, подтвердил бы устаревшую страницу.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+
+from django.contrib import messages
+from django.db.models import OuterRef, Subquery
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .cache import DEFECTS_NAMESPACE, FRAGMENTS_NAMESPACE, get_version, is_shared_cache
+from .models import Attachment, Comment, DefectHistory
+
+
+def latest_updated_queryset(queryset):
+	"""Последний updated_at выборки: ORDER BY updated_at DESC LIMIT 1 по индексу."""
+
+	return queryset.order_by('-updated_at').values_list('updated_at', flat=True)[:1]
+
+
+def _latest(model, field: str) -> Subquery:
+	return Subquery(model.objects.filter(defect=OuterRef('pk')).order_by(f'-{field}').values(field)[:1])
+
+
+def defect_validators_queryset(queryset):
+	"""updated_at дефекта и последние даты комментариев, вложений и истории — одной строкой."""
+
+	return queryset.annotate(
+		last_comment=_latest(Comment, 'created_at'),
+		last_attachment=_latest(Attachment, 'uploaded_at'),
+		last_history=_latest(DefectHistory, 'created_at'),
+	).values_list('updated_at', 'last_comment', 'last_attachment', 'last_history')
+
+
+def _has_pending_messages(request) -> bool:
+	# len() не помечает сообщения прочитанными, в отличие от итерации
+	return bool(len(messages.get_messages(request)))
+
+
+class ConditionalGetMixin:
+	"""Отвечает 304 Not Modified без рендера, если ETag страницы не изменился.
+
+	Подкласс реализует get_validator_timestamps(): список datetime (None —
+	пропустить) или None, если объекта в области видимости нет (тогда запрос
+	обрабатывается как обычно и, например, отдаёт 404).
+	"""
+
+	def get_validator_timestamps(self) -> list[dt.datetime | None] | None:
+		raise NotImplementedError
+
+	def get_etag(self, timestamps: list[dt.datetime | None]) -> str:
+		request = self.request
+		user = request.user
+		parts = [
+			self.__class__.__name__,
+			getattr(user, 'role', ''),
+			user.pk,
+			request.META.get('CSRF_COOKIE', ''),
+			request.get_full_path(),
+			get_version(DEFECTS_NAMESPACE),
+			get_version(FRAGMENTS_NAMESPACE),
+			*[ts.isoformat() if ts else '' for ts in timestamps],
+		]
+		return quote_etag(hashlib.sha1(repr(parts).encode()).hexdigest())
+
+	def get(self, request, *args, **kwargs):
+		if not is_shared_cache():
+			return super().get(request, *args, **kwargs)
+		timestamps = self.get_validator_timestamps()
+		if timestamps is None:
+			return super().get(request, *args, **kwargs)
+
+		# Секрет CSRF создаётся до расчёта ETag, а не при рендере формы: иначе
+		# первый ответ (ещё без cookie) получил бы ETag, который сразу устареет
+		get_token(request)
+		etag = self.get_etag(timestamps)
+		known = [ts for ts in timestamps if ts]
+		last_modified = max(known) if known else None
+
+		# Сообщение (flash) показывается один раз: страницу надо отрендерить
+		if not _has_pending_messages(request):
+			# Только по ETag: If-Modified-Since не учитывает смену роли и версий
+			not_modified = get_conditional_response(request, etag=etag)
+			if not_modified is not None:
+				return self._patch(not_modified, etag, last_modified)
+
+		return self._patch(super().get(request, *args, **kwargs), etag, last_modified)
+
+	@staticmethod
+	def _patch(response, etag: str, last_modified: dt.datetime | None):
+		response.headers['ETag'] = etag
+		if last_modified:
+			response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+		patch_cache_control(response, private=True, no_cache=True)
+		patch_vary_headers(response, ('Cookie',))
+		return response
@@ -0,0 +1,190 @@
+"""Очередь уменьшенных копий фотографий-вложений.
+
+Загрузка только ставит blob в очередь (derivatives_status = pending) и сразу
+возвращает ответ. Worker run_derivative_jobs забирает blob'ы порциями и
+отдаёт декодирование и сжатие пулу процессов (defects.imaging, без Django);
+запись файлов и статусов остаётся в основном процессе.
+
+Копии привязаны к blob, а не к вложению: фото, приложенное к нескольким
+дефектам, обрабатывается один раз. Пути детерминированы хешем содержимого
+(derivatives/ab/cd/<sha256>-<kind>.jpg), поэтому содержимое по одному URL не
+меняется и отдаётся с долгим Cache-Control.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import posixpath
+from collections.abc import Callable, Iterable
+from concurrent.futures import Executor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import bump_version
+from .imaging import render_derivatives
+from .models import AttachmentBlob
+
+
+logger = logging.getLogger(__name__)
+
+
+DERIVATIVES_ROOT = 'derivatives'
+DERIVATIVE_BATCH_SIZE = 20
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff'})
+# Вид копии -> поле AttachmentBlob
+DERIVATIVE_FIELDS = {'thumb': 'thumbnail', 'preview': 'preview'}
+
+
+def is_image_name(name: str) -> bool:
+	return posixpath.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def initial_derivatives_status(name: str) -> str:
+	return AttachmentBlob.Derivatives.PENDING if is_image_name(name) else AttachmentBlob.Derivatives.NONE
+
+
+def derivative_sizes() -> dict[str, int]:
+	return {'thumb': settings.ATTACHMENT_THUMBNAIL_SIZE, 'preview': settings.ATTACHMENT_PREVIEW_SIZE}
+
+
+def derivative_path(digest: str, kind: str) -> str:
+	return f'{DERIVATIVES_ROOT}/{digest[:2]}/{digest[2:4]}/{digest}-{kind}.jpg'
+
+
+def claim_derivative_jobs(limit: int = DERIVATIVE_BATCH_SIZE) -> list[AttachmentBlob]:
+	"""Берёт до limit blob'ов из очереди и переводит их в RUNNING.
+
+	Как и у выгрузок, захват — условный UPDATE по статусу: два worker'а не
+	обработают один blob дважды.
+	"""
+
+	pending = AttachmentBlob.objects.filter(derivatives_status=AttachmentBlob.Derivatives.PENDING)
+	ids = list(pending.order_by('id').values_list('pk', flat=True)[:limit])
+	claimed = []
+	for pk in ids:
+		if pending.filter(pk=pk).update(derivatives_status=AttachmentBlob.Derivatives.RUNNING, derivatives_claimed_at=timezone.now()):
+			claimed.append(pk)
+	return list(AttachmentBlob.objects.filter(pk__in=claimed).order_by('id'))
+
+
+def requeue_derivative_jobs(*, failed: bool = False, stale_after: int | None = None) -> int:
+	"""Возвращает в очередь зависшие blob'ы и, если нужно, ошибочные.
+
+	Зависшим считается blob в RUNNING, взятый больше stale_after секунд назад
+	(по умолчанию ATTACHMENT_DERIVATIVE_STALE_AFTER): blob'ы, которые прямо
+	сейчас обрабатывают другие worker'ы, не трогаются.
+	"""
+
+	stale_after = settings.ATTACHMENT_DERIVATIVE_STALE_AFTER if stale_after is None else stale_after
+	stale = Q(derivatives_status=AttachmentBlob.Derivatives.RUNNING) & (
+		Q(derivatives_claimed_at__lt=timezone.now() - dt.timedelta(seconds=stale_after))
+		| Q(derivatives_claimed_at__isnull=True)
+	)
+	if failed:
+		stale |= Q(derivatives_status=AttachmentBlob.Derivatives.FAILED)
+	return AttachmentBlob.objects.filter(stale).update(
+		derivatives_status=AttachmentBlob.Derivatives.PENDING,
+		derivatives_error='',
+		derivatives_claimed_at=None,
+	)
+
+
+def _source(blob: AttachmentBlob) -> str | bytes:
+	# Процессу пула передаём путь, а не байты: без копирования фото через pipe
+	try:
+		return blob.file.path
+	except NotImplementedError:
+		with blob.file.open('rb') as fileobj:
+			return fileobj.read()
+
+
+def _claimed(blob: AttachmentBlob):
+	# Строка, которую этот worker взял в работу; release_blob мог удалить её во время обработки
+	return AttachmentBlob.objects.filter(pk=blob.pk, derivatives_status=AttachmentBlob.Derivatives.RUNNING)
+
+
+def _save(blob: AttachmentBlob, rendered: dict[str, bytes]) -> bool:
+	"""Записывает копии и отмечает blob готовым; False, если blob удалён во время обработки."""
+
+	if not _claimed(blob).exists():
+		return False
+	storage = blob.file.storage
+	for kind, data in rendered.items():
+		name = derivative_path(blob.sha256, kind)
+		# Путь детерминирован: при повторной обработке заменяем файл, а не плодим копии
+		storage.delete(name)
+		saved = storage.save(name, ContentFile(data))
+		setattr(blob, DERIVATIVE_FIELDS[kind], saved)
+	blob.derivatives_status = AttachmentBlob.Derivatives.DONE
+	blob.derivatives_error = ''
+	updated = _claimed(blob).update(
+		thumbnail=blob.thumbnail.name,
+		preview=blob.preview.name,
+		derivatives_status=blob.derivatives_status,
+		derivatives_error='',
+	)
+	if not updated:
+		# Последнюю ссылку сняли, пока писались файлы: _delete_blob_file их уже не увидит.
+		# Тот же файл могли загрузить заново — тогда копии нужны новому blob
+		if not AttachmentBlob.objects.filter(sha256=blob.sha256).exists():
+			delete_derivative_files(storage, blob.sha256)
+		return False
+	return True
+
+
+def _fail(blob: AttachmentBlob, exc: BaseException) -> None:
+	logger.warning('Derivatives for blob %s failed: %s', blob.pk, exc)
+	blob.derivatives_status = AttachmentBlob.Derivatives.FAILED
+	blob.derivatives_error = f'{type(exc).__name__}: {exc}'
+	_claimed(blob).update(derivatives_status=blob.derivatives_status, derivatives_error=blob.derivatives_error)
+
+
+def process_derivatives(
+	blobs: Iterable[AttachmentBlob],
+	*,
+	executor: Executor | None = None,
+	on_done: Callable[[AttachmentBlob], None] | None = None,
+) -> int:
+	"""Строит копии для blobs (в пуле executor или в текущем процессе); число успешных."""
+
+	sizes = derivative_sizes()
+	quality = settings.ATTACHMENT_DERIVATIVE_QUALITY
+	jobs = []
+	for blob in blobs:
+		try:
+			source = _source(blob)
+		except OSError as exc:
+			_fail(blob, exc)
+			continue
+		if executor is None:
+			jobs.append((blob, None, source))
+		else:
+			jobs.append((blob, executor.submit(render_derivatives, source, sizes, quality=quality), None))
+
+	done = 0
+	for blob, future, source in jobs:
+		try:
+			rendered = future.result() if future is not None else render_derivatives(source, sizes, quality=quality)
+		except Exception as exc:
+			# Битый файл, не изображение под видом .jpg, «бомба» из пикселей и т.п.
+			_fail(blob, exc)
+			continue
+		if not _save(blob, rendered):
+			logger.info('Blob %s was deleted during processing', blob.pk)
+			continue
+		done += 1
+		if on_done is not None:
+			on_done(blob)
+	if done:
+		# Карточки с этими вложениями должны получить новый ETag (появились миниатюры)
+		bump_version()
+	return done
+
+
+def delete_derivative_files(storage, digest: str) -> None:
+	for kind in DERIVATIVE_FIELDS:
+		storage.delete(derivative_path(digest, kind))
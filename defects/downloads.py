@@ -0,0 +1,191 @@
+"""Отдача защищённых файлов из MEDIA_ROOT (вложения и их копии).
+
+Права проверяет view, а сами байты отдаёт фронтовой прокси, чтобы
+многомегабайтная загрузка не занимала sync-worker gunicorn:
+- PROTECTED_MEDIA_SERVER=nginx — ответ с X-Accel-Redirect на internal
+  location (PROTECTED_MEDIA_INTERNAL_URL), пример в docs/security.md;
+- PROTECTED_MEDIA_SERVER=sendfile — X-Sendfile с путём на диске (Apache
+  mod_xsendfile, lighttpd);
+- без прокси — FileResponse: весь файл уходит через wsgi.file_wrapper
+  (sendfile() в gunicorn), одиночный диапазон Range — 206 Partial Content.
+
+Во всех режимах ответ несёт ETag и Last-Modified, и повторный запрос с
+If-None-Match / If-Modified-Since получает 304 без чтения файла.
+
+Вложения загружают пользователи, а отдаются они с домена приложения: .html
+или .svg, открытый в браузере, выполнил бы скрипт от имени того, кто его
+открыл. Поэтому из типов, определённых по имени файла, в браузере открываются
+только INLINE_CONTENT_TYPES, остальное всегда скачивается как
+application/octet-stream; вдобавок все
+ответы несут X-Content-Type-Options: nosniff и CSP sandbox.
+"""
+
+from __future__ import annotations
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+
+RANGE_CHUNK_SIZE = 64 * 1024
+# Типы, которые безопасно показывать в браузере: растровые изображения и PDF
+INLINE_CONTENT_TYPES = frozenset(
+	{'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/bmp', 'application/pdf'}
+)
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+	"""Файл, из которого читается только диапазон [start, start + length)."""
+
+	def __init__(self, fileobj, start: int, length: int):
+		self.fileobj = fileobj
+		self.remaining = length
+		fileobj.seek(start)
+
+	def read(self, size: int = -1) -> bytes:
+		if self.remaining <= 0:
+			return b''
+		if size < 0 or size > self.remaining:
+			size = self.remaining
+		data = self.fileobj.read(min(size, RANGE_CHUNK_SIZE))
+		self.remaining -= len(data)
+		return data
+
+	def close(self) -> None:
+		self.fileobj.close()
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+	"""(start, length) одиночного диапазона; None — отдать файл целиком.
+
+	Несколько диапазонов сразу (multipart/byteranges) не поддерживаются: на
+	такой запрос, как разрешает RFC 9110, отвечаем 200 со всем файлом.
+	Невыполнимый диапазон — ValueError (ответ 416).
+	"""
+
+	match = _RANGE_RE.match(header.replace(' ', ''))
+	if not match or match.groups() == ('', ''):
+		return None
+	first, last = match.groups()
+	if first:
+		start = int(first)
+		end = min(int(last), size - 1) if last else size - 1
+		if start >= size or end < start:
+			raise ValueError(header)
+	else:
+		suffix = int(last)
+		if not suffix or not size:
+			raise ValueError(header)
+		start, end = max(size - suffix, 0), size - 1
+	return start, end - start + 1
+
+
+def _if_range_matches(request: HttpRequest, etag: str, last_modified: int) -> bool:
+	value = request.headers.get('If-Range')
+	if not value:
+		return True
+	if value.startswith(('"', 'W/')):
+		return value == etag
+	return parse_http_date_safe(value) == last_modified
+
+
+def serve_protected(
+	request: HttpRequest,
+	fieldfile,
+	*,
+	filename: str = '',
+	content_type: str | None = None,
+	etag: str | None = None,
+	as_attachment: bool = False,
+	max_age: int | None = None,
+) -> HttpResponse:
+	"""Отдаёт файл FileField, права на который уже проверены.
+
+	Без content_type тип определяется по filename, и всё, чего нет в
+	INLINE_CONTENT_TYPES, отдаётся как вложение application/octet-stream
+	независимо от as_attachment.
+	etag — стабильный идентификатор содержимого (например, SHA-256 blob'а);
+	без него ETag строится из размера и времени изменения файла. max_age
+	задаётся для неизменяемых файлов; иначе браузер переспрашивает сервер
+	(private, no-cache) и получает 304.
+	"""
+
+	try:
+		path = fieldfile.path
+		stat = os.stat(path)
+	except (ValueError, FileNotFoundError) as exc:
+		raise Http404('File is missing') from exc
+
+	last_modified = int(stat.st_mtime)
+	etag = quote_etag(etag or f'{stat.st_size:x}-{stat.st_mtime_ns:x}')
+	filename = filename or os.path.basename(fieldfile.name)
+	if content_type is None:
+		# Тип из имени, которое дал пользователь: text/html, image/svg+xml и т.п.
+		# в браузере не открываем — только скачивание
+		content_type = mimetypes.guess_type(filename)[0]
+		if content_type not in INLINE_CONTENT_TYPES:
+			as_attachment = True
+			content_type = 'application/octet-stream'
+
+	response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+	if response is None:
+		response = _transfer(request, path, stat.st_size, fieldfile.name, filename, content_type, etag, last_modified, as_attachment)
+
+	response.headers['ETag'] = etag
+	response.headers['Last-Modified'] = http_date(last_modified)
+	response.headers['X-Content-Type-Options'] = 'nosniff'
+	response.headers['Content-Security-Policy'] = 'sandbox'
+	if max_age:
+		patch_cache_control(response, private=True, max_age=max_age, immutable=True)
+	else:
+		patch_cache_control(response, private=True, no_cache=True)
+	return response
+
+
+def _transfer(request, path, size, name, filename, content_type, etag, last_modified, as_attachment) -> HttpResponse:
+	server = settings.PROTECTED_MEDIA_SERVER
+	if server in ('nginx', 'sendfile'):
+		response = HttpResponse(content_type=content_type)
+		if server == 'nginx':
+			# Range, sendfile и заголовки длины nginx обработает сам
+			response.headers['X-Accel-Redirect'] = settings.PROTECTED_MEDIA_INTERNAL_URL + quote(name)
+		else:
+			response.headers['X-Sendfile'] = path
+		response.headers['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+		return response
+
+	byte_range = None
+	range_header = request.headers.get('Range')
+	if range_header and request.method in ('GET', 'HEAD') and _if_range_matches(request, etag, last_modified):
+		try:
+			byte_range = parse_range(range_header, size)
+		except ValueError:
+			response = HttpResponse(status=416)
+			response.headers['Content-Range'] = f'bytes */{size}'
+			return response
+
+	fileobj = open(path, 'rb')
+	if byte_range is None:
+		response = FileResponse(fileobj, content_type=content_type, as_attachment=as_attachment, filename=filename)
+	else:
+		start, length = byte_range
+		response = FileResponse(
+			RangeFile(fileobj, start, length),
+			status=206,
+			content_type=content_type,
+			as_attachment=as_attachment,
+			filename=filename,
+		)
+		response.headers['Content-Length'] = str(length)
+		response.headers['Content-Range'] = f'bytes {start}-{start + length - 1}/{size}'
+	response.headers['Accept-Ranges'] = 'bytes'
+	return response
+
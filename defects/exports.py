@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import logging
+import tempfile
+from collections.abc import Callable, Iterator
+from typing import BinaryIO
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .models import Defect, ExportJob
+from .permissions import filter_defects_for_user
+
+
+logger = logging.getLogger(__name__)
+
+
+# Размер порции при чтении из БД: строки тянутся через values_list без создания
+# экземпляров моделей, поэтому память зависит только от размера порции.
+EXPORT_CHUNK_SIZE = 2000
+
+CSV_HEADER = ['ID', 'Проект', 'Заголовок', 'Приоритет', 'Статус', 'Исполнитель', 'Deadline', 'Создано']
+XLSX_HEADER = ['ID', 'Проект', 'Заголовок', 'Описание', 'Приоритет', 'Статус', 'Исполнитель', 'Deadline', 'Создано']
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class Echo:
+	"""Псевдо-буфер для csv.writer: возвращает строку вместо записи.
+
+	Нужен для StreamingHttpResponse (см. документацию Django «Streaming large CSV files»).
+	"""
+
+	def write(self, value: str) -> str:
+		return value
+
+
+def export_values(queryset, *, with_description: bool = False):
+	"""Запрос строк экспорта: только нужные колонки, порядок как на дашборде."""
+
+	fields = ['pk', 'project__name', 'title']
+	if with_description:
+		fields.append('description')
+	fields += ['priority', 'status', 'executor__username', 'deadline', 'created_at']
+	return queryset.order_by('-created_at', '-pk').values_list(*fields)
+
+
+def iter_defect_rows(
+	queryset,
+	*,
+	with_description: bool = False,
+	chunk_size: int = EXPORT_CHUNK_SIZE,
+	on_progress: Callable[[int], None] | None = None,
+) -> Iterator[list]:
+	"""Отдаёт строки экспорта порциями, не кэшируя модели в ORM.
+
+	on_progress вызывается с числом отданных строк после каждой порции и в конце.
+	"""
+
+	priorities = dict(Defect.Priority.choices)
+	statuses = dict(Defect.Status.choices)
+
+	rows = export_values(queryset, with_description=with_description).iterator(chunk_size=chunk_size)
+	done = 0
+	for row in rows:
+		*head, priority, status, executor, deadline, created_at = row
+		yield [
+			*head,
+			priorities.get(priority, priority),
+			statuses.get(status, status),
+			executor or '',
+			deadline.isoformat(),
+			created_at.strftime('%Y-%m-%d %H:%M'),
+		]
+		done += 1
+		if on_progress and done % chunk_size == 0:
+			on_progress(done)
+	if on_progress:
+		on_progress(done)
+
+
+def iter_csv(queryset, *, on_progress: Callable[[int], None] | None = None) -> Iterator[str]:
+	"""Генерирует CSV построчно; BOM и заголовок уходят клиенту до первого запроса к БД."""
+
+	writer = csv.writer(Echo(), delimiter=';')
+	yield '\ufeff' + writer.writerow(CSV_HEADER)
+	for row in iter_defect_rows(queryset, on_progress=on_progress):
+		yield writer.writerow(row)
+
+
+def write_csv(queryset, fileobj: BinaryIO, *, on_progress: Callable[[int], None] | None = None) -> None:
+	for chunk in iter_csv(queryset, on_progress=on_progress):
+		fileobj.write(chunk.encode('utf-8'))
+
+
+def write_xlsx(queryset, fileobj: BinaryIO, *, on_progress: Callable[[int], None] | None = None) -> None:
+	"""Пишет XLSX в файл в write-only режиме openpyxl.
+
+	Строки сразу сбрасываются во временный XML на диске, поэтому книга
+	целиком в памяти не собирается.
+	"""
+
+	wb = Workbook(write_only=True)
+	ws = wb.create_sheet('Defects')
+	ws.append(XLSX_HEADER)
+	for row in iter_defect_rows(queryset, with_description=True, on_progress=on_progress):
+		ws.append(row)
+	wb.save(fileobj)
+
+
+def claim_next_export_job() -> ExportJob | None:
+	"""Берёт самое старое задание из очереди и переводит его в RUNNING.
+
+	Захват делается условным UPDATE по статусу, поэтому два worker'а не возьмут
+	одно и то же задание ни на SQLite, ни на Postgres.
+	"""
+
+	while True:
+		job = ExportJob.objects.filter(status=ExportJob.Status.PENDING).order_by('created_at', 'id').first()
+		if job is None:
+			return None
+		claimed = ExportJob.objects.filter(pk=job.pk, status=ExportJob.Status.PENDING).update(
+			status=ExportJob.Status.RUNNING,
+			started_at=timezone.now(),
+		)
+		if claimed:
+			return ExportJob.objects.select_related('user').get(pk=job.pk)
+
+
+def fail_stale_export_jobs(*, stale_after: int | None = None) -> int:
+	"""Помечает ошибкой задания, застрявшие в RUNNING после падения worker'а.
+
+	Застрявшим считается задание, взятое (started_at) больше stale_after секунд
+	назад (по умолчанию EXPORT_JOB_STALE_AFTER). В очередь оно не
+	возвращается: если worker убил OOM, повтор упал бы так же; пользователь
+	видит ошибку и может запросить выгрузку заново.
+	"""
+
+	stale_after = settings.EXPORT_JOB_STALE_AFTER if stale_after is None else stale_after
+	now = timezone.now()
+	return ExportJob.objects.filter(
+		status=ExportJob.Status.RUNNING,
+		started_at__lt=now - dt.timedelta(seconds=stale_after),
+	).update(
+		status=ExportJob.Status.FAILED,
+		error='Выгрузка прервана: worker остановился, не завершив её.',
+		finished_at=now,
+	)
+
+
+def run_export_job(job: ExportJob) -> ExportJob:
+	"""Собирает файл выгрузки с учётом роли автора задания."""
+
+	qs = filter_defects_for_user(Defect.objects.all(), job.user)
+	job.total_rows = qs.count()
+	ExportJob.objects.filter(pk=job.pk).update(total_rows=job.total_rows)
+
+	def on_progress(done: int) -> None:
+		ExportJob.objects.filter(pk=job.pk).update(processed_rows=done)
+
+	writer = write_xlsx if job.format == ExportJob.Format.XLSX else write_csv
+	filename = f"defects_{timezone.localtime():%Y%m%d_%H%M%S}.{job.format}"
+	try:
+		with tempfile.TemporaryFile() as tmp:
+			writer(qs, tmp, on_progress=on_progress)
+			tmp.seek(0)
+			job.file.save(filename, File(tmp, name=filename), save=False)
+	except Exception as exc:
+		logger.exception('Export job %s failed', job.pk)
+		job.status = ExportJob.Status.FAILED
+		job.error = str(exc)
+		job.finished_at = timezone.now()
+		job.save(update_fields=['status', 'error', 'finished_at'])
+		return job
+
+	job.status = ExportJob.Status.DONE
+	job.processed_rows = job.total_rows
+	job.finished_at = timezone.now()
+	job.expires_at = job.finished_at + dt.timedelta(hours=settings.EXPORT_JOB_TTL_HOURS)
+	job.save(update_fields=['status', 'file', 'total_rows', 'processed_rows', 'finished_at', 'expires_at'])
+	return job
+
+
+def cleanup_expired_exports(now: dt.datetime | None = None) -> int:
+	"""Удаляет файлы выгрузок с истёкшим сроком хранения."""
+
+	now = now or timezone.now()
+	expired = ExportJob.objects.filter(status=ExportJob.Status.DONE, expires_at__lte=now)
+	count = 0
+	for job in expired.iterator():
+		if job.file:
+			job.file.delete(save=False)
+		job.status = ExportJob.Status.EXPIRED
+		job.save(update_fields=['file', 'status'])
+		count += 1
+	return count
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
 from django import forms
+from django.contrib.auth import get_user_model
 
+from .imports import ImportFormatError, detect_format
 from .models import Attachment, Comment, Defect, ProjectStage
+from .services import BULK_UPDATE_LIMIT
 
 
 class DefectForm(forms.ModelForm):
@@ -50,3 +53,58 @@ class ProjectStageForm(forms.ModelForm):
             'start_date': forms.DateInput(attrs={'type': 'date'}),
             'end_date': forms.DateInput(attrs={'type': 'date'}),
         }
+
+
+class DefectIdListField(forms.Field):
+    """Список id дефектов из повторяющегося параметра (?ids=1&ids=2)."""
+
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        try:
+            return [int(item) for item in value or []]
+        except (TypeError, ValueError):
+            raise forms.ValidationError('Некорректный список дефектов.')
+
+    def validate(self, value):
+        super().validate(value)
+        if len(value) > BULK_UPDATE_LIMIT:
+            raise forms.ValidationError(f'За один раз можно изменить не больше {BULK_UPDATE_LIMIT} дефектов.')
+
+
+class DefectBulkForm(forms.Form):
+    """Массовое действие с дашборда: новый статус и/или исполнитель для выбранных дефектов."""
+
+    ids = DefectIdListField(error_messages={'required': 'Не выбрано ни одного дефекта.'})
+    status = forms.ChoiceField(choices=[('', '—')] + list(Defect.Status.choices), required=False, label='Статус')
+    executor = forms.ModelChoiceField(
+        queryset=get_user_model().objects.filter(is_active=True).order_by('username'),
+        required=False,
+        label='Исполнитель',
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        if not cleaned.get('status') and not cleaned.get('executor'):
+            raise forms.ValidationError('Выберите новый статус или исполнителя.')
+        return cleaned
+
+
+class DefectImportForm(forms.Form):
+    file = forms.FileField(
+        label='Файл CSV или XLSX',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        label='Только проверить, ничего не сохранять',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        try:
+            self.format = detect_format(upload.name)
+        except ImportFormatError as exc:
+            raise forms.ValidationError(str(exc))
+        return upload
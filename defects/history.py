@@ -0,0 +1,87 @@
+"""Буферизованная запись истории дефектов в транзакции изменения.
+
+Внутри recording_history() события log_defect_event() не пишутся в БД
+сразу, а копятся в буфере и вставляются одним bulk_create перед коммитом —
+в той же транзакции, что и изменение дефекта. Изменение и запись истории
+фиксируются вместе (один коммит вместо двух) и вместе откатываются при
+ошибке: дефект не может измениться без записи в журнале.
+
+Работа «после коммита» (версия кэша агрегатов) ставится в on_commit один
+раз на весь буфер.
+
+Вложенные блоки пишут в буфер внешнего; если вложенный блок завершился
+исключением (его точка сохранения откатилась), его события отбрасываются.
+Буфер привязан к потоку, как и соединения с БД.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from .cache import bump_version
+from .models import DefectHistory
+
+
+_local = threading.local()
+
+
+def _stack() -> list[HistoryRecorder]:
+	if not hasattr(_local, 'recorders'):
+		_local.recorders = []
+	return _local.recorders
+
+
+class HistoryRecorder:
+	"""Буфер событий истории одной транзакции."""
+
+	def __init__(self, using: str):
+		self.using = using
+		self.entries: list[DefectHistory] = []
+
+	def add(self, entry: DefectHistory) -> None:
+		self.entries.append(entry)
+
+	def flush(self) -> None:
+		if not self.entries:
+			return
+		entries, self.entries = self.entries, []
+		DefectHistory.objects.using(self.using).bulk_create(entries)
+		bump_version()
+
+
+def current_recorder(using: str = 'default') -> HistoryRecorder | None:
+	for recorder in reversed(_stack()):
+		if recorder.using == using:
+			return recorder
+	return None
+
+
+@contextmanager
+def recording_history(using: str = 'default') -> Iterator[HistoryRecorder]:
+	"""transaction.atomic с буфером истории; годится и как декоратор view.
+
+	Буфер сбрасывается в конце самого внешнего блока, до коммита.
+	"""
+
+	with transaction.atomic(using=using):
+		outer = current_recorder(using)
+		if outer is not None:
+			mark = len(outer.entries)
+			try:
+				yield outer
+			except BaseException:
+				del outer.entries[mark:]
+				raise
+			return
+
+		recorder = HistoryRecorder(using)
+		_stack().append(recorder)
+		try:
+			yield recorder
+			recorder.flush()
+		finally:
+			_stack().remove(recorder)
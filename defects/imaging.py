@@ -0,0 +1,49 @@
+"""Уменьшенные копии фотографий (Pillow), без Django.
+
+Модуль импортируется в процессах пула worker'а run_derivative_jobs, поэтому
+не зависит от настроек и моделей: на вход — путь к файлу или байты, на
+выход — готовые JPEG.
+
+Копии кодируются заново, метаданные (EXIF с координатами и моделью
+телефона, XMP, ICC) не переносятся. Ориентацию из EXIF перед этим
+применяем к пикселям, иначе фото «лёжа» так и останутся повёрнутыми.
+"""
+
+from __future__ import annotations
+
+import io
+
+from PIL import Image, ImageOps
+
+
+def _to_rgb(image: Image.Image) -> Image.Image:
+	if image.mode == 'RGB':
+		return image
+	if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+		# JPEG без прозрачности: подкладываем белый фон
+		rgba = image.convert('RGBA')
+		background = Image.new('RGB', rgba.size, (255, 255, 255))
+		background.paste(rgba, mask=rgba.getchannel('A'))
+		return background
+	return image.convert('RGB')
+
+
+def render_derivatives(source: str | bytes, sizes: dict[str, int], *, quality: int = 80) -> dict[str, bytes]:
+	"""JPEG-копии source, вписанные в квадрат sizes[kind] (крупные не увеличиваются)."""
+
+	fileobj = io.BytesIO(source) if isinstance(source, bytes) else source
+	with Image.open(fileobj) as image:
+		largest = max(sizes.values())
+		# JPEG декодируется сразу в уменьшенном масштабе (1/2..1/8): в разы быстрее
+		# и меньше памяти на 12-мегапиксельных фото с телефона
+		image.draft('RGB', (largest, largest))
+		image = _to_rgb(ImageOps.exif_transpose(image))
+
+		result = {}
+		# От большего к меньшему: каждая следующая копия уменьшается из предыдущей
+		for kind, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+			image.thumbnail((size, size), Image.Resampling.LANCZOS)
+			buffer = io.BytesIO()
+			image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+			result[kind] = buffer.getvalue()
+	return result
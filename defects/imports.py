@@ -0,0 +1,319 @@
+"""Массовый импорт дефектов из CSV/XLSX.
+
+Файл читается потоком: CSV — построчно, XLSX — openpyxl в read-only режиме
+(строки разбираются из XML по мере чтения, книга в память целиком не
+загружается). Строки обрабатываются порциями по IMPORT_BATCH_SIZE:
+- проекты (по названию) и исполнители (по логину) порции ищутся двумя
+  запросами и запоминаются в словарях на весь импорт;
+- строка проверяется теми же правилами, что и форма: clean_fields() модели
+  (обязательность, длины, choices) и Defect.clean() (deadline не позже
+  окончания проекта);
+- корректные дефекты и их события `created` в истории вставляются
+  bulk_create.
+
+Сигналы save() при bulk_create не срабатывают, поэтому сводка
+DefectStatusRollup, поисковый индекс и версия кэша обновляются здесь же.
+
+Колонки ищутся по заголовку (как в выгрузке XLSX, поэтому выгруженный файл
+можно загрузить обратно; ID и «Создано» игнорируются). Строки с ошибками
+не импортируются и попадают в отчёт с номером строки файла.
+"""
+
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import io
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, BinaryIO
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from openpyxl import load_workbook
+
+from .cache import bump_version
+from .models import Defect, DefectHistory, Project
+from .search import update_search_index
+from .services import apply_rollup_deltas
+
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_FORMATS = ('csv', 'xlsx')
+
+# Колонка -> допустимые заголовки (без учёта регистра)
+COLUMNS = {
+	'project': ('проект', 'project'),
+	'title': ('заголовок', 'title'),
+	'description': ('описание', 'description'),
+	'priority': ('приоритет', 'priority'),
+	'status': ('статус', 'status'),
+	'executor': ('исполнитель', 'executor'),
+	'deadline': ('deadline', 'срок', 'срок устранения'),
+}
+REQUIRED_COLUMNS = ('project', 'title', 'priority', 'deadline')
+
+_DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y')
+
+
+class ImportFormatError(ValueError):
+	"""Файл нельзя разобрать целиком (формат, заголовок)."""
+
+
+@dataclass
+class ImportRowError:
+	row: int
+	message: str
+
+
+@dataclass
+class ImportResult:
+	rows: int = 0
+	created: int = 0
+	dry_run: bool = False
+	errors: list[ImportRowError] = field(default_factory=list)
+
+
+def detect_format(filename: str) -> str:
+	ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+	if ext not in IMPORT_FORMATS:
+		raise ImportFormatError('Поддерживаются файлы .csv и .xlsx.')
+	return ext
+
+
+def _read_csv(fileobj: BinaryIO) -> Iterator[list]:
+	text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+	first = text.readline()
+	# Выгрузка пишет CSV через «;» (Excel в русской локали), но принимаем и «,»
+	delimiter = ';' if first.count(';') >= first.count(',') else ','
+	yield next(csv.reader([first], delimiter=delimiter), [])
+	yield from csv.reader(text, delimiter=delimiter)
+
+
+def _read_xlsx(fileobj: BinaryIO) -> Iterator[tuple]:
+	wb = load_workbook(fileobj, read_only=True, data_only=True)
+	try:
+		yield from wb.worksheets[0].iter_rows(values_only=True)
+	finally:
+		# В read-only режиме книга держит файл открытым до close()
+		wb.close()
+
+
+def read_rows(fileobj: BinaryIO, fmt: str) -> Iterator[tuple[int, dict[str, Any]]]:
+	"""(номер строки файла, {колонка: значение}); заголовок — первая строка."""
+
+	rows = _read_csv(fileobj) if fmt == 'csv' else _read_xlsx(fileobj)
+	header = next(rows, None)
+	if not header:
+		raise ImportFormatError('Файл пуст.')
+
+	aliases = {alias: column for column, names in COLUMNS.items() for alias in names}
+	positions = {}
+	for index, title in enumerate(header):
+		column = aliases.get(str(title or '').strip().lower())
+		if column and column not in positions:
+			positions[column] = index
+	missing = [COLUMNS[column][0].capitalize() for column in REQUIRED_COLUMNS if column not in positions]
+	if missing:
+		raise ImportFormatError(f"Нет обязательных колонок: {', '.join(missing)}.")
+
+	for number, values in enumerate(rows, start=2):
+		if not any(value not in (None, '') for value in values):
+			continue
+		yield number, {
+			column: values[index] if index < len(values) else None
+			for column, index in positions.items()
+		}
+
+
+def _text(value) -> str:
+	return '' if value is None else str(value).strip()
+
+
+def _choice(value, choices, default=None) -> str | None:
+	text = _text(value)
+	if not text:
+		return default
+	lowered = text.lower()
+	for key, label in choices:
+		if lowered in (key, label.lower()):
+			return key
+	raise ValidationError(f'Неизвестное значение «{text}».')
+
+
+def _date(value) -> dt.date:
+	if isinstance(value, dt.datetime):
+		return value.date()
+	if isinstance(value, dt.date):
+		return value
+	text = _text(value)
+	for fmt in _DATE_FORMATS:
+		try:
+			return dt.datetime.strptime(text, fmt).date()
+		except ValueError:
+			continue
+	raise ValidationError(f'Некорректная дата «{text}» (ожидается ГГГГ-ММ-ДД или ДД.ММ.ГГГГ).')
+
+
+def _messages(exc: ValidationError) -> str:
+	if hasattr(exc, 'error_dict'):
+		return '; '.join(f'{name}: {" ".join(errors)}' for name, errors in exc.message_dict.items())
+	return ' '.join(exc.messages)
+
+
+class _Lookups:
+	"""Проекты и исполнители по именам: запрос только за ещё не виденными."""
+
+	def __init__(self, using: str):
+		self.using = using
+		self.projects: dict[str, list[Project]] = {}
+		self.users: dict[str, Any] = {}
+
+	def load(self, batch: list[tuple[int, dict]]) -> None:
+		names = {_text(values['project']) for _, values in batch} - self.projects.keys() - {''}
+		if names:
+			for project in Project.objects.using(self.using).filter(name__in=names):
+				self.projects.setdefault(project.name, []).append(project)
+			for name in names:
+				self.projects.setdefault(name, [])
+
+		usernames = {_text(values.get('executor')) for _, values in batch} - self.users.keys() - {''}
+		if usernames:
+			users = get_user_model().objects.using(self.using).filter(username__in=usernames, is_active=True)
+			found = {user.username: user for user in users}
+			for username in usernames:
+				self.users[username] = found.get(username)
+
+
+def _build_defect(values: dict, lookups: _Lookups) -> Defect:
+	errors = {}
+
+	project = None
+	project_name = _text(values['project'])
+	candidates = lookups.projects.get(project_name, [])
+	if not project_name:
+		errors['project'] = 'Обязательное поле.'
+	elif not candidates:
+		errors['project'] = f'Проект «{project_name}» не найден.'
+	elif len(candidates) > 1:
+		errors['project'] = f'Несколько проектов с названием «{project_name}».'
+	else:
+		project = candidates[0]
+
+	executor = None
+	username = _text(values.get('executor'))
+	if username:
+		executor = lookups.users.get(username)
+		if executor is None:
+			errors['executor'] = f'Пользователь «{username}» не найден.'
+
+	parsed = {}
+	for name, parse in (
+		('priority', lambda v: _choice(v, Defect.Priority.choices)),
+		('status', lambda v: _choice(v, Defect.Status.choices, Defect.Status.NEW)),
+		('deadline', _date),
+	):
+		try:
+			parsed[name] = parse(values.get(name))
+		except ValidationError as exc:
+			errors[name] = ' '.join(exc.messages)
+	if errors:
+		raise ValidationError(errors)
+
+	defect = Defect(
+		project=project,
+		executor=executor,
+		title=_text(values['title']),
+		description=_text(values.get('description')),
+		**parsed,
+	)
+	# Те же проверки, что и у формы, кроме FK (они уже найдены по словарям,
+	# а ForeignKey.validate делал бы запрос на каждую строку)
+	defect.clean_fields(exclude=['project', 'executor'])
+	defect.clean()
+	return defect
+
+
+def _history(defect: Defect, user) -> DefectHistory:
+	# Тот же diff, что пишет DefectCreateView
+	return DefectHistory(
+		defect=defect,
+		changed_by=user,
+		action=DefectHistory.Action.CREATED,
+		changes={
+			'title': {'to': defect.title},
+			'project': {'to': defect.project.name},
+			'priority': {'to': defect.get_priority_display()},
+			'status': {'to': defect.get_status_display()},
+			'deadline': {'to': defect.deadline.isoformat()},
+			'executor': {'to': getattr(defect.executor, 'username', '')},
+			'source': {'to': 'import'},
+		},
+	)
+
+
+def _batches(rows: Iterable, size: int) -> Iterator[list]:
+	rows = iter(rows)
+	while batch := list(islice(rows, size)):
+		yield batch
+
+
+def import_defects(
+	fileobj: BinaryIO,
+	fmt: str,
+	*,
+	user=None,
+	dry_run: bool = False,
+	batch_size: int = IMPORT_BATCH_SIZE,
+	using: str = 'default',
+) -> ImportResult:
+	"""Импортирует дефекты из файла; dry_run — только проверка, без записи в БД.
+
+	Все порции вставляются в одной транзакции: при сбое БД не остаётся
+	наполовину загруженного файла. Строки с ошибками валидации пропускаются и
+	перечисляются в ImportResult.errors.
+	"""
+
+	result = ImportResult(dry_run=dry_run)
+	lookups = _Lookups(using)
+	deltas: Counter = Counter()
+	created_ids: list[int] = []
+
+	with transaction.atomic(using=using):
+		for batch in _batches(read_rows(fileobj, fmt), batch_size):
+			lookups.load(batch)
+			defects = []
+			for number, values in batch:
+				result.rows += 1
+				try:
+					defects.append(_build_defect(values, lookups))
+				except ValidationError as exc:
+					result.errors.append(ImportRowError(number, _messages(exc)))
+			result.created += len(defects)
+			if dry_run or not defects:
+				continue
+
+			Defect.objects.using(using).bulk_create(defects, batch_size=batch_size)
+			DefectHistory.objects.using(using).bulk_create(
+				[_history(defect, user) for defect in defects], batch_size=batch_size
+			)
+			deltas.update(defect.rollup_key() for defect in defects)
+			created_ids.extend(defect.pk for defect in defects)
+
+		if created_ids:
+			apply_rollup_deltas(deltas, using=using)
+			update_search_index(defect_ids=created_ids, using=using)
+			bump_version()
+	return result
+
+
+def write_error_report(errors: Iterable[ImportRowError], fileobj) -> None:
+	"""Отчёт об ошибках в CSV (текстовый файл): строка файла и причина."""
+
+	writer = csv.writer(fileobj, delimiter=';')
+	writer.writerow(['Строка', 'Ошибка'])
+	for error in errors:
+		writer.writerow([error.row, error.message])
@@ -0,0 +1,73 @@
+"""Повтор записи, упёршейся в блокировку SQLite («database is locked»).
+
+SQLite допускает одного писателя на всю базу. busy_timeout (см. профиль
+SQLITE_PRODUCTION в settings) заставляет ждать освобождения блокировки, но
+при пиках записи и его может не хватить; тогда запрос получает
+OperationalError. retry_on_lock повторяет такой запрос ограниченное число
+раз с экспоненциальной задержкой и случайным разбросом, чтобы gunicorn
+worker'ы, столкнувшиеся на одной блокировке, не повторяли попытку
+одновременно.
+
+Повторяется весь вызов, поэтому декоратор ставится над транзакцией
+(recording_history(), transaction.atomic): неудачная попытка откатывается
+целиком, и повтор не задвоит записи. Внутри внешней транзакции повтор
+невозможен — ошибка пробрасывается как есть.
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import random
+import time
+from collections.abc import Callable
+from typing import TypeVar
+
+from django.conf import settings
+from django.db import OperationalError, connections
+
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar('F', bound=Callable)
+
+LOCK_MESSAGES = ('database is locked', 'database table is locked')
+
+
+def is_lock_error(exc: BaseException) -> bool:
+	return isinstance(exc, OperationalError) and any(message in str(exc) for message in LOCK_MESSAGES)
+
+
+def lock_retry_delay(attempt: int, base: float) -> float:
+	"""Задержка перед повтором attempt (с 1): base * 2^(attempt-1), разброс ±50%."""
+
+	return base * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+
+
+def retry_on_lock(using: str = 'default', *, attempts: int | None = None, delay: float | None = None) -> Callable[[F], F]:
+	"""Декоратор: до attempts повторов вызова при блокировке БД.
+
+	По умолчанию число повторов и базовая задержка берутся из
+	SQLITE_LOCK_RETRIES и SQLITE_LOCK_RETRY_DELAY.
+	"""
+
+	def decorator(func: F) -> F:
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			retries = settings.SQLITE_LOCK_RETRIES if attempts is None else attempts
+			base = settings.SQLITE_LOCK_RETRY_DELAY if delay is None else delay
+			attempt = 0
+			while True:
+				try:
+					return func(*args, **kwargs)
+				except OperationalError as exc:
+					attempt += 1
+					if not is_lock_error(exc) or attempt > retries or connections[using].in_atomic_block:
+						raise
+					pause = lock_retry_delay(attempt, base)
+					logger.warning('%s: %s, retry %s/%s in %.3f s', func.__qualname__, exc, attempt, retries, pause)
+					time.sleep(pause)
+
+		return wrapper
+
+	return decorator
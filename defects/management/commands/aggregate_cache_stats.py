@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from defects.cache import AGGREGATE_NAMES, cache_stats, get_version, reset_cache_stats
+
+
+class Command(BaseCommand):
+	help = 'Счётчики попаданий/промахов кэша агрегатов (аналитика) и текущая версия данных.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--reset', action='store_true', help='Обнулить счётчики после вывода.')
+
+	def handle(self, *args, **options):
+		self.stdout.write(f'Data version: {get_version()}')
+		self.stdout.write(f"{'aggregate':<24} {'hit':>8} {'miss':>8} {'hit ratio':>10}")
+		for name, stats in cache_stats(AGGREGATE_NAMES).items():
+			self.stdout.write(f"{name:<24} {stats['hit']:>8} {stats['miss']:>8} {stats['hit_ratio']:>10.1%}")
+		if options['reset']:
+			reset_cache_stats(AGGREGATE_NAMES)
+			self.stdout.write(self.style.SUCCESS('Counters reset.'))
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import datetime as dt
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from defects.archive import ARCHIVE_BATCH_SIZE, archive_defect_history
+
+
+class Command(BaseCommand):
+	help = 'Переносит старую историю закрытых и отменённых дефектов в сжатый архив (DefectHistoryArchive).'
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--older-than-days',
+			type=int,
+			default=settings.HISTORY_ARCHIVE_AFTER_DAYS,
+			help='Архивировать события старше стольких дней (по умолчанию: HISTORY_ARCHIVE_AFTER_DAYS).',
+		)
+		parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help='Дефектов в одной транзакции.')
+		parser.add_argument('--dry-run', action='store_true', help='Только посчитать, ничего не перенося.')
+		parser.add_argument('--database', default='default', help='Алиас БД (по умолчанию: default).')
+
+	def handle(self, *args, **options):
+		if options['older_than_days'] < 0:
+			raise CommandError('--older-than-days must be non-negative.')
+		result = archive_defect_history(
+			older_than=dt.timedelta(days=options['older_than_days']),
+			batch_size=options['batch_size'],
+			dry_run=options['dry_run'],
+			using=options['database'],
+		)
+		verb = 'Would archive' if options['dry_run'] else 'Archived'
+		ratio = f' ({result.raw_bytes} -> {result.compressed_bytes} bytes)' if result.events else ''
+		self.stdout.write(self.style.SUCCESS(f'{verb} {result.events} events of {result.defects} defects{ratio}.'))
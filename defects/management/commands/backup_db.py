@@ -1,17 +1,35 @@
 from __future__ import annotations
 
-import os
-import shutil
-import subprocess
-from datetime import datetime
 from pathlib import Path
 
 from django.conf import settings
+from django.core.management import call_command
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from defects.backups import (
+	BACKUP_PAGES_PER_STEP,
+	COMPRESSIONS,
+	POSTGRES_PREFIX,
+	SQLITE_PREFIX,
+	BackupError,
+	backup_postgres,
+	backup_sqlite,
+	rotate_backups,
+	timestamp,
+	write_backup_manifest,
+)
+
+
+def _mb(size: int) -> str:
+	return f'{size / 1024 / 1024:.1f} MB'
 
 
 class Command(BaseCommand):
-	help = 'Создаёт резервную копию БД в папку backups/ (SQLite: копирование файла, Postgres: pg_dump если доступен).'
+	help = (
+		'Создаёт резервную копию БД в папку backups/ (SQLite: онлайн-копия через backup API со сжатием, '
+		'Postgres: параллельный pg_dump в формате directory) и удаляет старые копии.'
+	)
 
 	def add_arguments(self, parser):
 		parser.add_argument(
@@ -19,58 +37,70 @@ class Command(BaseCommand):
 			default=str(Path(settings.BASE_DIR) / 'backups'),
 			help='Папка для бэкапов (по умолчанию: backups/ в корне проекта).',
 		)
+		parser.add_argument('--database', default='default', help='Алиас БД (по умолчанию: default).')
+		parser.add_argument(
+			'--compress',
+			choices=list(COMPRESSIONS),
+			default=settings.BACKUP_COMPRESSION,
+			help='SQLite: сжатие копии (по умолчанию: BACKUP_COMPRESSION). Postgres: none отключает -Z.',
+		)
+		parser.add_argument(
+			'--pages',
+			type=int,
+			default=BACKUP_PAGES_PER_STEP,
+			help='SQLite: страниц за шаг backup API; между шагами запись в БД не блокируется.',
+		)
+		parser.add_argument(
+			'--jobs',
+			type=int,
+			default=settings.BACKUP_PG_JOBS,
+			help='Postgres: параллельных процессов pg_dump (-j).',
+		)
+		parser.add_argument(
+			'--keep',
+			type=int,
+			default=settings.BACKUP_KEEP,
+			help='Сколько последних копий хранить (0 — не удалять старые).',
+		)
+		parser.add_argument(
+			'--with-media',
+			action='store_true',
+			help='Следом снять снимок MEDIA_ROOT (backup_media) с той же меткой времени в <out-dir>/media.',
+		)
 
 	def handle(self, *args, **options):
 		out_dir = Path(options['out_dir']).resolve()
 		out_dir.mkdir(parents=True, exist_ok=True)
+		connection = connections[options['database']]
+		stamp = timestamp()
 
-		db = settings.DATABASES['default']
-		engine = db.get('ENGINE', '')
-		now = datetime.now().strftime('%Y%m%d_%H%M%S')
-
-		if 'sqlite3' in engine:
-			src = Path(db['NAME']).resolve()
-			if not src.exists():
-				raise CommandError(f'SQLite DB file not found: {src}')
-			dst = out_dir / f'db_{now}.sqlite3'
-			shutil.copy2(src, dst)
-			self.stdout.write(self.style.SUCCESS(f'Backup created: {dst}'))
-			return
-
-		if 'postgresql' in engine:
-			# Пытаемся использовать pg_dump, если он есть в PATH.
-			dst = out_dir / f'pg_{now}.dump'
-			cmd = [
-				'pg_dump',
-				'--format=custom',
-				'--file',
-				str(dst),
-				'--host',
-				str(db.get('HOST') or 'localhost'),
-				'--port',
-				str(db.get('PORT') or 5432),
-				'--username',
-				str(db.get('USER') or ''),
-				str(db.get('NAME') or ''),
-			]
+		try:
+			if connection.vendor == 'sqlite':
+				result = backup_sqlite(connection, out_dir, compression=options['compress'], pages=options['pages'], stamp=stamp)
+				prefix = SQLITE_PREFIX
+			elif connection.vendor == 'postgresql':
+				level = 0 if options['compress'] == 'none' else 6
+				result = backup_postgres(connection, out_dir, jobs=options['jobs'], compress_level=level, stamp=stamp)
+				prefix = POSTGRES_PREFIX
+			else:
+				raise CommandError(f'Unsupported DB engine: {connection.vendor}')
+		except BackupError as exc:
+			raise CommandError(str(exc)) from exc
 
-			env = os.environ.copy()
-			pwd = db.get('PASSWORD')
-			if pwd:
-				env['PGPASSWORD'] = str(pwd)
-
-			try:
-				proc = subprocess.run(cmd, env=env, capture_output=True, text=True, check=False)
-			except FileNotFoundError as exc:
-				raise CommandError(
-					'pg_dump не найден. Для Postgres бэкапа установите PostgreSQL client tools '
-					'или используйте pg_dump внутри контейнера (см. docs/backup.md).'
-				) from exc
-
-			if proc.returncode != 0:
-				raise CommandError(f'pg_dump failed: {proc.stderr.strip() or proc.stdout.strip()}')
-
-			self.stdout.write(self.style.SUCCESS(f'Backup created: {dst}'))
-			return
+		write_backup_manifest(result, vendor=connection.vendor)
+		self.stdout.write(self.style.SUCCESS(f'Backup created: {result.path}'))
+		self.stdout.write(
+			f'source {_mb(result.source_bytes)} -> backup {_mb(result.size_bytes)} '
+			f'in {result.seconds:.2f} s ({result.throughput:.1f} MB/s)'
+		)
+		for path in rotate_backups(out_dir, prefix, options['keep']):
+			self.stdout.write(f'Removed old backup: {path.name}')
 
-		raise CommandError(f'Unsupported DB engine: {engine}')
+		if options['with_media']:
+			call_command(
+				'backup_media',
+				out_dir=str(out_dir / 'media'),
+				timestamp=stamp,
+				keep=options['keep'],
+				stdout=self.stdout,
+			)
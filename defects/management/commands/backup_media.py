@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from defects.media_backup import MEDIA_BACKUP_EXCLUDE, backup_media, prune_media_backups
+
+
+def _mb(size: int) -> str:
+	return f'{size / 1024 / 1024:.1f} MB'
+
+
+class Command(BaseCommand):
+	help = (
+		'Инкрементальная копия MEDIA_ROOT в backups/media: копирует только новое содержимое '
+		'(по SHA-256) и пишет манифест снимка с меткой времени.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--out-dir',
+			default=str(Path(settings.BASE_DIR) / 'backups' / 'media'),
+			help='Папка копии (по умолчанию: backups/media/ в корне проекта).',
+		)
+		parser.add_argument(
+			'--timestamp',
+			default=None,
+			help='Метка снимка YYYYMMDD_HHMMSS (backup_db --with-media передаёт метку копии БД).',
+		)
+		parser.add_argument(
+			'--workers',
+			type=int,
+			default=settings.BACKUP_MEDIA_WORKERS,
+			help='Потоков для хеширования и копирования новых файлов.',
+		)
+		parser.add_argument(
+			'--exclude',
+			action='append',
+			default=None,
+			help=f'Не копировать каталог верхнего уровня MEDIA_ROOT (по умолчанию: {", ".join(MEDIA_BACKUP_EXCLUDE)}).',
+		)
+		parser.add_argument(
+			'--keep',
+			type=int,
+			default=settings.BACKUP_KEEP,
+			help='Сколько последних снимков хранить (0 — не удалять старые).',
+		)
+
+	def handle(self, *args, **options):
+		root = Path(settings.MEDIA_ROOT)
+		if not root.is_dir():
+			raise CommandError(f'MEDIA_ROOT not found: {root}')
+		out_dir = Path(options['out_dir']).resolve()
+		exclude = tuple(options['exclude']) if options['exclude'] else MEDIA_BACKUP_EXCLUDE
+
+		result = backup_media(root, out_dir, stamp=options['timestamp'], workers=options['workers'], exclude=exclude)
+
+		self.stdout.write(self.style.SUCCESS(f'Media snapshot created: {result.manifest}'))
+		self.stdout.write(
+			f'{result.files} files ({_mb(result.total_bytes)}), hashed {result.hashed}, '
+			f'copied {result.copied} ({_mb(result.copied_bytes)}) in {result.seconds:.2f} s'
+		)
+		removed, objects = prune_media_backups(out_dir, options['keep'])
+		for path in removed:
+			self.stdout.write(f'Removed old snapshot: {path.name}')
+		if objects:
+			self.stdout.write(f'Removed {objects} unreferenced objects')
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from defects.models import Project
+from defects.sla import PERCENTILES, sla_rows, update_sla_report
+
+
+class Command(BaseCommand):
+	help = 'Cycle time и SLA по истории дефектов: время в статусах, время до закрытия, доля закрытых в срок.'
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--full',
+			action='store_true',
+			help='Пересчитать с нуля (по умолчанию обрабатываются только новые события истории).',
+		)
+		parser.add_argument(
+			'--group',
+			choices=['all', 'project', 'executor', 'priority'],
+			help='Показать только один разрез.',
+		)
+		parser.add_argument('--json', action='store_true', help='Вывести строки отчёта в JSON.')
+		parser.add_argument('--database', default='default', help='Алиас БД (по умолчанию: default).')
+
+	def handle(self, *args, **options):
+		groups, processed = update_sla_report(full=options['full'], using=options['database'])
+		rows = [row for row in sla_rows(groups) if not options['group'] or row['group'] == options['group']]
+
+		projects = dict(Project.objects.values_list('pk', 'name'))
+		users = dict(get_user_model().objects.values_list('pk', 'username'))
+		for row in rows:
+			if row['group'] == 'project':
+				row['name'] = projects.get(int(row['key']), row['key'])
+			elif row['group'] == 'executor':
+				row['name'] = users.get(int(row['key']), 'Не назначен' if row['key'] == '0' else row['key'])
+			else:
+				row['name'] = row['key']
+
+		if options['json']:
+			self.stdout.write(json.dumps(rows, ensure_ascii=False, indent=2))
+			return
+
+		self.stdout.write(f'History ids processed: {processed}')
+		header = f"{'group':<10} {'name':<24} {'metric':<22} {'count':>7}" + ''.join(f" {f'p{q}, h':>9}" for q in PERCENTILES) + f" {'on time':>8}"
+		self.stdout.write(header)
+		for row in rows:
+			line = f"{row['group']:<10} {str(row['name'])[:24]:<24} {row['metric']:<22} {row['count']:>7}"
+			for q in PERCENTILES:
+				value = row[f'p{q}_hours']
+				line += f" {'-' if value is None else f'{value:.1f}':>9}"
+			rate = row.get('deadline_hit_rate')
+			line += f" {'' if rate is None else f'{rate:.0%}':>8}"
+			self.stdout.write(line)
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from defects.blobs import dedupe_attachments
+
+
+class Command(BaseCommand):
+	help = 'Переводит загруженные ранее вложения в контентно-адресуемое хранилище, удаляя дубликаты файлов.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--dry-run', action='store_true', help='Только посчитать дубликаты, ничего не меняя.')
+		parser.add_argument('--database', default='default', help='Алиас БД (по умолчанию: default).')
+
+	def handle(self, *args, **options):
+		result = dedupe_attachments(dry_run=options['dry_run'], using=options['database'])
+		verb = 'Would free' if options['dry_run'] else 'Freed'
+		self.stdout.write(
+			f'{result.files} files, {result.attachments} attachments, {result.duplicates} duplicates; '
+			f'{verb} {result.bytes_freed} bytes.'
+		)
+		if result.missing:
+			self.stdout.write(self.style.WARNING(f'{result.missing} files are missing from storage.'))
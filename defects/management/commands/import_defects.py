@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from defects.imports import IMPORT_BATCH_SIZE, IMPORT_FORMATS, ImportFormatError, detect_format, import_defects, write_error_report
+
+
+class Command(BaseCommand):
+	help = 'Импорт дефектов из CSV/XLSX (колонки как в выгрузке XLSX).'
+
+	def add_arguments(self, parser):
+		parser.add_argument('path', help='Путь к файлу .csv или .xlsx.')
+		parser.add_argument('--format', choices=IMPORT_FORMATS, help='Формат файла (по умолчанию — по расширению).')
+		parser.add_argument('--user', help='Логин, от имени которого пишется история (по умолчанию — «система»).')
+		parser.add_argument('--dry-run', action='store_true', help='Только проверить строки, ничего не сохраняя.')
+		parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Строк в одной порции bulk_create.')
+		parser.add_argument('--report', help='Записать ошибки по строкам в CSV-файл.')
+		parser.add_argument('--database', default='default', help='Алиас БД (по умолчанию: default).')
+
+	def handle(self, *args, **options):
+		using = options['database']
+		user = None
+		if options['user']:
+			user = get_user_model().objects.using(using).filter(username=options['user']).first()
+			if user is None:
+				raise CommandError(f"User {options['user']!r} not found.")
+
+		try:
+			fmt = options['format'] or detect_format(options['path'])
+			with open(options['path'], 'rb') as fileobj:
+				result = import_defects(
+					fileobj,
+					fmt,
+					user=user,
+					dry_run=options['dry_run'],
+					batch_size=options['batch_size'],
+					using=using,
+				)
+		except (OSError, ImportFormatError) as exc:
+			raise CommandError(str(exc)) from exc
+
+		for error in result.errors[:20]:
+			self.stdout.write(f'row {error.row}: {error.message}')
+		if len(result.errors) > 20:
+			self.stdout.write(f'... and {len(result.errors) - 20} more')
+		if options['report']:
+			with open(options['report'], 'w', encoding='utf-8-sig', newline='') as report:
+				write_error_report(result.errors, report)
+
+		verb = 'Would import' if result.dry_run else 'Imported'
+		summary = f'{verb} {result.created} of {result.rows} rows, {len(result.errors)} rows with errors.'
+		self.stdout.write(self.style.WARNING(summary) if result.errors else self.style.SUCCESS(summary))
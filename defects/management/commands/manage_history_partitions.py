@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from defects.partitions import (
+	HISTORY_MONTHS_AHEAD,
+	drop_empty_history_partitions,
+	ensure_history_partitions,
+	history_partitions,
+	is_partitioned,
+)
+
+
+class Command(BaseCommand):
+	help = 'Помесячные секции истории дефектов (PostgreSQL): создать будущие, удалить пустые старые, показать список.'
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--ahead',
+			type=int,
+			default=HISTORY_MONTHS_AHEAD,
+			help='На сколько месяцев вперёд создать секции.',
+		)
+		parser.add_argument(
+			'--drop-empty',
+			action='store_true',
+			help='Удалить пустые секции прошлых месяцев (например, после archive_defect_history).',
+		)
+		parser.add_argument('--database', default='default', help='Алиас БД (по умолчанию: default).')
+
+	def handle(self, *args, **options):
+		connection = connections[options['database']]
+		if not is_partitioned(connection):
+			self.stdout.write(self.style.WARNING(f'History table is not partitioned ({connection.vendor}); nothing to do.'))
+			return
+
+		for name in ensure_history_partitions(connection, months_ahead=options['ahead']):
+			self.stdout.write(f'created {name}')
+		if options['drop_empty']:
+			for name in drop_empty_history_partitions(connection, before=timezone.now().date()):
+				self.stdout.write(f'dropped {name}')
+
+		for partition in history_partitions(connection):
+			self.stdout.write(f'{partition.name:<40} ~{partition.rows} rows')
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from defects.services import diff_rollup, rebuild_rollup
+
+
+class Command(BaseCommand):
+	help = 'Пересобирает сводку дефектов по проекту/статусу/приоритету (DefectStatusRollup).'
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--verify',
+			action='store_true',
+			help='Только сверить сводку с таблицей дефектов, ничего не меняя.',
+		)
+		parser.add_argument('--database', default='default', help='Алиас БД (по умолчанию: default).')
+
+	def handle(self, *args, **options):
+		using = options['database']
+		if options['verify']:
+			mismatches = diff_rollup(using=using)
+			for (project_id, status, priority), (stored, actual) in sorted(mismatches.items()):
+				self.stdout.write(f'project={project_id} status={status} priority={priority}: {stored} != {actual}')
+			if mismatches:
+				raise CommandError(f'Rollup is out of sync: {len(mismatches)} mismatched rows.')
+			self.stdout.write(self.style.SUCCESS('Rollup is in sync.'))
+			return
+
+		rows = rebuild_rollup(using=using)
+		self.stdout.write(self.style.SUCCESS(f'Rollup rebuilt: {rows} rows.'))
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from defects.search import create_search_backend, update_search_index
+
+
+class Command(BaseCommand):
+	help = 'Перестраивает полнотекстовый индекс дефектов (Postgres: tsvector + GIN, SQLite: FTS5).'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--database', default='default', help='Алиас БД (по умолчанию: default).')
+
+	def handle(self, *args, **options):
+		using = options['database']
+		with transaction.atomic(using=using):
+			create_search_backend(connections[using])
+			update_search_index(using=using)
+		self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from defects.backups import (
+	BackupError,
+	backup_vendor,
+	compare_row_counts,
+	count_rows,
+	read_backup_manifest,
+	restore_postgres,
+	restore_sqlite,
+)
+from defects.cache import DEFECTS_NAMESPACE, FRAGMENTS_NAMESPACE, bump_version
+
+
+class Command(BaseCommand):
+	help = (
+		'Восстанавливает БД из копии backup_db (SQLite: .sqlite3[.gz|.xz], Postgres: каталог или .dump '
+		'через параллельный pg_restore -j) и сверяет число строк с манифестом копии.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('backup', help='Путь к копии (файл SQLite или каталог/файл pg_dump).')
+		parser.add_argument('--database', default='default', help='Алиас БД, в которую восстанавливать.')
+		parser.add_argument(
+			'--jobs',
+			type=int,
+			default=settings.BACKUP_PG_JOBS,
+			help='Postgres: параллельных процессов pg_restore (-j).',
+		)
+		parser.add_argument(
+			'--noinput',
+			'--no-input',
+			action='store_false',
+			dest='interactive',
+			help='Не спрашивать подтверждение перед перезаписью БД.',
+		)
+
+	def handle(self, *args, **options):
+		backup = Path(options['backup']).resolve()
+		if not backup.exists():
+			raise CommandError(f'Backup not found: {backup}')
+		connection = connections[options['database']]
+		vendor = backup_vendor(backup)
+		if vendor != connection.vendor:
+			raise CommandError(f'Backup {backup.name} is for {vendor}, database "{options["database"]}" is {connection.vendor}')
+
+		if options['interactive']:
+			answer = input(
+				f'Все данные базы "{connection.settings_dict["NAME"]}" будут заменены копией {backup.name}.\n'
+				"Введите 'yes' для продолжения: "
+			)
+			if answer != 'yes':
+				raise CommandError('Restore cancelled.')
+
+		try:
+			if vendor == 'sqlite':
+				result = restore_sqlite(backup, connection)
+				seconds, row_counts = result.seconds, result.row_counts
+			else:
+				seconds = restore_postgres(backup, connection.settings_dict, jobs=options['jobs'])
+				connection.close()
+				with connection.cursor() as cursor:
+					existing = set(connection.introspection.table_names(cursor))
+					row_counts = count_rows(cursor, existing, connection.ops.quote_name)
+		except BackupError as exc:
+			raise CommandError(str(exc)) from exc
+		# Закэшированные страницы и агрегаты относятся к данным до восстановления
+		bump_version(DEFECTS_NAMESPACE)
+		bump_version(FRAGMENTS_NAMESPACE)
+
+		self.stdout.write(self.style.SUCCESS(f'Restored {backup.name} in {seconds:.2f} s'))
+		manifest = read_backup_manifest(backup)
+		if manifest is None:
+			self.stdout.write(self.style.WARNING('No manifest next to the backup: row counts not checked.'))
+			return
+		mismatches = compare_row_counts(manifest['rows'], row_counts)
+		for label, expected, actual in mismatches:
+			self.stdout.write(self.style.ERROR(f'{label}: expected {expected}, restored {actual}'))
+		if mismatches:
+			raise CommandError(f'Row counts differ from the manifest in {len(mismatches)} models.')
+		self.stdout.write(f'Row counts match the manifest ({sum(row_counts.values())} rows, {len(row_counts)} models).')
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from defects.derivatives import DERIVATIVE_BATCH_SIZE, claim_derivative_jobs, process_derivatives, requeue_derivative_jobs
+
+
+class Command(BaseCommand):
+	help = 'Worker уменьшенных копий фото-вложений: миниатюры и превью без EXIF, в пуле процессов.'
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--once',
+			action='store_true',
+			help='Обработать текущую очередь и выйти (удобно для cron и тестов).',
+		)
+		parser.add_argument(
+			'--poll-interval',
+			type=float,
+			default=2.0,
+			help='Пауза между опросами пустой очереди, сек (по умолчанию: 2).',
+		)
+		parser.add_argument(
+			'--workers',
+			type=int,
+			default=settings.ATTACHMENT_DERIVATIVE_WORKERS,
+			help='Процессов в пуле; 0 — обрабатывать в текущем процессе.',
+		)
+		parser.add_argument('--batch-size', type=int, default=DERIVATIVE_BATCH_SIZE, help='Blob’ов за один захват.')
+		parser.add_argument(
+			'--retry-failed',
+			action='store_true',
+			help='Вернуть в очередь blob’ы с ошибкой (зависшие после падения worker’а возвращаются всегда).',
+		)
+		parser.add_argument(
+			'--stale-after',
+			type=int,
+			default=settings.ATTACHMENT_DERIVATIVE_STALE_AFTER,
+			help='Через сколько секунд blob в обработке считается брошенным (по умолчанию: ATTACHMENT_DERIVATIVE_STALE_AFTER).',
+		)
+
+	def handle(self, *args, **options):
+		# Только брошенные blob'ы: параллельно могут работать другие worker'ы
+		requeued = requeue_derivative_jobs(failed=options['retry_failed'], stale_after=options['stale_after'])
+		if requeued:
+			self.stdout.write(f'Requeued: {requeued}')
+
+		executor = ProcessPoolExecutor(max_workers=options['workers']) if options['workers'] > 0 else None
+		try:
+			while True:
+				close_old_connections()
+				# Blob'ы, брошенные упавшим соседним worker'ом, возвращаются и без перезапуска
+				requeued = requeue_derivative_jobs(stale_after=options['stale_after'])
+				if requeued:
+					self.stdout.write(f'Requeued stale: {requeued}')
+				processed = 0
+				while blobs := claim_derivative_jobs(options['batch_size']):
+					done = process_derivatives(blobs, executor=executor)
+					processed += len(blobs)
+					self.stdout.write(f'Derivatives: {done} of {len(blobs)} blobs done')
+
+				if options['once']:
+					return
+				if not processed:
+					time.sleep(options['poll_interval'])
+		finally:
+			if executor is not None:
+				executor.shutdown()
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from defects.exports import claim_next_export_job, cleanup_expired_exports, fail_stale_export_jobs, run_export_job
+
+
+class Command(BaseCommand):
+	help = 'Worker фоновых выгрузок: собирает файлы ExportJob и удаляет просроченные.'
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--once',
+			action='store_true',
+			help='Обработать текущую очередь и выйти (удобно для cron и тестов).',
+		)
+		parser.add_argument(
+			'--poll-interval',
+			type=float,
+			default=2.0,
+			help='Пауза между опросами пустой очереди, сек (по умолчанию: 2).',
+		)
+		parser.add_argument(
+			'--stale-after',
+			type=int,
+			default=settings.EXPORT_JOB_STALE_AFTER,
+			help='Через сколько секунд выгрузка в работе считается брошенной (по умолчанию: EXPORT_JOB_STALE_AFTER).',
+		)
+
+	def handle(self, *args, **options):
+		while True:
+			close_old_connections()
+			removed = cleanup_expired_exports()
+			if removed:
+				self.stdout.write(f'Expired exports removed: {removed}')
+			# Задания упавшего worker'а (этого до перезапуска или соседнего)
+			stale = fail_stale_export_jobs(stale_after=options['stale_after'])
+			if stale:
+				self.stdout.write(self.style.WARNING(f'Stale exports failed: {stale}'))
+
+			processed = 0
+			while (job := claim_next_export_job()) is not None:
+				job = run_export_job(job)
+				processed += 1
+				if job.status == job.Status.DONE:
+					self.stdout.write(self.style.SUCCESS(f'Export #{job.pk} done: {job.total_rows} rows -> {job.file.name}'))
+				else:
+					self.stdout.write(self.style.ERROR(f'Export #{job.pk} failed: {job.error}'))
+
+			if options['once']:
+				return
+			if not processed:
+				time.sleep(options['poll_interval'])
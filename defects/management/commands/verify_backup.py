@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from defects.backups import (
+	POSTGRES_PREFIX,
+	SQLITE_PREFIX,
+	BackupError,
+	backup_vendor,
+	list_backups,
+	verify_postgres,
+	verify_sqlite,
+)
+
+
+class Command(BaseCommand):
+	help = (
+		'Проверяет копию backup_db: восстанавливает её в одноразовую базу (SQLite: временный файл, '
+		'Postgres: pg_restore -j в <NAME>_verify_<метка>), сверяет число строк с манифестом и печатает '
+		'время восстановления. Ненулевой код выхода, если копия не сходится.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'backup',
+			nargs='?',
+			default=None,
+			help='Путь к копии (по умолчанию: последняя копия в --out-dir).',
+		)
+		parser.add_argument(
+			'--out-dir',
+			default=str(Path(settings.BASE_DIR) / 'backups'),
+			help='Где искать последнюю копию (по умолчанию: backups/ в корне проекта).',
+		)
+		parser.add_argument(
+			'--database',
+			default='default',
+			help='Postgres: алиас БД, от имени которой создаётся одноразовая база.',
+		)
+		parser.add_argument(
+			'--jobs',
+			type=int,
+			default=settings.BACKUP_PG_JOBS,
+			help='Postgres: параллельных процессов pg_restore (-j).',
+		)
+
+	def handle(self, *args, **options):
+		if options['backup']:
+			backup = Path(options['backup']).resolve()
+		else:
+			out_dir = Path(options['out_dir']).resolve()
+			candidates = list_backups(out_dir, SQLITE_PREFIX) + list_backups(out_dir, POSTGRES_PREFIX)
+			if not candidates:
+				raise CommandError(f'No backups in {out_dir}')
+			# Имя после префикса — метка времени: последняя копия любого вида
+			backup = max(candidates, key=lambda path: path.name.split('_', 1)[1])
+		if not backup.exists():
+			raise CommandError(f'Backup not found: {backup}')
+
+		try:
+			if backup_vendor(backup) == 'sqlite':
+				result = verify_sqlite(backup)
+			else:
+				connection = connections[options['database']]
+				if connection.vendor != 'postgresql':
+					raise CommandError(f'Postgres dump needs a postgresql database, "{options["database"]}" is {connection.vendor}')
+				result = verify_postgres(backup, connection, jobs=options['jobs'])
+		except BackupError as exc:
+			raise CommandError(str(exc)) from exc
+
+		self.stdout.write(f'Backup: {result.backup}')
+		self.stdout.write(
+			f'restore {result.restore_seconds:.2f} s, check {result.check_seconds:.2f} s, '
+			f'total {result.restore_seconds + result.check_seconds:.2f} s'
+		)
+		self.stdout.write(f'{sum(result.row_counts.values())} rows in {len(result.row_counts)} models')
+		if result.integrity != 'ok':
+			self.stdout.write(self.style.ERROR(f'integrity_check: {result.integrity}'))
+		if result.expected is None:
+			self.stdout.write(self.style.WARNING('No manifest next to the backup: row counts not checked.'))
+		for label, expected, actual in result.mismatches:
+			self.stdout.write(self.style.ERROR(f'{label}: expected {expected}, restored {actual}'))
+		if not result.ok:
+			raise CommandError('Backup verification failed.')
+		self.stdout.write(self.style.SUCCESS('Backup verified.'))
@@ -0,0 +1,229 @@
+"""Инкрементальная резервная копия MEDIA_ROOT (команда backup_media).
+
+Копия устроена как хранилище по содержимому:
+- objects/ab/cd/<sha256> — каждый уникальный файл хранится один раз,
+  сколько бы снимков и путей на него ни ссылалось;
+- manifests/media_<timestamp>.json.gz — снимок на момент копии: путь
+  относительно MEDIA_ROOT -> (размер, mtime_ns, sha256). Метка времени
+  совпадает с копией БД того же запуска (backup_db --with-media), поэтому
+  снимок медиа и дамп БД восстанавливаются парой.
+
+Повторный запуск читает предыдущий манифест и не хеширует файлы, у которых
+не изменились размер и mtime, — на неизменном дереве работа сводится к обходу
+каталогов и stat(). Новые и изменённые файлы хешируются в пуле потоков
+(hashlib отпускает GIL на больших блоках, чтение с диска — тоже) за один
+проход с копированием, и в objects/ остаётся только содержимое, которого там
+ещё не было: переименованный или повторно загруженный файл нового объекта не
+добавляет.
+
+Каталоги, которые приложение пересоздаёт само (уменьшенные копии, готовые
+выгрузки), по умолчанию не копируются — см. MEDIA_BACKUP_EXCLUDE.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from .backups import timestamp
+
+
+MEDIA_BACKUP_EXCLUDE = ('derivatives', 'exports')
+MANIFEST_PREFIX = 'media_'
+MANIFEST_SUFFIX = '.json.gz'
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class MediaBackupResult:
+	manifest: Path
+	files: int
+	total_bytes: int
+	hashed: int
+	copied: int
+	copied_bytes: int
+	seconds: float
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+	size: int
+	mtime_ns: int
+	sha256: str
+
+
+def object_path(objects_dir: Path, digest: str) -> Path:
+	return objects_dir / digest[:2] / digest[2:4] / digest
+
+
+def manifest_name(stamp: str) -> str:
+	return f'{MANIFEST_PREFIX}{stamp}{MANIFEST_SUFFIX}'
+
+
+def list_manifests(out_dir: Path) -> list[Path]:
+	manifests_dir = out_dir / 'manifests'
+	if not manifests_dir.is_dir():
+		return []
+	return sorted(
+		path
+		for path in manifests_dir.iterdir()
+		if path.name.startswith(MANIFEST_PREFIX) and path.name.endswith(MANIFEST_SUFFIX)
+	)
+
+
+def read_manifest(path: Path) -> dict[str, ManifestEntry]:
+	with gzip.open(path, 'rt', encoding='utf-8') as fileobj:
+		data = json.load(fileobj)
+	return {name: ManifestEntry(*entry) for name, entry in data['files'].items()}
+
+
+def write_manifest(path: Path, files: dict[str, ManifestEntry], *, stamp: str, root: Path) -> None:
+	data = {
+		'created': stamp,
+		'root': str(root),
+		'files': {name: [entry.size, entry.mtime_ns, entry.sha256] for name, entry in sorted(files.items())},
+	}
+	tmp = path.with_name(f'.{path.name}.tmp')
+	with gzip.GzipFile(tmp, 'wb', mtime=0) as raw:
+		raw.write(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+	os.replace(tmp, path)
+
+
+def scan_tree(root: Path, exclude: tuple[str, ...] = MEDIA_BACKUP_EXCLUDE) -> dict[str, os.stat_result]:
+	"""Файлы под root: относительный путь (через /) -> stat. exclude — каталоги верхнего уровня."""
+
+	found = {}
+	stack = [(root, '')]
+	while stack:
+		directory, prefix = stack.pop()
+		with os.scandir(directory) as entries:
+			for entry in entries:
+				name = prefix + entry.name
+				if entry.is_dir(follow_symlinks=False):
+					if not (not prefix and entry.name in exclude):
+						stack.append((Path(entry.path), name + '/'))
+				elif entry.is_file(follow_symlinks=False) and not entry.name.startswith('.'):
+					found[name] = entry.stat(follow_symlinks=False)
+	return found
+
+
+def _store(source: Path, objects_dir: Path) -> tuple[str, int]:
+	"""Хеширует source и, если такого содержимого нет в objects/, копирует его туда.
+
+	Файл копируется во временный с одновременным подсчётом хеша — один проход
+	по данным, и в манифест попадает хеш именно скопированных байтов, даже
+	если файл меняли во время копии. Возвращает (sha256, скопировано байт).
+	"""
+
+	tmp = objects_dir / f'.{os.getpid()}-{threading.get_ident()}.tmp'
+	hasher = hashlib.sha256()
+	copied = 0
+	try:
+		with open(source, 'rb') as src, open(tmp, 'wb') as dst:
+			while chunk := src.read(COPY_CHUNK_SIZE):
+				hasher.update(chunk)
+				dst.write(chunk)
+				copied += len(chunk)
+		digest = hasher.hexdigest()
+		target = object_path(objects_dir, digest)
+		if target.exists():
+			return digest, 0
+		target.parent.mkdir(parents=True, exist_ok=True)
+		os.replace(tmp, target)
+		return digest, copied
+	finally:
+		tmp.unlink(missing_ok=True)
+
+
+def backup_media(
+	root: Path,
+	out_dir: Path,
+	*,
+	stamp: str | None = None,
+	workers: int = 4,
+	exclude: tuple[str, ...] = MEDIA_BACKUP_EXCLUDE,
+) -> MediaBackupResult:
+	"""Снимок root в out_dir: копирует только новое содержимое и пишет манифест."""
+
+	started = time.perf_counter()
+	stamp = stamp or timestamp()
+	objects_dir = out_dir / 'objects'
+	manifests_dir = out_dir / 'manifests'
+	objects_dir.mkdir(parents=True, exist_ok=True)
+	manifests_dir.mkdir(parents=True, exist_ok=True)
+
+	previous_manifests = list_manifests(out_dir)
+	previous = read_manifest(previous_manifests[-1]) if previous_manifests else {}
+
+	files: dict[str, ManifestEntry] = {}
+	pending: list[tuple[str, os.stat_result]] = []
+	for name, stat in scan_tree(root, exclude).items():
+		entry = previous.get(name)
+		# Размер и mtime те же, объект на месте (его не удаляли из копии вручную) — не читаем файл
+		if (
+			entry
+			and entry.size == stat.st_size
+			and entry.mtime_ns == stat.st_mtime_ns
+			and object_path(objects_dir, entry.sha256).exists()
+		):
+			files[name] = entry
+		else:
+			pending.append((name, stat))
+
+	copied = copied_bytes = hashed = 0
+	if pending:
+		with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+			futures = [(name, stat, pool.submit(_store, root / name, objects_dir)) for name, stat in pending]
+			for name, stat, future in futures:
+				try:
+					digest, size = future.result()
+				except FileNotFoundError:
+					# Файл удалили между обходом и копией: в снимок он не попадает
+					continue
+				hashed += 1
+				copied += bool(size)
+				copied_bytes += size
+				files[name] = ManifestEntry(stat.st_size, stat.st_mtime_ns, digest)
+
+	manifest = manifests_dir / manifest_name(stamp)
+	write_manifest(manifest, files, stamp=stamp, root=root)
+	return MediaBackupResult(
+		manifest=manifest,
+		files=len(files),
+		total_bytes=sum(entry.size for entry in files.values()),
+		hashed=hashed,
+		copied=copied,
+		copied_bytes=copied_bytes,
+		seconds=time.perf_counter() - started,
+	)
+
+
+def prune_media_backups(out_dir: Path, keep: int) -> tuple[list[Path], int]:
+	"""Оставляет keep последних манифестов и удаляет объекты, на которые они не ссылаются.
+
+	Возвращает (удалённые манифесты, число удалённых объектов).
+	"""
+
+	manifests = list_manifests(out_dir)
+	if keep <= 0 or len(manifests) <= keep:
+		return [], 0
+	removed = manifests[:-keep]
+	for path in removed:
+		path.unlink()
+
+	referenced = set()
+	for path in manifests[-keep:]:
+		referenced.update(entry.sha256 for entry in read_manifest(path).values())
+	deleted = 0
+	for path in (out_dir / 'objects').glob('??/??/*'):
+		if path.name not in referenced and not path.name.startswith('.'):
+			path.unlink()
+			deleted += 1
+	return removed, deleted
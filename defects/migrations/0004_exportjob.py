@@ -0,0 +1,40 @@
+# Generated by Django 5.2.9 on 2026-10-17 06:24
+
+import defects.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0003_defecthistory_projectstage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(choices=[('csv', 'CSV'), ('xlsx', 'Excel')], max_length=8, verbose_name='Формат')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка'), ('expired', 'Срок хранения истёк')], default='pending', max_length=16, verbose_name='Статус')),
+                ('total_rows', models.PositiveIntegerField(default=0, verbose_name='Всего строк')),
+                ('processed_rows', models.PositiveIntegerField(default=0, verbose_name='Обработано строк')),
+                ('file', models.FileField(blank=True, upload_to=defects.models.export_upload_to, verbose_name='Файл')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начато')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='Хранится до')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Выгрузка',
+                'verbose_name_plural': 'Выгрузки',
+                'ordering': ('-created_at', '-id'),
+                'indexes': [models.Index(fields=['status', 'created_at'], name='defects_exp_status_113ad0_idx'), models.Index(fields=['user', 'created_at'], name='defects_exp_user_id_dced41_idx')],
+            },
+        ),
+    ]
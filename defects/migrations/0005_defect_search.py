@@ -0,0 +1,61 @@
+# Generated by Django 5.2.9 on 2026-10-17 06:26
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# DDL и первичное заполнение индекса — копия defects.search на момент этой
+# миграции: живой модуль может измениться, а миграция должна остаться прежней
+FTS_TABLE = 'defects_defect_fts'
+PG_INDEX = 'defects_defect_search_gin'
+PG_VECTOR_SQL = (
+    "setweight(to_tsvector('russian', coalesce(d.title, '')), 'A')"
+    " || setweight(to_tsvector('russian', coalesce(d.description, '')), 'B')"
+    " || setweight(to_tsvector('russian', coalesce(p.name, '') || ' ' || coalesce(p.address, '')), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    defects_table = apps.get_model('defects', 'Defect')._meta.db_table
+    projects_table = apps.get_model('defects', 'Project')._meta.db_table
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {PG_INDEX} ON {defects_table} USING gin (search_vector)')
+        schema_editor.execute(
+            f'UPDATE {defects_table} AS d SET search_vector = {PG_VECTOR_SQL} '
+            f'FROM {projects_table} AS p WHERE p.id = d.project_id'
+        )
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+            "USING fts5(title, description, project, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(f'DELETE FROM {FTS_TABLE}')
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, project) '
+            f"SELECT d.id, d.title, d.description, coalesce(p.name, '') || ' ' || coalesce(p.address, '') "
+            f'FROM {defects_table} d JOIN {projects_table} p ON p.id = d.project_id'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {PG_INDEX}')
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0004_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='defect',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
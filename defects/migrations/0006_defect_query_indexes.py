@@ -0,0 +1,47 @@
+# Generated by Django 5.2.9 on 2026-10-17 06:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0005_defect_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='defect',
+            name='defects_def_deadlin_d368ad_idx',
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['created_at', 'id'], name='defect_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['deadline', 'id'], name='defect_deadline_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['priority', 'id'], name='defect_priority_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['status', 'id'], name='defect_status_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['executor', 'created_at', 'id'], name='defect_executor_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['project', 'created_at', 'id'], name='defect_project_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(condition=models.Q(('status__in', ['new', 'in_progress', 'on_review'])), fields=['deadline'], name='defect_open_deadline_idx'),
+        ),
+    ]
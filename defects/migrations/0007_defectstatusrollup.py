@@ -0,0 +1,48 @@
+# Generated by Django 5.2.9 on 2026-10-17 06:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_rollup(apps, schema_editor):
+    Defect = apps.get_model('defects', 'Defect')
+    DefectStatusRollup = apps.get_model('defects', 'DefectStatusRollup')
+    db = schema_editor.connection.alias
+
+    rows = (
+        Defect.objects.using(db)
+        .values('project_id', 'status', 'priority')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    DefectStatusRollup.objects.using(db).bulk_create(
+        [DefectStatusRollup(**row) for row in rows],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0006_defect_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DefectStatusRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('new', 'Новая'), ('in_progress', 'В работе'), ('on_review', 'На проверке'), ('closed', 'Закрыта'), ('cancelled', 'Отменена')], max_length=32, verbose_name='Статус')),
+                ('priority', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High')], max_length=16, verbose_name='Приоритет')),
+                ('total', models.IntegerField(default=0, verbose_name='Количество')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_rollups', to='defects.project', verbose_name='Проект')),
+            ],
+            options={
+                'verbose_name': 'Сводка по дефектам',
+                'verbose_name_plural': 'Сводка по дефектам',
+                'constraints': [models.UniqueConstraint(fields=('project', 'status', 'priority'), name='defect_rollup_unique')],
+            },
+        ),
+        migrations.RunPython(fill_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.9 on 2026-10-17 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0007_defectstatusrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='Отчёт')),
+                ('watermark', models.BigIntegerField(default=0, verbose_name='Последний обработанный id')),
+                ('state', models.JSONField(blank=True, default=dict, verbose_name='Агрегаты')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлён')),
+            ],
+            options={
+                'verbose_name': 'Состояние отчёта',
+                'verbose_name_plural': 'Состояния отчётов',
+            },
+        ),
+    ]
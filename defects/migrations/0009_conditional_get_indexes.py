@@ -0,0 +1,35 @@
+# Generated by Django 5.2.9 on 2026-10-17 07:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0008_reportstate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attachment',
+            index=models.Index(fields=['defect', 'uploaded_at'], name='attachment_defect_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['defect', 'created_at'], name='comment_defect_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['updated_at'], name='defect_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['executor', 'updated_at'], name='defect_executor_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['project', 'updated_at'], name='defect_project_updated_idx'),
+        ),
+    ]
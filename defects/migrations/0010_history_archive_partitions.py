@@ -0,0 +1,45 @@
+# Generated by Django 5.2.9 on 2026-10-17 07:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def partition_history(apps, schema_editor):
+    from defects.partitions import partition_history_table
+
+    # Только PostgreSQL: на остальных СУБД функция ничего не делает
+    partition_history_table(schema_editor.connection)
+
+
+def unpartition_history(apps, schema_editor):
+    from defects.partitions import unpartition_history_table
+
+    unpartition_history_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0009_conditional_get_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DefectHistoryArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('events_count', models.PositiveIntegerField(verbose_name='Событий')),
+                ('first_event_at', models.DateTimeField(verbose_name='Первое событие')),
+                ('last_event_at', models.DateTimeField(verbose_name='Последнее событие')),
+                ('data', models.BinaryField(verbose_name='События (сжатый JSON)')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Архивировано')),
+                ('defect', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='history_archives', to='defects.defect', verbose_name='Дефект')),
+            ],
+            options={
+                'verbose_name': 'Архив истории дефекта',
+                'verbose_name_plural': 'Архив истории дефектов',
+                'ordering': ('-last_event_at', '-id'),
+            },
+        ),
+        migrations.RunPython(partition_history, unpartition_history),
+    ]
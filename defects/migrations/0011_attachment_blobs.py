@@ -0,0 +1,45 @@
+# Generated by Django 5.2.9 on 2026-10-17 07:27
+
+import defects.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0010_history_archive_partitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttachmentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('file', models.FileField(max_length=255, upload_to='', verbose_name='Файл')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Размер, байт')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Содержимое вложения',
+                'verbose_name_plural': 'Содержимое вложений',
+            },
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='original_name',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Имя файла'),
+        ),
+        migrations.AlterField(
+            model_name='attachment',
+            name='file',
+            field=models.FileField(max_length=255, upload_to=defects.models.attachment_upload_to, verbose_name='Файл'),
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='attachments', to='defects.attachmentblob', verbose_name='Содержимое'),
+        ),
+    ]
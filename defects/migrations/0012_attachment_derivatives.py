@@ -0,0 +1,47 @@
+# Generated by Django 5.2.9 on 2026-10-17 07:33
+
+from django.db import migrations, models
+
+
+def queue_existing_images(apps, schema_editor):
+    from defects.derivatives import is_image_name
+
+    AttachmentBlob = apps.get_model('defects', 'AttachmentBlob')
+    blobs = AttachmentBlob.objects.using(schema_editor.connection.alias)
+    images = [pk for pk, name in blobs.values_list('pk', 'file') if is_image_name(name)]
+    blobs.filter(pk__in=images).update(derivatives_status='pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0011_attachment_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachmentblob',
+            name='derivatives_error',
+            field=models.TextField(blank=True, verbose_name='Ошибка обработки'),
+        ),
+        migrations.AddField(
+            model_name='attachmentblob',
+            name='derivatives_status',
+            field=models.CharField(choices=[('none', 'Не изображение'), ('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='none', max_length=16, verbose_name='Уменьшенные копии'),
+        ),
+        migrations.AddField(
+            model_name='attachmentblob',
+            name='preview',
+            field=models.FileField(blank=True, max_length=255, upload_to='', verbose_name='Превью'),
+        ),
+        migrations.AddField(
+            model_name='attachmentblob',
+            name='thumbnail',
+            field=models.FileField(blank=True, max_length=255, upload_to='', verbose_name='Миниатюра'),
+        ),
+        migrations.AddIndex(
+            model_name='attachmentblob',
+            index=models.Index(fields=['derivatives_status', 'id'], name='blob_derivatives_queue_idx'),
+        ),
+        migrations.RunPython(queue_existing_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-17 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0012_attachment_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportstate',
+            name='pending_ids',
+            field=models.JSONField(blank=True, default=list, verbose_name='Пропущенные id'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-17 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0013_reportstate_pending_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachmentblob',
+            name='derivatives_claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Взят в обработку'),
+        ),
+    ]
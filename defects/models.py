@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import datetime as dt
+
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
 
 
 class Project(models.Model):
@@ -45,6 +49,18 @@ class ProjectStage(models.Model):
 		return f"{self.project}: {self.name}"
 
 
+class DefectQuerySet(models.QuerySet):
+	def open(self):
+		"""Незакрытые дефекты (не закрыты и не отменены)."""
+
+		return self.filter(status__in=Defect.OPEN_STATUSES)
+
+	def overdue(self, today: dt.date | None = None):
+		"""Открытые дефекты с истёкшим сроком (покрыто частичным индексом по deadline)."""
+
+		return self.open().filter(deadline__lt=today or timezone.localdate())
+
+
 class Defect(models.Model):
 	"""Дефект на объекте.
 
@@ -63,6 +79,8 @@ class Defect(models.Model):
 		CLOSED = 'closed', 'Закрыта'
 		CANCELLED = 'cancelled', 'Отменена'
 
+	OPEN_STATUSES = (Status.NEW, Status.IN_PROGRESS, Status.ON_REVIEW)
+
 	title = models.CharField(max_length=255, verbose_name='Заголовок')
 	description = models.TextField(verbose_name='Описание')
 	priority = models.CharField(
@@ -97,18 +115,58 @@ class Defect(models.Model):
 	created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
 	updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
 
+	# Поисковый вектор для PostgreSQL (GIN-индекс создаётся миграцией).
+	# На SQLite не используется: там поиск идёт через FTS5 (см. defects.search).
+	search_vector = SearchVectorField(null=True, editable=False, verbose_name='Поисковый вектор')
+
+	objects = DefectQuerySet.as_manager()
+
 	class Meta:
 		verbose_name = 'Дефект'
 		verbose_name_plural = 'Дефекты'
 		ordering = ('-created_at',)
+		# Индексы повторяют реальные формы запросов (см. tests/test_query_plans.py):
+		# сортировки дашборда с id как tie-breaker для курсоров, область инженера,
+		# дефекты проекта и просроченные открытые дефекты.
 		indexes = [
 			models.Index(fields=['status', 'priority']),
-			models.Index(fields=['deadline']),
+			models.Index(fields=['created_at', 'id'], name='defect_created_id_idx'),
+			models.Index(fields=['deadline', 'id'], name='defect_deadline_id_idx'),
+			models.Index(fields=['priority', 'id'], name='defect_priority_id_idx'),
+			models.Index(fields=['status', 'id'], name='defect_status_id_idx'),
+			models.Index(fields=['executor', 'created_at', 'id'], name='defect_executor_created_idx'),
+			models.Index(fields=['project', 'created_at', 'id'], name='defect_project_created_idx'),
+			# Валидаторы conditional GET: последний updated_at в области видимости
+			models.Index(fields=['updated_at'], name='defect_updated_idx'),
+			models.Index(fields=['executor', 'updated_at'], name='defect_executor_updated_idx'),
+			models.Index(fields=['project', 'updated_at'], name='defect_project_updated_idx'),
+			# Условие совпадает с Defect.OPEN_STATUSES (из Meta на атрибут класса не сослаться)
+			models.Index(
+				fields=['deadline'],
+				name='defect_open_deadline_idx',
+				condition=models.Q(status__in=['new', 'in_progress', 'on_review']),
+			),
 		]
 
 	def __str__(self) -> str:
 		return f"{self.title} ({self.get_status_display()})"
 
+	@classmethod
+	def from_db(cls, db, field_names, values):
+		instance = super().from_db(db, field_names, values)
+		# Запоминаем ключ сводки на момент загрузки, чтобы при save/delete
+		# перенести дефект из старой ячейки DefectStatusRollup в новую
+		instance._loaded_rollup_key = instance.rollup_key()
+		return instance
+
+	def rollup_key(self) -> tuple | None:
+		"""(project_id, status, priority) или None, если поля не загружены (.only/.defer)."""
+
+		values = self.__dict__
+		if not {'project_id', 'status', 'priority'} <= values.keys():
+			return None
+		return values['project_id'], values['status'], values['priority']
+
 	def clean(self) -> None:
 		if self.project and self.project.end_date and self.deadline > self.project.end_date:
 			raise ValidationError({'deadline': 'Deadline не должен быть позже даты окончания проекта.'})
@@ -168,23 +226,112 @@ class Defect(models.Model):
 		return False
 
 
+class DefectStatusRollup(models.Model):
+	"""Сводка: число дефектов по (проект, статус, приоритет).
+
+	Поддерживается инкрементально сигналами Defect в той же транзакции, что и
+	запись дефекта; аналитика читает её вместо GROUP BY по всей таблице.
+	Сверка и пересборка — команда rebuild_defect_rollup.
+	"""
+
+	project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='status_rollups', verbose_name='Проект')
+	status = models.CharField(max_length=32, choices=Defect.Status.choices, verbose_name='Статус')
+	priority = models.CharField(max_length=16, choices=Defect.Priority.choices, verbose_name='Приоритет')
+	total = models.IntegerField(default=0, verbose_name='Количество')
+
+	class Meta:
+		verbose_name = 'Сводка по дефектам'
+		verbose_name_plural = 'Сводка по дефектам'
+		constraints = [
+			models.UniqueConstraint(fields=['project', 'status', 'priority'], name='defect_rollup_unique'),
+		]
+
+	def __str__(self) -> str:
+		return f"{self.project_id}/{self.status}/{self.priority}: {self.total}"
+
+
 def attachment_upload_to(instance: 'Attachment', filename: str) -> str:
 	return f"attachments/defect_{instance.defect_id}/{filename}"
 
 
+class AttachmentBlob(models.Model):
+	"""Содержимое вложения в контентно-адресуемом хранилище (см. defects.blobs).
+
+	Файл лежит по пути из SHA-256 содержимого и хранится один раз, сколько бы
+	вложений на него ни ссылалось; refcount — число таких вложений.
+
+	Для фотографий worker run_derivative_jobs строит уменьшенные копии
+	(миниатюру и превью, без EXIF); derivatives_status — очередь этой работы,
+	derivatives_claimed_at — когда worker забрал blob (для возврата зависших).
+	"""
+
+	class Derivatives(models.TextChoices):
+		NONE = 'none', 'Не изображение'
+		PENDING = 'pending', 'В очереди'
+		RUNNING = 'running', 'Выполняется'
+		DONE = 'done', 'Готово'
+		FAILED = 'failed', 'Ошибка'
+
+	sha256 = models.CharField(max_length=64, unique=True, verbose_name='SHA-256')
+	file = models.FileField(max_length=255, verbose_name='Файл')
+	size = models.PositiveBigIntegerField(verbose_name='Размер, байт')
+	refcount = models.PositiveIntegerField(default=0, verbose_name='Ссылок')
+	created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+	derivatives_status = models.CharField(
+		max_length=16,
+		choices=Derivatives.choices,
+		default=Derivatives.NONE,
+		verbose_name='Уменьшенные копии',
+	)
+	thumbnail = models.FileField(max_length=255, blank=True, verbose_name='Миниатюра')
+	preview = models.FileField(max_length=255, blank=True, verbose_name='Превью')
+	derivatives_error = models.TextField(blank=True, verbose_name='Ошибка обработки')
+	derivatives_claimed_at = models.DateTimeField(null=True, blank=True, verbose_name='Взят в обработку')
+
+	class Meta:
+		verbose_name = 'Содержимое вложения'
+		verbose_name_plural = 'Содержимое вложений'
+		indexes = [
+			models.Index(fields=['derivatives_status', 'id'], name='blob_derivatives_queue_idx'),
+		]
+
+	def __str__(self) -> str:
+		return self.sha256
+
+
 class Attachment(models.Model):
-	"""Вложение (фото/документ) к дефекту."""
+	"""Вложение (фото/документ) к дефекту.
+
+	При контентно-адресуемом хранении file указывает на файл blob, а имя,
+	под которым файл загрузили, хранится в original_name.
+	"""
 
 	defect = models.ForeignKey(Defect, on_delete=models.CASCADE, related_name='attachments', verbose_name='Дефект')
-	file = models.FileField(upload_to=attachment_upload_to, verbose_name='Файл')
+	file = models.FileField(upload_to=attachment_upload_to, max_length=255, verbose_name='Файл')
+	blob = models.ForeignKey(
+		AttachmentBlob,
+		on_delete=models.PROTECT,
+		null=True,
+		blank=True,
+		related_name='attachments',
+		verbose_name='Содержимое',
+	)
+	original_name = models.CharField(max_length=255, blank=True, verbose_name='Имя файла')
 	uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата загрузки')
 
 	class Meta:
 		verbose_name = 'Вложение'
 		verbose_name_plural = 'Вложения'
+		indexes = [
+			models.Index(fields=['defect', 'uploaded_at'], name='attachment_defect_uploaded_idx'),
+		]
 
 	def __str__(self) -> str:
-		return self.file.name
+		return self.display_name
+
+	@property
+	def display_name(self) -> str:
+		return self.original_name or self.file.name
 
 
 class Comment(models.Model):
@@ -199,6 +346,9 @@ class Comment(models.Model):
 		verbose_name = 'Комментарий'
 		verbose_name_plural = 'Комментарии'
 		ordering = ('created_at',)
+		indexes = [
+			models.Index(fields=['defect', 'created_at'], name='comment_defect_created_idx'),
+		]
 
 	def __str__(self) -> str:
 		return f"Комментарий #{self.pk}"
@@ -240,3 +390,115 @@ class DefectHistory(models.Model):
 
 	def __str__(self) -> str:
 		return f"Defect#{self.defect_id}: {self.get_action_display()}"
+
+
+class DefectHistoryArchive(models.Model):
+	"""Архив истории дефекта: события, перенесённые из DefectHistory.
+
+	События хранятся сжатым JSON (zlib) одной строкой на дефект и запуск
+	архивации; читать их через defects.archive.load_archived_history().
+	"""
+
+	defect = models.ForeignKey(Defect, on_delete=models.CASCADE, related_name='history_archives', verbose_name='Дефект')
+	events_count = models.PositiveIntegerField(verbose_name='Событий')
+	first_event_at = models.DateTimeField(verbose_name='Первое событие')
+	last_event_at = models.DateTimeField(verbose_name='Последнее событие')
+	data = models.BinaryField(verbose_name='События (сжатый JSON)')
+	archived_at = models.DateTimeField(auto_now_add=True, verbose_name='Архивировано')
+
+	class Meta:
+		verbose_name = 'Архив истории дефекта'
+		verbose_name_plural = 'Архив истории дефектов'
+		ordering = ('-last_event_at', '-id')
+
+	def __str__(self) -> str:
+		return f"Defect#{self.defect_id}: {self.events_count} событий"
+
+
+def export_upload_to(instance: 'ExportJob', filename: str) -> str:
+	return f"exports/user_{instance.user_id}/{filename}"
+
+
+class ExportJob(models.Model):
+	"""Фоновая выгрузка дефектов в CSV/XLSX.
+
+	Задание создаётся из UI, а файл собирает команда `run_export_jobs`
+	вне цикла запроса. Готовые файлы удаляются по истечении expires_at.
+	"""
+
+	class Format(models.TextChoices):
+		CSV = 'csv', 'CSV'
+		XLSX = 'xlsx', 'Excel'
+
+	class Status(models.TextChoices):
+		PENDING = 'pending', 'В очереди'
+		RUNNING = 'running', 'Выполняется'
+		DONE = 'done', 'Готово'
+		FAILED = 'failed', 'Ошибка'
+		EXPIRED = 'expired', 'Срок хранения истёк'
+
+	user = models.ForeignKey(
+		settings.AUTH_USER_MODEL,
+		on_delete=models.CASCADE,
+		related_name='export_jobs',
+		verbose_name='Пользователь',
+	)
+	format = models.CharField(max_length=8, choices=Format.choices, verbose_name='Формат')
+	status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING, verbose_name='Статус')
+	total_rows = models.PositiveIntegerField(default=0, verbose_name='Всего строк')
+	processed_rows = models.PositiveIntegerField(default=0, verbose_name='Обработано строк')
+	file = models.FileField(upload_to=export_upload_to, blank=True, verbose_name='Файл')
+	error = models.TextField(blank=True, verbose_name='Ошибка')
+	created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+	started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начато')
+	finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Завершено')
+	expires_at = models.DateTimeField(null=True, blank=True, verbose_name='Хранится до')
+
+	class Meta:
+		verbose_name = 'Выгрузка'
+		verbose_name_plural = 'Выгрузки'
+		ordering = ('-created_at', '-id')
+		indexes = [
+			models.Index(fields=['status', 'created_at']),
+			models.Index(fields=['user', 'created_at']),
+		]
+
+	def __str__(self) -> str:
+		return f"Export#{self.pk} ({self.get_format_display()}, {self.get_status_display()})"
+
+	@property
+	def progress(self) -> int:
+		"""Процент готовности (0-100)."""
+
+		if self.status == self.Status.DONE:
+			return 100
+		if not self.total_rows:
+			return 0
+		return min(99, self.processed_rows * 100 // self.total_rows)
+
+	@property
+	def is_ready(self) -> bool:
+		return self.status == self.Status.DONE and bool(self.file)
+
+
+class ReportState(models.Model):
+	"""Состояние инкрементального отчёта: водяной знак и накопленные агрегаты.
+
+	watermark — id последнего обработанного события DefectHistory; следующий
+	запуск обрабатывает только более новые события (см. defects.sla).
+	pending_ids — id не выше watermark, которых при запуске ещё не было видно
+	(транзакция не закоммичена); они учитываются, когда появятся.
+	"""
+
+	name = models.CharField(max_length=64, unique=True, verbose_name='Отчёт')
+	watermark = models.BigIntegerField(default=0, verbose_name='Последний обработанный id')
+	pending_ids = models.JSONField(default=list, blank=True, verbose_name='Пропущенные id')
+	state = models.JSONField(default=dict, blank=True, verbose_name='Агрегаты')
+	updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлён')
+
+	class Meta:
+		verbose_name = 'Состояние отчёта'
+		verbose_name_plural = 'Состояния отчётов'
+
+	def __str__(self) -> str:
+		return f"{self.name} (до #{self.watermark})"
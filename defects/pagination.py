@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidCursor(InvalidPage):
+	pass
+
+
+@dataclass
+class KeysetPage:
+	"""Страница keyset-пагинации.
+
+	В отличие от django.core.paginator.Page не знает общего числа строк и
+	номера страницы: наружу отдаются только курсоры соседних страниц.
+	"""
+
+	object_list: list[Any]
+	has_next: bool
+	has_previous: bool
+	next_cursor: str = ''
+	previous_cursor: str = ''
+	is_keyset: bool = field(default=True, init=False)
+
+	def __iter__(self):
+		return iter(self.object_list)
+
+	def __len__(self) -> int:
+		return len(self.object_list)
+
+	def has_other_pages(self) -> bool:
+		return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+	"""Пагинация по курсору (keyset / seek method).
+
+	Страница выбирается условием `(field, id) > (value, last_id)` вместо OFFSET,
+	поэтому глубокие страницы стоят столько же, сколько первая, и COUNT(*)
+	не нужен. id — tie-breaker для неуникальных полей сортировки.
+
+	ordering — одно не-NULL поле модели, например '-created_at'.
+	"""
+
+	def __init__(self, queryset, per_page: int, ordering: str):
+		self.queryset = queryset
+		self.per_page = per_page
+		self.descending = ordering.startswith('-')
+		self.field_name = ordering.lstrip('-')
+		self.model_field = queryset.model._meta.get_field(self.field_name)
+
+	def _ordering(self, reverse: bool) -> tuple[str, str]:
+		desc = self.descending != reverse
+		prefix = '-' if desc else ''
+		return f'{prefix}{self.field_name}', f'{prefix}id'
+
+	def _seek(self, value, pk: int, reverse: bool) -> Q:
+		# «после» в порядке сортировки: для убывания — меньше, для возрастания — больше
+		op = 'lt' if self.descending != reverse else 'gt'
+		return Q(**{f'{self.field_name}__{op}': value}) | Q(**{self.field_name: value, f'id__{op}': pk})
+
+	def encode_cursor(self, obj, direction: str) -> str:
+		value = getattr(obj, self.field_name)
+		if hasattr(value, 'isoformat'):
+			value = value.isoformat()
+		payload = json.dumps({'v': value, 'id': obj.pk, 'd': direction}, separators=(',', ':'))
+		return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+	def decode_cursor(self, cursor: str) -> tuple[Any, int, str]:
+		try:
+			padded = cursor + '=' * (-len(cursor) % 4)
+			payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+			value = self.model_field.to_python(payload['v'])
+			pk = int(payload['id'])
+			direction = payload['d']
+		except (ValueError, KeyError, TypeError) as exc:
+			raise InvalidCursor('Некорректный курсор страницы') from exc
+		if direction not in {'next', 'prev'}:
+			raise InvalidCursor('Некорректный курсор страницы')
+		return value, pk, direction
+
+	def page(self, cursor: str | None = None) -> KeysetPage:
+		if not cursor:
+			rows = list(self.queryset.order_by(*self._ordering(False))[: self.per_page + 1])
+			has_next = len(rows) > self.per_page
+			rows = rows[: self.per_page]
+			return self._make_page(rows, has_next=has_next, has_previous=False)
+
+		value, pk, direction = self.decode_cursor(cursor)
+		if direction == 'next':
+			qs = self.queryset.filter(self._seek(value, pk, False)).order_by(*self._ordering(False))
+			rows = list(qs[: self.per_page + 1])
+			has_next = len(rows) > self.per_page
+			return self._make_page(rows[: self.per_page], has_next=has_next, has_previous=True)
+
+		# Назад: идём в обратном порядке от курсора и разворачиваем результат
+		qs = self.queryset.filter(self._seek(value, pk, True)).order_by(*self._ordering(True))
+		rows = list(qs[: self.per_page + 1])
+		has_previous = len(rows) > self.per_page
+		rows = rows[: self.per_page]
+		rows.reverse()
+		return self._make_page(rows, has_next=True, has_previous=has_previous)
+
+	def _make_page(self, rows: list, *, has_next: bool, has_previous: bool) -> KeysetPage:
+		return KeysetPage(
+			object_list=rows,
+			has_next=has_next,
+			has_previous=has_previous,
+			next_cursor=self.encode_cursor(rows[-1], 'next') if has_next and rows else '',
+			previous_cursor=self.encode_cursor(rows[0], 'prev') if has_previous and rows else '',
+		)
+
+
+class EstimatedCountPaginator(Paginator):
+	"""Paginator с дешёвым подсчётом строк вместо точного COUNT(*) по всей выборке.
+
+	- Сначала считается ограниченный COUNT по LIMIT threshold + 1: для небольших
+	  выборок это и есть точное число.
+	- Выше порога берётся закэшированный точный COUNT для того же SQL, если он есть.
+	- Иначе на PostgreSQL используется оценка планировщика (pg_class.reltuples для
+	  таблицы без фильтров, EXPLAIN для фильтрованного запроса), а точный COUNT
+	  считается в фоновом потоке, вне запроса, и кладётся в кэш для следующих.
+	- На остальных СУБД точный COUNT считается один раз в запросе.
+	Точный COUNT хранится PAGINATOR_COUNT_CACHE_TTL секунд.
+
+	Пока число — оценка (is_approximate), она может быть завышена: ссылки на
+	последние страницы (get_elided_page_range) не выводятся.
+
+	Подходит и для ModelAdmin.paginator (сигнатура совпадает с Paginator).
+	"""
+
+	def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+		super().__init__(object_list, per_page, orphans, allow_empty_first_page, **kwargs)
+		self.threshold = settings.PAGINATOR_EXACT_COUNT_THRESHOLD
+		self.cache_ttl = settings.PAGINATOR_COUNT_CACHE_TTL
+		self.is_approximate = False
+		self.exact_count_thread: threading.Thread | None = None
+
+	@cached_property
+	def bounded_count(self) -> int:
+		"""COUNT по LIMIT threshold + 1: точное число строк, если их не больше порога."""
+
+		return self.object_list.order_by()[: self.threshold + 1].count()
+
+	def has_more_than(self, rows: int) -> bool:
+		"""Больше ли rows строк в выборке; при rows не выше порога — тем же запросом, что и count."""
+
+		if rows <= self.threshold and hasattr(self.object_list, 'query'):
+			return self.bounded_count > rows
+		return self.count > rows
+
+	@cached_property
+	def count(self) -> int:
+		qs = self.object_list
+		if not hasattr(qs, 'query'):
+			return super().count
+
+		qs = qs.order_by()
+		bounded = self.bounded_count
+		if bounded <= self.threshold:
+			return bounded
+
+		key = self._cache_key(qs)
+		cached = cache.get(key)
+		if cached is not None:
+			return cached
+
+		estimate = self._planner_estimate(qs)
+		if estimate is not None:
+			self.is_approximate = True
+			self.exact_count_thread = self._cache_exact_count_later(qs, key)
+			# Оценка может быть заниженной, но порог мы уже точно превысили
+			return max(estimate, bounded)
+
+		total = qs.count()
+		cache.set(key, total, self.cache_ttl)
+		return total
+
+	def _cache_exact_count_later(self, qs, key: str) -> threading.Thread | None:
+		"""Считает точный COUNT в фоновом потоке (своё соединение с БД) и кладёт в кэш.
+
+		Один поток на ключ: пока считается, остальные запросы берут оценку.
+		"""
+
+		if not cache.add(f'{key}:pending', 1, self.cache_ttl):
+			return None
+		cache_ttl = self.cache_ttl
+
+		def run() -> None:
+			try:
+				cache.set(key, qs.count(), cache_ttl)
+			except Exception:
+				logger.exception('Exact count for paginator failed')
+			finally:
+				cache.delete(f'{key}:pending')
+				connections.close_all()
+
+		thread = threading.Thread(target=run, name='paginator-count', daemon=True)
+		thread.start()
+		return thread
+
+	def get_elided_page_range(self, number=1, *, on_each_side=3, on_ends=2):
+		if not self.count or not self.is_approximate:
+			yield from super().get_elided_page_range(number, on_each_side=on_each_side, on_ends=on_ends)
+			return
+		# Оценка может быть завышена: без ссылок на последние страницы, они могут оказаться пустыми
+		number = self.validate_number(number)
+		start = max(1, number - on_each_side)
+		if start > on_ends + 2:
+			yield from range(1, on_ends + 1)
+			yield self.ELLIPSIS
+		else:
+			start = 1
+		end = min(number + on_each_side, self.num_pages)
+		yield from range(start, end + 1)
+		if end < self.num_pages:
+			yield self.ELLIPSIS
+
+	@property
+	def count_display(self) -> str:
+		total = self.count
+		if not self.is_approximate:
+			return str(total)
+		if total <= self.threshold + 1:
+			return f'более {self.threshold}'
+		return f'≈ {total}'
+
+	@staticmethod
+	def _cache_key(qs) -> str:
+		sql, params = qs.query.sql_with_params()
+		digest = hashlib.sha1(repr((qs.db, sql, params)).encode()).hexdigest()
+		return f'paginator-count:{digest}'
+
+	@staticmethod
+	def _planner_estimate(qs) -> int | None:
+		connection = connections[qs.db]
+		if connection.vendor != 'postgresql':
+			return None
+
+		with connection.cursor() as cursor:
+			if not qs.query.where:
+				cursor.execute(
+					'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+					[qs.model._meta.db_table],
+				)
+				row = cursor.fetchone()
+				# reltuples = -1, пока таблица ни разу не анализировалась
+				if row and row[0] >= 0:
+					return int(row[0])
+				return None
+
+			sql, params = qs.query.sql_with_params()
+			cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+			plan = cursor.fetchone()[0]
+			if isinstance(plan, str):
+				plan = json.loads(plan)
+			return int(plan[0]['Plan']['Plan Rows'])
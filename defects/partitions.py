@@ -0,0 +1,216 @@
+"""Помесячное секционирование таблицы истории дефектов (только PostgreSQL).
+
+Таблица DefectHistory секционируется по RANGE (created_at): по секции на
+календарный месяц (UTC) плюс секция DEFAULT для всего, что не попало в
+созданные месяцы. Запросы карточки дефекта и SLA идут по индексу
+(defect, created_at), который создаётся на родительской таблице и
+наследуется секциями; старые месяцы, опустевшие после архивации
+(defects.archive), удаляются целиком без VACUUM.
+
+Первичный ключ секционированной таблицы обязан включать ключ секции, поэтому
+в БД он (id, created_at); для Django первичным ключом остаётся id
+(уникальность даёт identity-последовательность).
+
+Секции создаются заранее на months_ahead месяцев вперёд командой
+manage_history_partitions (раз в месяц по cron). Если строки всё же попали в
+DEFAULT, при создании секции месяца они переносятся в неё.
+
+На SQLite и других СУБД все функции ничего не делают.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.utils import timezone
+
+
+HISTORY_TABLE = 'defects_defecthistory'
+HISTORY_MONTHS_AHEAD = 3
+
+
+@dataclass
+class Partition:
+	name: str
+	month: dt.date | None
+	rows: int
+
+
+def _is_postgres(connection) -> bool:
+	return connection.vendor == 'postgresql'
+
+
+def _month(value: dt.date) -> dt.date:
+	return value.replace(day=1)
+
+
+def _add_months(month: dt.date, count: int) -> dt.date:
+	index = month.year * 12 + month.month - 1 + count
+	return dt.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: dt.date, table: str = HISTORY_TABLE) -> str:
+	return f'{table}_p{month:%Y_%m}'
+
+
+def _bounds(month: dt.date) -> tuple[str, str]:
+	# Литералы, а не параметры: DDL не принимает bind-переменные
+	return f"'{month:%Y-%m-%d} 00:00:00+00'", f"'{_add_months(month, 1):%Y-%m-%d} 00:00:00+00'"
+
+
+def is_partitioned(connection, table: str = HISTORY_TABLE) -> bool:
+	if not _is_postgres(connection):
+		return False
+	with connection.cursor() as cursor:
+		cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [table])
+		return cursor.fetchone() is not None
+
+
+def _index_definitions(cursor, table: str) -> list[str]:
+	cursor.execute(
+		'SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN ('
+		" SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p')",
+		[table, table],
+	)
+	# У секционированной таблицы определение индекса — «ON ONLY t»: для новой
+	# таблицы индекс нужен целиком, вместе с секциями
+	return [row[0].replace(' ON ONLY ', ' ON ') for row in cursor.fetchall()]
+
+
+def _foreign_keys(cursor, table: str) -> list[tuple[str, str]]:
+	cursor.execute(
+		"SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+		[table],
+	)
+	return cursor.fetchall()
+
+
+def _primary_key_name(cursor, table: str) -> str:
+	cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", [table])
+	return cursor.fetchone()[0]
+
+
+def _rebuild_table(connection, table: str, *, partitioned: bool) -> None:
+	"""Пересоздаёт таблицу (секционированной или обычной) с теми же колонками,
+	индексами и внешними ключами и переносит в неё строки."""
+
+	old = f'{table}_old'
+	with connection.cursor() as cursor:
+		indexes = _index_definitions(cursor, table)
+		foreign_keys = _foreign_keys(cursor, table)
+		pk_name = _primary_key_name(cursor, table)
+		cursor.execute(f'SELECT min(created_at) FROM {table}')
+		first = cursor.fetchone()[0]
+
+		cursor.execute(f'ALTER TABLE {table} RENAME TO {old}')
+		cursor.execute(f'ALTER INDEX {pk_name} RENAME TO {old}_pkey')
+
+		# INCLUDING IDENTITY создаёт новую последовательность (имя подбирается без конфликта)
+		like = f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING IDENTITY)'
+		if partitioned:
+			cursor.execute(f'{like} PARTITION BY RANGE (created_at)')
+			cursor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, created_at)')
+			cursor.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+			current = _month(timezone.now().astimezone(dt.timezone.utc).date())
+			month = _month(first.astimezone(dt.timezone.utc).date()) if first else current
+			while month <= _add_months(current, HISTORY_MONTHS_AHEAD):
+				low, high = _bounds(month)
+				cursor.execute(f'CREATE TABLE {partition_name(month, table)} PARTITION OF {table} FOR VALUES FROM ({low}) TO ({high})')
+				month = _add_months(month, 1)
+		else:
+			cursor.execute(like)
+			cursor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id)')
+
+		cursor.execute(f'INSERT INTO {table} OVERRIDING SYSTEM VALUE SELECT * FROM {old}')
+		cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 0) + 1, false) FROM {table}")
+		# Вместе со старой таблицей удаляются и её секции, если она была секционирована
+		cursor.execute(f'DROP TABLE {old} CASCADE')
+
+		for definition in indexes:
+			cursor.execute(definition)
+		for name, definition in foreign_keys:
+			cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+
+
+def partition_history_table(connection) -> bool:
+	"""Переводит историю на помесячные секции; False, если делать нечего."""
+
+	if not _is_postgres(connection) or is_partitioned(connection):
+		return False
+	_rebuild_table(connection, HISTORY_TABLE, partitioned=True)
+	return True
+
+
+def unpartition_history_table(connection) -> bool:
+	if not is_partitioned(connection):
+		return False
+	_rebuild_table(connection, HISTORY_TABLE, partitioned=False)
+	return True
+
+
+def history_partitions(connection) -> list[Partition]:
+	"""Секции истории с оценкой числа строк (pg_class.reltuples), по возрастанию месяца."""
+
+	if not is_partitioned(connection):
+		return []
+	with connection.cursor() as cursor:
+		cursor.execute(
+			'SELECT c.relname, greatest(c.reltuples, 0)::bigint FROM pg_inherits i'
+			' JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass ORDER BY c.relname',
+			[HISTORY_TABLE],
+		)
+		rows = cursor.fetchall()
+	partitions = []
+	prefix = f'{HISTORY_TABLE}_p'
+	for name, rows_estimate in rows:
+		month = None
+		if name.startswith(prefix):
+			month = dt.datetime.strptime(name[len(prefix):], '%Y_%m').date()
+		partitions.append(Partition(name=name, month=month, rows=rows_estimate))
+	return partitions
+
+
+def ensure_history_partitions(connection, *, months_ahead: int = HISTORY_MONTHS_AHEAD) -> list[str]:
+	"""Создаёт недостающие секции с текущего месяца на months_ahead вперёд."""
+
+	if not is_partitioned(connection):
+		return []
+	existing = {partition.month for partition in history_partitions(connection)}
+	current = _month(timezone.now().astimezone(dt.timezone.utc).date())
+	created = []
+	for offset in range(months_ahead + 1):
+		month = _add_months(current, offset)
+		if month in existing:
+			continue
+		name = partition_name(month)
+		low, high = _bounds(month)
+		with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+			# Создаём отдельно и присоединяем: строки месяца, уже попавшие в DEFAULT,
+			# переносятся в новую секцию (иначе ATTACH отказал бы)
+			cursor.execute(f'CREATE TABLE {name} (LIKE {HISTORY_TABLE} INCLUDING DEFAULTS)')
+			cursor.execute(
+				f'WITH moved AS (DELETE FROM {HISTORY_TABLE}_default WHERE created_at >= {low} AND created_at < {high} RETURNING *)'
+				f' INSERT INTO {name} SELECT * FROM moved'
+			)
+			cursor.execute(f'ALTER TABLE {HISTORY_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ({low}) TO ({high})')
+		created.append(name)
+	return created
+
+
+def drop_empty_history_partitions(connection, *, before: dt.date) -> list[str]:
+	"""Удаляет пустые секции месяцев раньше before (например, после архивации)."""
+
+	dropped = []
+	for partition in history_partitions(connection):
+		if partition.month is None or partition.month >= _month(before):
+			continue
+		with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+			cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {partition.name})')
+			if cursor.fetchone()[0]:
+				continue
+			cursor.execute(f'ALTER TABLE {HISTORY_TABLE} DETACH PARTITION {partition.name}')
+			cursor.execute(f'DROP TABLE {partition.name}')
+		dropped.append(partition.name)
+	return dropped
@@ -34,3 +34,18 @@ def is_customer(user) -> bool:
 
 def is_engineer(user) -> bool:
     return bool(user.is_authenticated and getattr(user, 'is_engineer', False))
+
+
+def filter_defects_for_user(queryset, user):
+    """Ограничивает queryset дефектов областью видимости роли.
+
+    Менеджер и руководитель видят все дефекты, инженер — только назначенные ему.
+    Не зависит от request, поэтому используется и вне цикла запроса
+    (фоновые выгрузки и т.п.).
+    """
+
+    if is_manager(user) or is_customer(user):
+        return queryset
+    if is_engineer(user):
+        return queryset.filter(executor=user)
+    return queryset.none()
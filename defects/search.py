@@ -0,0 +1,189 @@
+"""Полнотекстовый поиск по дефектам.
+
+PostgreSQL: колонка Defect.search_vector (tsvector, словарь russian) + GIN-индекс.
+SQLite: виртуальная таблица FTS5, rowid которой совпадает с id дефекта.
+
+Индекс поддерживается сигналами (defects.signals) и командой rebuild_search_index.
+Массовые операции в обход save() должны сами вызывать update_search_index().
+"""
+
+from __future__ import annotations
+
+import re
+from collections.abc import Iterable
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Defect, Project
+
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'defects_defect_fts'
+
+# Веса полей: заголовок важнее описания, описание важнее проекта/адреса
+_PG_VECTOR_SQL = (
+	"setweight(to_tsvector('russian', coalesce(d.title, '')), 'A')"
+	" || setweight(to_tsvector('russian', coalesce(d.description, '')), 'B')"
+	" || setweight(to_tsvector('russian', coalesce(p.name, '') || ' ' || coalesce(p.address, '')), 'C')"
+)
+_FTS_WEIGHTS = '10.0, 4.0, 2.0'
+
+# Ограничение SQLite на число параметров в одном запросе
+_ID_BATCH = 500
+
+
+def create_search_backend(connection) -> None:
+	"""DDL для индекса под конкретную СУБД (rebuild_search_index).
+
+	Миграция 0005 держит свою копию этого DDL: при его изменении нужна новая миграция.
+	"""
+
+	if connection.vendor == 'postgresql':
+		with connection.cursor() as cursor:
+			cursor.execute(
+				'CREATE INDEX IF NOT EXISTS defects_defect_search_gin '
+				f'ON {Defect._meta.db_table} USING gin (search_vector)'
+			)
+	elif connection.vendor == 'sqlite':
+		with connection.cursor() as cursor:
+			cursor.execute(
+				f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+				"USING fts5(title, description, project, tokenize='unicode61 remove_diacritics 2')"
+			)
+
+
+def drop_search_backend(connection) -> None:
+	if connection.vendor == 'postgresql':
+		with connection.cursor() as cursor:
+			cursor.execute('DROP INDEX IF EXISTS defects_defect_search_gin')
+	elif connection.vendor == 'sqlite':
+		with connection.cursor() as cursor:
+			cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def _batches(ids: Iterable[int]) -> Iterable[list[int]]:
+	ids = list(ids)
+	for start in range(0, len(ids), _ID_BATCH):
+		yield ids[start:start + _ID_BATCH]
+
+
+def update_search_index(
+	*,
+	defect_ids: Iterable[int] | None = None,
+	project_ids: Iterable[int] | None = None,
+	using: str = 'default',
+) -> None:
+	"""Пересчитывает поисковый индекс.
+
+	Без аргументов перестраивает индекс целиком; иначе — только для
+	перечисленных дефектов или всех дефектов перечисленных проектов.
+	"""
+
+	connection = connections[using]
+	if connection.vendor not in {'postgresql', 'sqlite'}:
+		return
+
+	if defect_ids is not None:
+		scopes = [('d.id', batch) for batch in _batches(defect_ids)]
+	elif project_ids is not None:
+		scopes = [('d.project_id', batch) for batch in _batches(project_ids)]
+	else:
+		scopes = [(None, None)]
+
+	defects_table = Defect._meta.db_table
+	projects_table = Project._meta.db_table
+	with connection.cursor() as cursor:
+		for column, batch in scopes:
+			where, params = '', []
+			if column:
+				where = f" AND {column} IN ({', '.join(['%s'] * len(batch))})"
+				params = batch
+
+			if connection.vendor == 'postgresql':
+				cursor.execute(
+					f'UPDATE {defects_table} AS d SET search_vector = {_PG_VECTOR_SQL} '
+					f'FROM {projects_table} AS p WHERE p.id = d.project_id{where}',
+					params,
+				)
+				continue
+
+			if column == 'd.id':
+				cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(batch))})", batch)
+			elif column == 'd.project_id':
+				cursor.execute(
+					f"DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT id FROM {defects_table} d WHERE 1=1{where})",
+					params,
+				)
+			else:
+				cursor.execute(f'DELETE FROM {FTS_TABLE}')
+			cursor.execute(
+				f'INSERT INTO {FTS_TABLE} (rowid, title, description, project) '
+				f"SELECT d.id, d.title, d.description, coalesce(p.name, '') || ' ' || coalesce(p.address, '') "
+				f'FROM {defects_table} d JOIN {projects_table} p ON p.id = d.project_id WHERE 1=1{where}',
+				params,
+			)
+
+
+def remove_from_search_index(defect_ids: Iterable[int], *, using: str = 'default') -> None:
+	"""Удаляет дефекты из FTS5 (в Postgres вектор удаляется вместе со строкой)."""
+
+	connection = connections[using]
+	if connection.vendor != 'sqlite':
+		return
+	with connection.cursor() as cursor:
+		for batch in _batches(defect_ids):
+			cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(batch))})", batch)
+
+
+def fts_match_expression(query: str) -> str:
+	"""Строит выражение MATCH для FTS5: все слова запроса, каждое как префикс.
+
+	Префиксный поиск частично заменяет отсутствующий в SQLite русский стемминг
+	(«трещин» находит «трещина», «трещины»).
+	"""
+
+	tokens = re.findall(r'\w+', query.lower())
+	return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_defects(queryset, query: str):
+	"""Фильтрует queryset по поисковому запросу и добавляет аннотацию search_rank.
+
+	Чем больше search_rank, тем релевантнее дефект. Остальные фильтры queryset
+	(роль, статус, приоритет, исполнитель) сохраняются.
+	"""
+
+	vendor = connections[queryset.db].vendor
+
+	if vendor == 'postgresql':
+		search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+		return queryset.filter(search_vector=search_query).annotate(
+			search_rank=SearchRank(F('search_vector'), search_query),
+		)
+
+	if vendor == 'sqlite':
+		match = fts_match_expression(query)
+		if not match:
+			return queryset.none()
+		defects_table = Defect._meta.db_table
+		return queryset.filter(
+			id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,)),
+		).annotate(
+			# bm25() в FTS5 отрицательный: чем меньше, тем лучше — меняем знак
+			search_rank=RawSQL(
+				f'SELECT -bm25({FTS_TABLE}, {_FTS_WEIGHTS}) FROM {FTS_TABLE} '
+				f'WHERE {FTS_TABLE} MATCH %s AND rowid = {defects_table}.id',
+				(match,),
+			),
+		)
+
+	# Прочие СУБД: прежний поиск подстрокой без ранжирования
+	return queryset.filter(
+		Q(title__icontains=query)
+		| Q(description__icontains=query)
+		| Q(project__name__icontains=query)
+		| Q(project__address__icontains=query)
+	).annotate(search_rank=Value(0.0, output_field=FloatField()))
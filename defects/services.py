@@ -1,10 +1,19 @@
 from __future__ import annotations
 
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass, field
 from typing import Any
 
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
 
-from .models import Defect, DefectHistory
+from .cache import bump_version
+from .history import current_recorder
+from .models import Defect, DefectHistory, DefectStatusRollup
+from .permissions import filter_defects_for_user
 
 
 User = get_user_model()
@@ -20,11 +29,194 @@ def log_defect_event(
 	"""Создаёт запись в истории дефекта.
 
 	changes хранит diff в виде {field: {from: ..., to: ...}} или произвольные данные.
+	Внутри recording_history() запись откладывается до конца транзакции
+	(у возвращённого объекта до этого нет pk).
 	"""
 
-	return DefectHistory.objects.create(
+	entry = DefectHistory(
 		defect=defect,
 		changed_by=user if getattr(user, 'is_authenticated', False) else None,
 		action=action,
 		changes=changes or {},
 	)
+	using = defect._state.db or 'default'
+	recorder = current_recorder(using)
+	if recorder is not None:
+		recorder.add(entry)
+		return entry
+
+	entry.save(using=using)
+	# Событие в истории — изменение данных, от которых зависят агрегаты
+	bump_version()
+	return entry
+
+
+RollupKey = tuple[int, str, str]
+
+
+def apply_rollup_delta(key: RollupKey, delta: int, *, using: str = 'default') -> None:
+	"""Изменяет счётчик DefectStatusRollup для ключа (project_id, status, priority)."""
+
+	if not delta:
+		return
+	project_id, status, priority = key
+	rows = DefectStatusRollup.objects.using(using).filter(project_id=project_id, status=status, priority=priority)
+	if rows.update(total=F('total') + delta):
+		return
+	if delta < 0:
+		# Строки нет — например, проект удаляется каскадом вместе со сводкой
+		return
+	_, created = DefectStatusRollup.objects.using(using).get_or_create(
+		project_id=project_id,
+		status=status,
+		priority=priority,
+		defaults={'total': delta},
+	)
+	if not created:
+		rows.update(total=F('total') + delta)
+
+
+def apply_rollup_deltas(deltas: Counter, *, using: str = 'default') -> None:
+	"""Применяет накопленные изменения сводки (для массовых операций в обход save())."""
+
+	for key, delta in deltas.items():
+		apply_rollup_delta(key, delta, using=using)
+
+
+def compute_rollup(*, using: str = 'default') -> dict[RollupKey, int]:
+	"""Точные значения сводки, посчитанные по таблице дефектов."""
+
+	rows = Defect.objects.using(using).order_by().values_list('project_id', 'status', 'priority').annotate(total=Count('id'))
+	return {(project_id, status, priority): total for project_id, status, priority, total in rows}
+
+
+def diff_rollup(*, using: str = 'default') -> dict[RollupKey, tuple[int, int]]:
+	"""Расхождения сводки с таблицей: {key: (в сводке, фактически)}."""
+
+	actual = compute_rollup(using=using)
+	stored = {
+		(project_id, status, priority): total
+		for project_id, status, priority, total in DefectStatusRollup.objects.using(using).values_list(
+			'project_id', 'status', 'priority', 'total'
+		)
+	}
+	return {
+		key: (stored.get(key, 0), actual.get(key, 0))
+		for key in stored.keys() | actual.keys()
+		if stored.get(key, 0) != actual.get(key, 0)
+	}
+
+
+def rebuild_rollup(*, using: str = 'default') -> int:
+	"""Пересобирает сводку с нуля; возвращает число строк."""
+
+	with transaction.atomic(using=using):
+		actual = compute_rollup(using=using)
+		DefectStatusRollup.objects.using(using).all().delete()
+		DefectStatusRollup.objects.using(using).bulk_create(
+			DefectStatusRollup(project_id=project_id, status=status, priority=priority, total=total)
+			for (project_id, status, priority), total in actual.items()
+		)
+	return len(actual)
+
+
+# Больше дефектов за одно массовое действие не принимаем
+BULK_UPDATE_LIMIT = 500
+
+
+@dataclass
+class BulkUpdateResult:
+	"""Итог массового действия: изменённые дефекты и причины отказа по остальным."""
+
+	updated: list[int] = field(default_factory=list)
+	errors: dict[int, str] = field(default_factory=dict)
+
+
+def bulk_update_defects(
+	*,
+	user: User,
+	defect_ids: Iterable[int],
+	status: str | None = None,
+	executor: User | None = None,
+	using: str = 'default',
+) -> BulkUpdateResult:
+	"""Массовая смена статуса и/или исполнителя.
+
+	Каждый дефект проверяется отдельно (область видимости пользователя,
+	переход по workflow_transitions() и allowed_next_statuses_for()); дефекты
+	с ошибкой пропускаются, остальные сохраняются одним bulk_update в одной
+	транзакции, история — одним bulk_create. Сигналы save() при этом не
+	срабатывают, поэтому сводка DefectStatusRollup и версия кэша обновляются
+	здесь же. Поисковый индекс не затрагивается: статус и исполнитель в него
+	не входят.
+	"""
+
+	if status is None and executor is None:
+		raise ValueError('Не указано ни нового статуса, ни исполнителя')
+
+	result = BulkUpdateResult()
+	ids = list(dict.fromkeys(defect_ids))
+	transitions = Defect.workflow_transitions()
+	status_label = Defect.Status(status).label if status else ''
+	now = timezone.now()
+
+	with transaction.atomic(using=using):
+		# of=('self',): исполнитель подтягивается LEFT JOIN, блокируем только дефекты
+		scoped = filter_defects_for_user(Defect.objects.using(using), user)
+		defects = scoped.select_related('executor').select_for_update(of=('self',)).in_bulk(ids)
+
+		changed: list[Defect] = []
+		history: list[DefectHistory] = []
+		deltas: Counter = Counter()
+		for pk in ids:
+			defect = defects.get(pk)
+			if defect is None:
+				result.errors[pk] = 'Дефект не найден или недоступен.'
+				continue
+
+			changes = {}
+			if status and status != defect.status:
+				if status not in transitions.get(defect.status, set()) or status not in defect.allowed_next_statuses_for(user):
+					result.errors[pk] = f'Переход «{defect.get_status_display()}» → «{status_label}» недопустим.'
+					continue
+				changes['status'] = {'from': defect.get_status_display(), 'to': status_label}
+			if executor is not None and executor.pk != defect.executor_id:
+				changes['executor'] = {'from': getattr(defect.executor, 'username', ''), 'to': executor.username}
+			if not changes:
+				result.errors[pk] = 'Изменений нет.'
+				continue
+
+			old_key = defect.rollup_key()
+			if 'status' in changes:
+				defect.status = status
+			if 'executor' in changes:
+				defect.executor = executor
+			# bulk_update не вызывает pre_save, auto_now проставляем сами
+			defect.updated_at = now
+			deltas[old_key] -= 1
+			deltas[defect.rollup_key()] += 1
+			defect._loaded_rollup_key = defect.rollup_key()
+
+			changed.append(defect)
+			history.append(
+				DefectHistory(
+					defect=defect,
+					changed_by=user,
+					# Смена статуса пишется как status_changed: по этим событиям считается SLA
+					action=DefectHistory.Action.STATUS_CHANGED if 'status' in changes else DefectHistory.Action.UPDATED,
+					changes=changes,
+				)
+			)
+			result.updated.append(pk)
+
+		if changed:
+			fields = ['updated_at']
+			if status:
+				fields.append('status')
+			if executor is not None:
+				fields.append('executor')
+			Defect.objects.using(using).bulk_update(changed, fields, batch_size=BULK_UPDATE_LIMIT)
+			DefectHistory.objects.using(using).bulk_create(history, batch_size=BULK_UPDATE_LIMIT)
+			apply_rollup_deltas(deltas, using=using)
+			bump_version()
+	return result
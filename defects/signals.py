@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .blobs import release_blob
+from .cache import FRAGMENTS_NAMESPACE, bump_version
+from .models import Attachment, Defect, Project, ProjectStage
+from .search import remove_from_search_index, update_search_index
+from .services import apply_rollup_delta
+
+
+# Поля, от которых зависит поисковый индекс дефекта
+SEARCH_FIELDS = {'title', 'description', 'project', 'project_id'}
+
+
+@receiver(post_save, sender=Defect, dispatch_uid='defects_search_defect_saved')
+def defect_saved_update_search(sender, instance: Defect, created: bool, update_fields=None, raw: bool = False, using: str = 'default', **kwargs):
+	if raw:
+		return
+	if created or update_fields is None or SEARCH_FIELDS & set(update_fields):
+		update_search_index(defect_ids=[instance.pk], using=using)
+
+
+@receiver(post_delete, sender=Defect, dispatch_uid='defects_search_defect_deleted')
+def defect_deleted_update_search(sender, instance: Defect, using: str = 'default', **kwargs):
+	remove_from_search_index([instance.pk], using=using)
+
+
+@receiver(post_save, sender=Project, dispatch_uid='defects_search_project_saved')
+def project_saved_update_search(sender, instance: Project, created: bool, raw: bool = False, using: str = 'default', **kwargs):
+	# Название и адрес проекта входят в индекс всех его дефектов
+	if raw or created:
+		return
+	update_search_index(project_ids=[instance.pk], using=using)
+
+
+@receiver(pre_save, sender=Defect, dispatch_uid='defects_rollup_defect_pre_save')
+def defect_pre_save_load_rollup_key(sender, instance: Defect, raw: bool = False, using: str = 'default', **kwargs):
+	# Экземпляр создан не через from_db (например, Defect(pk=...)): берём старый ключ из БД
+	if raw or instance._state.adding or hasattr(instance, '_loaded_rollup_key'):
+		return
+	instance._loaded_rollup_key = (
+		Defect.objects.using(using).filter(pk=instance.pk).values_list('project_id', 'status', 'priority').first()
+	)
+
+
+@receiver(post_save, sender=Defect, dispatch_uid='defects_rollup_defect_saved')
+def defect_saved_update_rollup(sender, instance: Defect, created: bool, raw: bool = False, using: str = 'default', **kwargs):
+	if raw:
+		return
+	new_key = instance.rollup_key()
+	old_key = None if created else getattr(instance, '_loaded_rollup_key', None)
+	if old_key != new_key:
+		if old_key is not None:
+			apply_rollup_delta(old_key, -1, using=using)
+		if new_key is not None:
+			apply_rollup_delta(new_key, +1, using=using)
+	instance._loaded_rollup_key = new_key
+
+
+@receiver(post_delete, sender=Defect, dispatch_uid='defects_rollup_defect_deleted')
+def defect_deleted_update_rollup(sender, instance: Defect, using: str = 'default', **kwargs):
+	key = getattr(instance, '_loaded_rollup_key', None) or instance.rollup_key()
+	if key is not None:
+		apply_rollup_delta(key, -1, using=using)
+
+
+@receiver(post_delete, sender=Attachment, dispatch_uid='defects_blobs_attachment_deleted')
+def attachment_deleted_release_blob(sender, instance: Attachment, using: str = 'default', **kwargs):
+	# Срабатывает и при каскадном удалении вместе с дефектом
+	if instance.blob_id:
+		release_blob(instance.blob_id, using=using)
+
+
+@receiver(post_save, sender=Defect, dispatch_uid='defects_cache_defect_saved')
+@receiver(post_delete, sender=Defect, dispatch_uid='defects_cache_defect_deleted')
+@receiver(post_save, sender=Project, dispatch_uid='defects_cache_project_saved')
+@receiver(post_delete, sender=Project, dispatch_uid='defects_cache_project_deleted')
+def invalidate_aggregate_cache(sender, raw: bool = False, **kwargs):
+	# Агрегаты зависят от дефектов и от названий проектов
+	if not raw:
+		bump_version()
+
+
+@receiver(post_save, sender=Project, dispatch_uid='defects_fragments_project_saved')
+@receiver(post_delete, sender=Project, dispatch_uid='defects_fragments_project_deleted')
+@receiver(post_save, sender=ProjectStage, dispatch_uid='defects_fragments_stage_saved')
+@receiver(post_delete, sender=ProjectStage, dispatch_uid='defects_fragments_stage_deleted')
+@receiver(post_save, sender=get_user_model(), dispatch_uid='defects_fragments_user_saved')
+@receiver(post_delete, sender=get_user_model(), dispatch_uid='defects_fragments_user_deleted')
+def invalidate_template_fragments(sender, raw: bool = False, update_fields=None, **kwargs):
+	# Строки дефектов показывают проект и исполнителя, форма фильтров — список
+	# пользователей, страница проекта — этапы (версия входит и в ETag страниц);
+	# обновление last_login при входе на них не влияет
+	if raw or (update_fields is not None and set(update_fields) <= {'last_login'}):
+		return
+	bump_version(FRAGMENTS_NAMESPACE)
@@ -19,6 +19,8 @@ urlpatterns = [
 
     # Дефекты
     path('defects/create/', views.DefectCreateView.as_view(), name='defect_create'),
+    path('defects/bulk/', views.defect_bulk_update, name='defect_bulk_update'),
+    path('defects/import/', views.defect_import, name='defect_import'),
     path('defects/<int:pk>/', views.DefectDetailView.as_view(), name='defect_detail'),
     path('defects/<int:pk>/edit/', views.DefectUpdateView.as_view(), name='defect_edit'),
     path('defects/<int:pk>/delete/', views.DefectDeleteView.as_view(), name='defect_delete'),
@@ -27,9 +29,19 @@ urlpatterns = [
     path('defects/<int:pk>/status/', views.defect_change_status, name='defect_change_status'),
     path('defects/<int:pk>/comment/', views.defect_add_comment, name='defect_add_comment'),
     path('defects/<int:pk>/attachment/', views.defect_add_attachment, name='defect_add_attachment'),
+    path('attachments/<int:pk>/', views.attachment_download, name='attachment_download'),
+    path('attachments/<int:pk>/<str:kind>.jpg', views.attachment_derivative, name='attachment_derivative'),
+    path('defects/<int:pk>/comments/', views.defect_comments, name='defect_comments'),
+    path('defects/<int:pk>/history/', views.defect_history, name='defect_history'),
+    path('defects/<int:pk>/history/archive/', views.defect_history_archive, name='defect_history_archive'),
 
     # Отчётность
     path('export/defects.csv', views.export_defects_csv, name='export_defects_csv'),
     path('export/defects.xlsx', views.export_defects_xlsx, name='export_defects_xlsx'),
+    path('export/jobs/', views.export_job_list, name='export_job_list'),
+    path('export/jobs/create/', views.export_job_create, name='export_job_create'),
+    path('export/jobs/status/', views.export_job_status, name='export_job_status'),
+    path('export/jobs/<int:pk>/download/', views.export_job_download, name='export_job_download'),
     path('analytics/', views.analytics_view, name='analytics'),
+    path('analytics/data/', views.analytics_data, name='analytics_data'),
 ]
@@ -1,27 +1,42 @@
 from __future__ import annotations
 
-import csv
-import io
+import tempfile
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
-from django.db.models import Count, Q
-from django.http import HttpRequest, HttpResponse
+from django.core.paginator import InvalidPage, Paginator
+from django.db import transaction
+from django.db.models import Prefetch, Sum
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse, reverse_lazy
+from django.utils import timezone
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.views.decorators.http import require_POST
 from django.views.generic import CreateView, DeleteView, DetailView, ListView, UpdateView
 
-from openpyxl import Workbook
-
-from .forms import AttachmentForm, CommentForm, DefectForm, ProjectStageForm
-from .models import Defect, Project, ProjectStage
-from .permissions import is_customer, is_engineer, is_manager
-from .services import log_defect_event
+from .analytics import compute_breakdowns
+from .archive import archived_events_count, load_archived_history
+from .blobs import store_attachment
+from .cache import ANALYTICS_BREAKDOWNS, ANALYTICS_STATUS, cached_aggregate, fragment_cache_context
+from .conditional import ConditionalGetMixin, defect_validators_queryset, latest_updated_queryset
+from .derivatives import DERIVATIVE_FIELDS
+from .downloads import serve_protected
+from .exports import XLSX_CONTENT_TYPE, iter_csv, write_xlsx
+from .forms import AttachmentForm, CommentForm, DefectBulkForm, DefectForm, DefectImportForm, ProjectStageForm
+from .history import recording_history
+from .imports import ImportFormatError, import_defects
+from .locking import retry_on_lock
+from .models import Attachment, AttachmentBlob, Defect, DefectStatusRollup, ExportJob, Project, ProjectStage
+from .pagination import EstimatedCountPaginator, KeysetPaginator
+from .permissions import filter_defects_for_user, is_customer, is_engineer, is_manager
+from .search import search_defects
+from .services import bulk_update_defects, log_defect_event
 
 
 User = get_user_model()
@@ -31,12 +46,7 @@ class RoleQuerysetMixin:
 	"""Ограничение queryset в зависимости от роли пользователя."""
 
 	def filter_defects_for_user(self, queryset):
-		user = self.request.user
-		if is_manager(user) or is_customer(user):
-			return queryset
-		if is_engineer(user):
-			return queryset.filter(executor=user)
-		return queryset.none()
+		return filter_defects_for_user(queryset, self.request.user)
 
 	def filter_projects_for_user(self, queryset):
 		user = self.request.user
@@ -47,11 +57,21 @@ class RoleQuerysetMixin:
 		return queryset.none()
 
 
-class DashboardView(LoginRequiredMixin, RoleQuerysetMixin, ListView):
+class DashboardView(LoginRequiredMixin, ConditionalGetMixin, RoleQuerysetMixin, ListView):
 	template_name = 'defects/dashboard.html'
 	model = Defect
 	context_object_name = 'defects'
 	paginate_by = 20
+	paginator_class = EstimatedCountPaginator
+	# До этого числа строк оставляем обычные номера страниц (OFFSET),
+	# больше — переходим на keyset-пагинацию по курсору.
+	offset_pagination_max_rows = 200
+
+	def get_validator_timestamps(self):
+		# Вся область видимости роли, без фильтров запроса: шире, но по индексу;
+		# сами фильтры входят в ETag через строку запроса
+		scoped = self.filter_defects_for_user(Defect.objects.all())
+		return [latest_updated_queryset(scoped).first()]
 
 	def get_queryset(self):
 		qs = Defect.objects.select_related('project', 'executor').all()
@@ -61,7 +81,8 @@ class DashboardView(LoginRequiredMixin, RoleQuerysetMixin, ListView):
 		priority = self.request.GET.get('priority')
 		executor = self.request.GET.get('executor')
 		query = (self.request.GET.get('q') or '').strip()
-		sort = (self.request.GET.get('sort') or '-created_at').strip()
+		# При поиске по умолчанию сортируем по релевантности
+		sort = (self.request.GET.get('sort') or ('relevance' if query else '-created_at')).strip()
 
 		if status:
 			qs = qs.filter(status=status)
@@ -71,12 +92,7 @@ class DashboardView(LoginRequiredMixin, RoleQuerysetMixin, ListView):
 		if executor and is_manager(self.request.user):
 			qs = qs.filter(executor_id=executor)
 		if query:
-			qs = qs.filter(
-				Q(title__icontains=query)
-				| Q(description__icontains=query)
-				| Q(project__name__icontains=query)
-				| Q(project__address__icontains=query)
-			)
+			qs = search_defects(qs, query)
 
 		allowed_sorts = {
 			'created_at',
@@ -88,52 +104,172 @@ class DashboardView(LoginRequiredMixin, RoleQuerysetMixin, ListView):
 			'status',
 			'-status',
 		}
-		if sort not in allowed_sorts:
-			sort = '-created_at'
-		qs = qs.order_by(sort)
+		if sort == 'relevance' and query:
+			qs = qs.order_by('-search_rank', '-created_at', '-id')
+		else:
+			if sort not in allowed_sorts:
+				sort = '-created_at'
+			# id — tie-breaker: стабильный порядок нужен и для OFFSET, и для курсоров
+			qs = qs.order_by(sort, '-id' if sort.startswith('-') else 'id')
+		self.sort = sort
 
 		return qs
 
+	def get_paginator(self, queryset, per_page, **kwargs):
+		# paginate_queryset уже создал paginator этой выборки: его COUNT посчитан
+		counter = getattr(self, 'result_counter', None)
+		if counter is not None and counter.object_list is queryset:
+			return counter
+		return super().get_paginator(queryset, per_page, **kwargs)
+
+	def paginate_queryset(self, queryset, page_size):
+		cursor = self.request.GET.get('cursor')
+		# Один ограниченный COUNT и для выбора пагинации, и для числа страниц
+		self.result_counter = self.get_paginator(
+			queryset,
+			page_size,
+			orphans=self.get_paginate_orphans(),
+			allow_empty_first_page=self.get_allow_empty(),
+		)
+		use_keyset = self.sort != 'relevance' and 'page' not in self.request.GET and (
+			cursor or self.result_counter.has_more_than(self.offset_pagination_max_rows)
+		)
+		if not use_keyset:
+			return super().paginate_queryset(queryset, page_size)
+
+		paginator = KeysetPaginator(queryset, page_size, self.sort)
+		try:
+			page = paginator.page(cursor)
+		except InvalidPage as exc:
+			raise Http404(str(exc)) from exc
+		# Keyset-страницам общее число не нужно; подпись «Найдено» берёт дешёвую оценку result_counter
+		return paginator, page, page.object_list, page.has_other_pages()
+
 	def get_context_data(self, **kwargs):
 		ctx = super().get_context_data(**kwargs)
+		ctx.update(fragment_cache_context())
+		ctx['result_counter'] = getattr(self, 'result_counter', None)
 		ctx['statuses'] = Defect.Status.choices
 		ctx['priorities'] = Defect.Priority.choices
 		ctx['executors'] = User.objects.filter(is_active=True).order_by('username')
+		if is_manager(self.request.user):
+			ctx['bulk_form'] = DefectBulkForm()
 		ctx['filters'] = {
 			'status': self.request.GET.get('status', ''),
 			'priority': self.request.GET.get('priority', ''),
 			'executor': self.request.GET.get('executor', ''),
 			'q': self.request.GET.get('q', ''),
-			'sort': self.request.GET.get('sort', '-created_at'),
+			'sort': self.sort,
 		}
 		return ctx
 
 
-class DefectDetailView(LoginRequiredMixin, RoleQuerysetMixin, DetailView):
+class DefectDetailView(LoginRequiredMixin, ConditionalGetMixin, RoleQuerysetMixin, DetailView):
 	template_name = 'defects/defect_detail.html'
 	model = Defect
 	context_object_name = 'defect'
 
+	def get_validator_timestamps(self):
+		scoped = self.filter_defects_for_user(Defect.objects.filter(pk=self.kwargs['pk']))
+		row = defect_validators_queryset(scoped).first()
+		return list(row) if row else None
+
 	def get_queryset(self):
-		qs = Defect.objects.select_related('project', 'executor').prefetch_related(
-			'attachments',
-			'comments__author',
-			'history__changed_by',
-		)
+		attachments = Prefetch('attachments', queryset=Attachment.objects.select_related('blob'))
+		qs = Defect.objects.select_related('project', 'executor').prefetch_related(attachments)
 		return self.filter_defects_for_user(qs)
 
 	def get_context_data(self, **kwargs):
 		ctx = super().get_context_data(**kwargs)
+		# Сразу выводим только последние комментарии и события, остальное — по запросу
+		comments = _comment_feed(self.object).page()
+		ctx['comments'] = comments.object_list[::-1]
+		ctx['comments_cursor'] = comments.next_cursor
+		history = _history_feed(self.object).page()
+		ctx['history'] = history.object_list
+		ctx['history_cursor'] = history.next_cursor
+		ctx['archived_history_count'] = archived_events_count(self.object)
 		ctx['comment_form'] = CommentForm()
 		ctx['attachment_form'] = AttachmentForm()
 		ctx['next_statuses'] = self.object.allowed_next_statuses_for(self.request.user)
 		ctx['can_edit'] = self.object.can_edit(self.request.user)
 		ctx['can_upload'] = ctx['can_edit'] or is_manager(self.request.user)
 		ctx['can_delete'] = is_manager(self.request.user)
-		ctx['history'] = self.object.history.all()
 		return ctx
 
 
+def _comment_feed(defect: Defect) -> KeysetPaginator:
+	# Новые сверху: первая страница — последние комментарии (индекс (defect, created_at))
+	return KeysetPaginator(defect.comments.select_related('author'), settings.DEFECT_FEED_PAGE_SIZE, '-created_at')
+
+
+def _history_feed(defect: Defect) -> KeysetPaginator:
+	return KeysetPaginator(defect.history.select_related('changed_by'), settings.DEFECT_FEED_PAGE_SIZE, '-created_at')
+
+
+def _feed_response(request: HttpRequest, paginator: KeysetPaginator, template_name: str, *, chronological: bool) -> JsonResponse:
+	try:
+		page = paginator.page(request.GET.get('cursor') or None)
+	except InvalidPage as exc:
+		raise Http404(str(exc)) from exc
+	items = page.object_list[::-1] if chronological else page.object_list
+	return JsonResponse(
+		{
+			'html': ''.join(render_to_string(template_name, {'item': item}, request=request) for item in items),
+			'count': len(items),
+			'next_cursor': page.next_cursor,
+		}
+	)
+
+
+def _viewable_defect(request: HttpRequest, pk: int) -> Defect:
+	# Как и карточка: дефект вне области видимости — 404
+	return get_object_or_404(filter_defects_for_user(Defect.objects.all(), request.user), pk=pk)
+
+
+@login_required
+def defect_comments(request: HttpRequest, pk: int) -> JsonResponse:
+	"""Более ранние комментарии дефекта порцией (курсор из предыдущего ответа).
+
+	html — разметка порции в хронологическом порядке, для вставки перед уже
+	показанными комментариями; next_cursor пуст, если порция последняя.
+	"""
+
+	defect = _viewable_defect(request, pk)
+	return _feed_response(request, _comment_feed(defect), 'defects/_comment.html', chronological=True)
+
+
+@login_required
+def defect_history(request: HttpRequest, pk: int) -> JsonResponse:
+	"""Более ранние события истории дефекта порцией (новые сверху, как на странице)."""
+
+	defect = _viewable_defect(request, pk)
+	return _feed_response(request, _history_feed(defect), 'defects/_history_entry.html', chronological=False)
+
+
+@login_required
+def defect_history_archive(request: HttpRequest, pk: int) -> JsonResponse:
+	"""Архивированная история дефекта порцией (новые сверху); курсор — номер страницы.
+
+	Архив распаковывается целиком на каждый запрос: он есть только у старых
+	закрытых дефектов и читается редко.
+	"""
+
+	defect = _viewable_defect(request, pk)
+	paginator = Paginator(load_archived_history(defect), settings.DEFECT_FEED_PAGE_SIZE)
+	try:
+		page = paginator.page(request.GET.get('cursor') or 1)
+	except InvalidPage as exc:
+		raise Http404(str(exc)) from exc
+	return JsonResponse(
+		{
+			'html': ''.join(render_to_string('defects/_history_entry.html', {'item': item}, request=request) for item in page),
+			'count': len(page),
+			'next_cursor': str(page.next_page_number()) if page.has_next() else '',
+		}
+	)
+
+
 class DefectCreateView(CreateView):
 	template_name = 'defects/defect_form.html'
 	model = Defect
@@ -153,6 +289,8 @@ class DefectCreateView(CreateView):
 			form.fields.pop('executor', None)
 		return form
 
+	@retry_on_lock()
+	@recording_history()
 	def form_valid(self, form):
 		defect: Defect = form.save(commit=False)
 		if is_engineer(self.request.user):
@@ -198,9 +336,14 @@ class DefectUpdateView(RoleQuerysetMixin, UpdateView):
 			form.fields.pop('executor', None)
 		return form
 
+	@retry_on_lock()
+	@recording_history()
 	def form_valid(self, form):
-		old = Defect.objects.select_related('project', 'executor').get(pk=self.get_object().pk)
+		# self.object загружен до транзакции: перечитываем строку под блокировкой и
+		# берём старый ключ сводки из неё, а не из устаревшей копии формы
+		old = Defect.objects.select_related('project', 'executor').select_for_update(of=('self',)).get(pk=self.object.pk)
 		defect: Defect = form.save(commit=False)
+		defect._loaded_rollup_key = old.rollup_key()
 		if is_engineer(self.request.user):
 			# На всякий случай фиксируем, что инженер не меняет исполнителя
 			defect.executor = self.request.user
@@ -236,6 +379,17 @@ class DefectDeleteView(DeleteView):
 			raise PermissionDenied
 		return super().dispatch(request, *args, **kwargs)
 
+	@retry_on_lock()
+	@transaction.atomic
+	def form_valid(self, form):
+		# Удаление и пересчёт сводки по статусам (сигнал post_delete) — одной транзакцией.
+		# Ячейку сводки берём из строки под блокировкой: статус могли сменить после загрузки
+		locked = Defect.objects.select_for_update().filter(pk=self.object.pk).only('project_id', 'status', 'priority').first()
+		if locked is None:
+			raise Http404('No defect found')
+		self.object._loaded_rollup_key = locked.rollup_key()
+		return super().form_valid(form)
+
 
 class ProjectListView(LoginRequiredMixin, RoleQuerysetMixin, ListView):
 	template_name = 'projects/project_list.html'
@@ -247,11 +401,19 @@ class ProjectListView(LoginRequiredMixin, RoleQuerysetMixin, ListView):
 		return self.filter_projects_for_user(qs)
 
 
-class ProjectDetailView(LoginRequiredMixin, RoleQuerysetMixin, DetailView):
+class ProjectDetailView(LoginRequiredMixin, ConditionalGetMixin, RoleQuerysetMixin, DetailView):
 	template_name = 'projects/project_detail.html'
 	model = Project
 	context_object_name = 'project'
 
+	def get_validator_timestamps(self):
+		if not self.filter_projects_for_user(Project.objects.filter(pk=self.kwargs['pk'])).exists():
+			return None
+		# Сам проект и его этапы меток времени не имеют: их изменения поднимают
+		# версию фрагментов, которая входит в ETag
+		scoped = self.filter_defects_for_user(Defect.objects.filter(project_id=self.kwargs['pk']))
+		return [latest_updated_queryset(scoped).first()]
+
 	def get_queryset(self):
 		qs = Project.objects.all()
 		return self.filter_projects_for_user(qs)
@@ -262,6 +424,7 @@ class ProjectDetailView(LoginRequiredMixin, RoleQuerysetMixin, DetailView):
 		defects_qs = Defect.objects.select_related('executor', 'project').filter(project=self.object)
 		ctx['defects'] = self.filter_defects_for_user(defects_qs)
 		ctx['stages'] = self.object.stages.all()
+		ctx.update(fragment_cache_context())
 		return ctx
 
 
@@ -339,8 +502,15 @@ class ProjectDeleteView(DeleteView):
 
 @login_required
 @require_POST
+@retry_on_lock()
+@recording_history()
 def defect_change_status(request: HttpRequest, pk: int) -> HttpResponse:
-	defect = get_object_or_404(Defect.objects.select_related('executor', 'project'), pk=pk)
+	# Строка блокируется до коммита, как в bulk_update_defects: иначе два параллельных
+	# перехода вычли бы дефект из одной старой ячейки сводки и добавили в две разные
+	defect = get_object_or_404(
+		Defect.objects.select_related('executor', 'project').select_for_update(of=('self',)),
+		pk=pk,
+	)
 	if not defect.can_view(request.user):
 		raise PermissionDenied
 
@@ -366,8 +536,91 @@ def defect_change_status(request: HttpRequest, pk: int) -> HttpResponse:
 	return redirect('defect_detail', pk=defect.pk)
 
 
+# Сколько строк с ошибками импорта показывать на странице
+IMPORT_ERRORS_SHOWN = 200
+
+
+@login_required
+def defect_import(request: HttpRequest) -> HttpResponse:
+	"""Загрузка дефектов из CSV/XLSX (только менеджер); см. defects.imports."""
+
+	if not is_manager(request.user):
+		raise PermissionDenied
+
+	result = None
+	form = DefectImportForm(request.POST or None, request.FILES or None)
+	if request.method == 'POST' and form.is_valid():
+		upload = form.cleaned_data['file']
+		try:
+			# upload.file — сам BytesIO/временный файл: его понимают и csv, и openpyxl
+			result = import_defects(upload.file, form.format, user=request.user, dry_run=form.cleaned_data['dry_run'])
+		except (ImportFormatError, UnicodeDecodeError) as exc:
+			form.add_error('file', str(exc) if isinstance(exc, ImportFormatError) else 'Файл CSV должен быть в кодировке UTF-8.')
+		else:
+			if not result.dry_run and result.created:
+				messages.success(request, f'Импортировано дефектов: {result.created}.')
+
+	return render(
+		request,
+		'defects/defect_import.html',
+		{
+			'form': form,
+			'result': result,
+			'errors_shown': result.errors[:IMPORT_ERRORS_SHOWN] if result else [],
+		},
+	)
+
+
+# Сколько ошибок массового действия показывать сообщениями по отдельности
+BULK_MESSAGES_LIMIT = 10
+
+
 @login_required
 @require_POST
+@retry_on_lock()
+def defect_bulk_update(request: HttpRequest) -> HttpResponse:
+	"""Массовая смена статуса/исполнителя (только менеджер).
+
+	Ошибки по отдельным дефектам не отменяют остальные изменения. Клиенту,
+	запросившему JSON, возвращается {updated: [...], errors: {id: причина}};
+	форма с дашборда получает сообщения и редирект обратно на список.
+	"""
+
+	if not is_manager(request.user):
+		raise PermissionDenied
+
+	wants_json = request.get_preferred_type(['text/html', 'application/json']) == 'application/json'
+	form = DefectBulkForm(request.POST)
+	if not form.is_valid():
+		errors = [error for field_errors in form.errors.values() for error in field_errors]
+		if wants_json:
+			return JsonResponse({'errors': form.errors}, status=400)
+		messages.error(request, ' '.join(errors))
+		return safe_redirect_to_next(request)
+
+	result = bulk_update_defects(
+		user=request.user,
+		defect_ids=form.cleaned_data['ids'],
+		status=form.cleaned_data['status'] or None,
+		executor=form.cleaned_data['executor'],
+	)
+	if wants_json:
+		return JsonResponse({'updated': result.updated, 'errors': result.errors})
+
+	if result.updated:
+		messages.success(request, f'Изменено дефектов: {len(result.updated)}.')
+	errors = list(result.errors.items())
+	for pk, error in errors[:BULK_MESSAGES_LIMIT]:
+		messages.warning(request, f'Дефект #{pk}: {error}')
+	if len(errors) > BULK_MESSAGES_LIMIT:
+		messages.warning(request, f'Не изменены ещё {len(errors) - BULK_MESSAGES_LIMIT} дефектов.')
+	return safe_redirect_to_next(request)
+
+
+@login_required
+@require_POST
+@retry_on_lock()
+@recording_history()
 def defect_add_comment(request: HttpRequest, pk: int) -> HttpResponse:
 	defect = get_object_or_404(Defect, pk=pk)
 	if not defect.can_view(request.user):
@@ -393,6 +646,8 @@ def defect_add_comment(request: HttpRequest, pk: int) -> HttpResponse:
 
 @login_required
 @require_POST
+@retry_on_lock()
+@recording_history()
 def defect_add_attachment(request: HttpRequest, pk: int) -> HttpResponse:
 	defect = get_object_or_404(Defect, pk=pk)
 	if not defect.can_edit(request.user) and not is_manager(request.user):
@@ -400,14 +655,12 @@ def defect_add_attachment(request: HttpRequest, pk: int) -> HttpResponse:
 
 	form = AttachmentForm(request.POST, request.FILES)
 	if form.is_valid():
-		attachment = form.save(commit=False)
-		attachment.defect = defect
-		attachment.save()
+		attachment = store_attachment(defect, form.cleaned_data['file'])
 		log_defect_event(
 			defect=defect,
 			user=request.user,
 			action='attachment_added',
-			changes={'file': {'to': attachment.file.name}},
+			changes={'file': {'to': attachment.display_name}},
 		)
 		messages.success(request, 'Вложение загружено.')
 	else:
@@ -415,86 +668,166 @@ def defect_add_attachment(request: HttpRequest, pk: int) -> HttpResponse:
 	return redirect('defect_detail', pk=defect.pk)
 
 
+def _viewable_attachment(request: HttpRequest, pk: int) -> Attachment:
+	attachment = get_object_or_404(Attachment.objects.select_related('defect', 'blob'), pk=pk)
+	# Как и карточка: дефект вне области видимости — 404, а не 403
+	if not attachment.defect.can_view(request.user):
+		raise Http404('No attachment found')
+	return attachment
+
+
+@login_required
+def attachment_download(request: HttpRequest, pk: int) -> HttpResponse:
+	"""Оригинал вложения после проверки прав; передачу берёт на себя прокси (defects.downloads)."""
+
+	attachment = _viewable_attachment(request, pk)
+	return serve_protected(
+		request,
+		attachment.file,
+		filename=attachment.display_name,
+		etag=attachment.blob.sha256 if attachment.blob else None,
+		as_attachment='download' in request.GET,
+	)
+
+
+@login_required
+def attachment_derivative(request: HttpRequest, pk: int, kind: str) -> HttpResponse:
+	"""Миниатюра или превью фото-вложения (после обработки worker'ом).
+
+	Файл неизменен (путь из хеша содержимого), поэтому браузер кэширует его
+	надолго; private — копия доступна только тем, кто видит дефект.
+	"""
+
+	if kind not in DERIVATIVE_FIELDS:
+		raise Http404('Unknown derivative')
+	attachment = _viewable_attachment(request, pk)
+	blob = attachment.blob
+	if blob is None or blob.derivatives_status != AttachmentBlob.Derivatives.DONE:
+		raise Http404('Derivative is not ready')
+	return serve_protected(
+		request,
+		getattr(blob, DERIVATIVE_FIELDS[kind]),
+		content_type='image/jpeg',
+		etag=f'{blob.sha256}-{kind}',
+		max_age=settings.ATTACHMENT_DERIVATIVE_MAX_AGE,
+	)
+
+
 @login_required
 def export_defects_csv(request: HttpRequest) -> HttpResponse:
-	qs = Defect.objects.select_related('project', 'executor')
-	if is_engineer(request.user):
-		qs = qs.filter(executor=request.user)
+	qs = filter_defects_for_user(Defect.objects.all(), request.user)
 
-	response = HttpResponse(content_type='text/csv; charset=utf-8')
+	# Потоковая отдача: память worker'а не зависит от числа строк,
+	# а первые байты уходят клиенту сразу.
+	response = StreamingHttpResponse(iter_csv(qs), content_type='text/csv; charset=utf-8')
 	response['Content-Disposition'] = 'attachment; filename="defects.csv"'
-	response.write('\ufeff')
-
-	writer = csv.writer(response, delimiter=';')
-	writer.writerow(['ID', 'Проект', 'Заголовок', 'Приоритет', 'Статус', 'Исполнитель', 'Deadline', 'Создано'])
-	for d in qs.order_by('-created_at'):
-		writer.writerow(
-			[
-				d.pk,
-				d.project.name,
-				d.title,
-				d.get_priority_display(),
-				d.get_status_display(),
-				getattr(d.executor, 'username', ''),
-				d.deadline.isoformat(),
-				d.created_at.strftime('%Y-%m-%d %H:%M'),
-			]
-		)
-
 	return response
 
 
 @login_required
 def export_defects_xlsx(request: HttpRequest) -> HttpResponse:
-	qs = Defect.objects.select_related('project', 'executor')
-	if is_engineer(request.user):
-		qs = qs.filter(executor=request.user)
-
-	wb = Workbook()
-	ws = wb.active
-	ws.title = 'Defects'
-
-	ws.append(['ID', 'Проект', 'Заголовок', 'Описание', 'Приоритет', 'Статус', 'Исполнитель', 'Deadline', 'Создано'])
-	for d in qs.order_by('-created_at'):
-		ws.append(
-			[
-				d.pk,
-				d.project.name,
-				d.title,
-				d.description,
-				d.get_priority_display(),
-				d.get_status_display(),
-				getattr(d.executor, 'username', ''),
-				d.deadline.isoformat(),
-				d.created_at.strftime('%Y-%m-%d %H:%M'),
-			]
-		)
+	qs = filter_defects_for_user(Defect.objects.all(), request.user)
 
-	bio = io.BytesIO()
-	wb.save(bio)
-	bio.seek(0)
+	# Книга собирается во временном файле на диске и отдаётся через FileResponse
+	# порциями; файл удаляется при закрытии ответа.
+	tmp = tempfile.TemporaryFile(suffix='.xlsx')
+	try:
+		write_xlsx(qs, tmp)
+	except Exception:
+		tmp.close()
+		raise
+	tmp.seek(0)
+	return FileResponse(tmp, as_attachment=True, filename='defects.xlsx', content_type=XLSX_CONTENT_TYPE)
 
-	response = HttpResponse(
-		bio.getvalue(),
-		content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+
+@login_required
+@require_POST
+@retry_on_lock()
+def export_job_create(request: HttpRequest) -> HttpResponse:
+	fmt = request.POST.get('format')
+	if fmt not in ExportJob.Format.values:
+		raise PermissionDenied
+	ExportJob.objects.create(user=request.user, format=fmt)
+	messages.success(request, 'Выгрузка поставлена в очередь. Файл появится на этой странице, когда будет готов.')
+	return redirect('export_job_list')
+
+
+@login_required
+def export_job_list(request: HttpRequest) -> HttpResponse:
+	jobs = list(ExportJob.objects.filter(user=request.user)[:20])
+	has_active = any(job.status in {ExportJob.Status.PENDING, ExportJob.Status.RUNNING} for job in jobs)
+	return render(request, 'defects/export_jobs.html', {'jobs': jobs, 'has_active': has_active})
+
+
+@login_required
+def export_job_status(request: HttpRequest) -> JsonResponse:
+	"""Состояние выгрузок пользователя для опроса со страницы выгрузок."""
+
+	jobs = ExportJob.objects.filter(user=request.user)[:20]
+	return JsonResponse(
+		{
+			'jobs': [
+				{
+					'id': job.pk,
+					'status': job.status,
+					'status_display': job.get_status_display(),
+					'progress': job.progress,
+					'processed_rows': job.processed_rows,
+					'total_rows': job.total_rows,
+					'download_url': reverse('export_job_download', kwargs={'pk': job.pk}) if job.is_ready else '',
+				}
+				for job in jobs
+			]
+		}
 	)
-	response['Content-Disposition'] = 'attachment; filename="defects.xlsx"'
-	return response
 
 
 @login_required
-def analytics_view(request: HttpRequest) -> HttpResponse:
+def export_job_download(request: HttpRequest, pk: int) -> HttpResponse:
+	# Чужие выгрузки не отдаём: 404, как и для дефектов вне области видимости
+	job = get_object_or_404(ExportJob, pk=pk, user=request.user)
+	if not job.is_ready:
+		raise Http404
+	content_type = XLSX_CONTENT_TYPE if job.format == ExportJob.Format.XLSX else 'text/csv; charset=utf-8'
+	return serve_protected(request, job.file, as_attachment=True, filename=f'defects.{job.format}', content_type=content_type)
+
+
+def _check_analytics_access(user) -> None:
 	# Аналитика доступна менеджеру и руководителю
-	if not (is_manager(request.user) or is_customer(request.user)):
+	if not (is_manager(user) or is_customer(user)):
 		raise PermissionDenied
 
-	stats = (
-		Defect.objects.values('status')
-		.annotate(total=Count('id'))
-		.order_by('status')
+
+def _analytics_status_counts(user) -> dict[str, int]:
+	def compute():
+		# Счётчики поддерживаются инкрементально (defects.signals), без COUNT по всей таблице
+		stats = (
+			DefectStatusRollup.objects.values('status')
+			.annotate(total=Sum('total'))
+			.order_by('status')
+		)
+		return {row['status']: row['total'] for row in stats}
+
+	return cached_aggregate(ANALYTICS_STATUS, user, compute)
+
+
+def _analytics_breakdowns(user) -> dict:
+	return cached_aggregate(
+		ANALYTICS_BREAKDOWNS,
+		user,
+		lambda: compute_breakdowns(filter_defects_for_user(Defect.objects.all(), user)).as_dict(),
+		# Просрочка и недели считаются от текущей даты
+		params={'today': timezone.localdate()},
 	)
-	# Преобразуем в удобный вид для шаблона
-	by_status = {row['status']: row['total'] for row in stats}
+
+
+@login_required
+def analytics_view(request: HttpRequest) -> HttpResponse:
+	_check_analytics_access(request.user)
+
+	# Страница строится только по сводке статусов. Разрезы (при промахе кэша —
+	# проход по всей таблице) графики догружают из analytics_data
+	by_status = _analytics_status_counts(request.user)
 	status_labels = [label for _, label in Defect.Status.choices]
 	status_keys = [key for key, _ in Defect.Status.choices]
 	status_values = [by_status.get(key, 0) for key in status_keys]
@@ -510,6 +843,14 @@ def analytics_view(request: HttpRequest) -> HttpResponse:
 	)
 
 
+@login_required
+def analytics_data(request: HttpRequest) -> JsonResponse:
+	"""Разрезы аналитики в JSON: их загружают графики страницы analytics_view."""
+
+	_check_analytics_access(request.user)
+	return JsonResponse(_analytics_breakdowns(request.user))
+
+
 def safe_redirect_to_next(request: HttpRequest, default_name: str = 'dashboard') -> HttpResponse:
 	"""Безопасный редирект на next (если передан), иначе на default."""
 
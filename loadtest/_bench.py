@@ -0,0 +1,119 @@
+"""Общие утилиты для микробенчмарков в loadtest/.
+
+Бенчмарки запускаются как обычные скрипты (`python loadtest/bench_*.py`)
+и работают на отдельной временной БД, созданной так же, как это делает
+pytest-django, поэтому рабочая база не затрагивается.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+	sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sistemakontrol.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+
+@contextmanager
+def bench_database():
+	"""Временная тестовая БД на время прогона.
+
+	Для SQLite база создаётся файлом во временной папке (а не в памяти),
+	чтобы цифры были ближе к боевым.
+	"""
+
+	from django.db import connection
+
+	old_name = connection.settings_dict['NAME']
+	with tempfile.TemporaryDirectory() as tmp:
+		if connection.vendor == 'sqlite':
+			connection.settings_dict.setdefault('TEST', {})['NAME'] = str(Path(tmp) / 'bench.sqlite3')
+		connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+		try:
+			yield
+		finally:
+			connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def seed_defects(total: int, *, projects: int = 20, engineers: int = 50, batch_size: int = 5000) -> None:
+	"""Заполняет БД синтетическими дефектами через bulk_create."""
+
+	from django.contrib.auth import get_user_model
+
+	from defects.models import Defect, Project
+
+	User = get_user_model()
+
+	project_objs = Project.objects.bulk_create(
+		[
+			Project(name=f'Объект {i}', address=f'Москва, ул. Тестовая, {i}', start_date=dt.date(2024, 1, 1))
+			for i in range(projects)
+		]
+	)
+	users = User.objects.bulk_create(
+		[User(username=f'bench_eng_{i}', role='engineer') for i in range(engineers)]
+	)
+
+	priorities = [key for key, _ in Defect.Priority.choices]
+	statuses = [key for key, _ in Defect.Status.choices]
+	description = 'Синтетическое описание дефекта для нагрузочного прогона. ' * 4
+	base_day = dt.date(2024, 1, 1)
+
+	buf = []
+	for i in range(total):
+		buf.append(
+			Defect(
+				project=project_objs[i % projects],
+				executor=users[i % engineers] if i % 10 else None,
+				title=f'Дефект #{i}',
+				description=description,
+				priority=priorities[i % len(priorities)],
+				status=statuses[(i // 7) % len(statuses)],
+				deadline=base_day + dt.timedelta(days=i % 720),
+			)
+		)
+		if len(buf) >= batch_size:
+			Defect.objects.bulk_create(buf)
+			buf.clear()
+	if buf:
+		Defect.objects.bulk_create(buf)
+
+
+def measure(fn: Callable[[], object]) -> tuple[float, int]:
+	"""Возвращает (время в секундах, пик памяти Python в байтах).
+
+	Время и память снимаются в разных прогонах: tracemalloc заметно
+	замедляет выполнение и исказил бы время.
+	"""
+
+	gc.collect()
+	started = time.perf_counter()
+	fn()
+	elapsed = time.perf_counter() - started
+
+	gc.collect()
+	tracemalloc.start()
+	try:
+		fn()
+		_, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	return elapsed, peak
+
+
+def format_mb(size: int) -> str:
+	return f'{size / 1024 / 1024:.1f} MB'
@@ -0,0 +1,74 @@
+"""Бенчмарк аналитики: отдельный GROUP BY на каждый виджет против одного прохода.
+
+Запуск:
+	python loadtest/bench_analytics.py                    # 100k и 1M
+	python loadtest/bench_analytics.py --sizes 10000
+
+«before» — шесть агрегирующих запросов (по одному на график), «after» —
+defects.analytics.compute_breakdowns (одна выборка + NumPy).
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from _bench import bench_database, format_mb, measure, seed_defects
+
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+
+from defects.analytics import compute_breakdowns
+from defects.models import Defect
+
+
+def per_widget_queries() -> None:
+	today = timezone.localdate()
+	is_open = Q(status__in=Defect.OPEN_STATUSES)
+	overdue = is_open & Q(deadline__lt=today)
+	closed = Q(status=Defect.Status.CLOSED)
+	closed_late = closed & Q(updated_at__date__gt=F('deadline'))
+	qs = Defect.objects.order_by()
+
+	list(qs.values('project__name', 'status').annotate(total=Count('id')))
+	list(
+		qs.values('executor__username').annotate(
+			open=Count('id', filter=is_open & ~overdue),
+			overdue=Count('id', filter=overdue),
+			closed=Count('id', filter=closed),
+		)
+	)
+	list(qs.values('priority', 'status').annotate(total=Count('id')))
+	qs.aggregate(
+		open=Count('id', filter=is_open & ~overdue),
+		overdue=Count('id', filter=overdue),
+		closed=Count('id', filter=closed & ~closed_late),
+		closed_late=Count('id', filter=closed_late),
+	)
+	list(qs.annotate(week=TruncWeek('created_at')).values('week').annotate(total=Count('id')))
+	list(qs.filter(closed).annotate(week=TruncWeek('updated_at')).values('week').annotate(total=Count('id')))
+
+
+def one_pass() -> None:
+	compute_breakdowns()
+
+
+CASES = (('before', per_widget_queries), ('after', one_pass))
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+	args = parser.parse_args()
+
+	print(f"{'rows':>8} {'variant':>8} {'time, s':>9} {'peak mem':>11}")
+	for size in args.sizes:
+		with bench_database():
+			seed_defects(size)
+			for variant, fn in CASES:
+				elapsed, peak = measure(fn)
+				print(f'{size:>8} {variant:>8} {elapsed:>9.2f} {format_mb(peak):>11}', flush=True)
+
+
+if __name__ == '__main__':
+	main()
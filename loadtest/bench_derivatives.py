@@ -0,0 +1,77 @@
+"""Бенчмарк уменьшенных копий фото-вложений.
+
+Запуск:
+	python loadtest/bench_derivatives.py                  # 24 фото 4032x3024
+	python loadtest/bench_derivatives.py --photos 48 --workers 4
+
+Показывает вес вложения на странице (оригинал против миниатюры и превью) и
+пропускную способность обработки: в одном процессе и в пуле процессов, как в
+worker'е run_derivative_jobs. БД не нужна.
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from _bench import format_mb
+
+from django.conf import settings
+from PIL import Image
+
+from defects.derivatives import derivative_sizes
+from defects.imaging import render_derivatives
+
+
+def make_photo(path: Path, seed: int) -> None:
+	# Шум поверх градиента: сжимается примерно как фото с телефона (3-5 МБ)
+	base = Image.linear_gradient('L').resize((4032, 3024)).convert('RGB')
+	noise = Image.frombytes('RGB', base.size, os.urandom(base.size[0] * base.size[1] * 3))
+	Image.blend(base, noise, 0.25 + seed % 3 * 0.05).save(path, 'JPEG', quality=92)
+
+
+def run(paths: list[str], workers: int) -> tuple[float, list[dict[str, bytes]]]:
+	sizes, quality = derivative_sizes(), settings.ATTACHMENT_DERIVATIVE_QUALITY
+	started = time.perf_counter()
+	if workers:
+		with ProcessPoolExecutor(max_workers=workers) as pool:
+			results = list(pool.map(partial(render_derivatives, sizes=sizes, quality=quality), paths))
+	else:
+		results = [render_derivatives(path, sizes, quality=quality) for path in paths]
+	return time.perf_counter() - started, results
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--photos', type=int, default=24)
+	parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as tmp:
+		paths = []
+		for i in range(args.photos):
+			path = Path(tmp) / f'photo_{i}.jpg'
+			make_photo(path, i)
+			paths.append(str(path))
+		original = sum(Path(path).stat().st_size for path in paths)
+
+		print(f"{'variant':>10} {'photos':>7} {'seconds':>9} {'photos/s':>9}")
+		for label, workers in (('inline', 0), (f'pool x{args.workers}', args.workers)):
+			elapsed, results = run(paths, workers)
+			print(f'{label:>10} {args.photos:>7} {elapsed:>9.2f} {args.photos / elapsed:>9.1f}', flush=True)
+
+	print()
+	print(f'original:  {format_mb(original // args.photos)} per photo')
+	for kind in derivative_sizes():
+		size = sum(len(result[kind]) for result in results) // args.photos
+		print(f'{kind + ":":<10} {size / 1024:.0f} KB per photo')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,110 @@
+"""Бенчмарк экспорта дефектов: время и пик памяти до/после потоковой отдачи.
+
+Запуск:
+	python loadtest/bench_exports.py                      # 10k, 100k, 500k
+	python loadtest/bench_exports.py --sizes 10000 --format xlsx
+
+«До» — прежняя реализация (модели целиком, Workbook в памяти, BytesIO +
+getvalue()), «после» — текущие функции из defects.exports.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import tempfile
+
+from _bench import bench_database, format_mb, measure, seed_defects
+
+from openpyxl import Workbook
+
+from defects.exports import iter_csv, write_xlsx
+from defects.models import Defect
+
+
+def legacy_csv() -> bytes:
+	out = io.StringIO()
+	out.write('\ufeff')
+	writer = csv.writer(out, delimiter=';')
+	writer.writerow(['ID', 'Проект', 'Заголовок', 'Приоритет', 'Статус', 'Исполнитель', 'Deadline', 'Создано'])
+	for d in Defect.objects.select_related('project', 'executor').order_by('-created_at'):
+		writer.writerow(
+			[
+				d.pk,
+				d.project.name,
+				d.title,
+				d.get_priority_display(),
+				d.get_status_display(),
+				getattr(d.executor, 'username', ''),
+				d.deadline.isoformat(),
+				d.created_at.strftime('%Y-%m-%d %H:%M'),
+			]
+		)
+	return out.getvalue().encode('utf-8')
+
+
+def streaming_csv() -> None:
+	for chunk in iter_csv(Defect.objects.all()):
+		chunk.encode('utf-8')
+
+
+def legacy_xlsx() -> bytes:
+	wb = Workbook()
+	ws = wb.active
+	ws.title = 'Defects'
+	ws.append(['ID', 'Проект', 'Заголовок', 'Описание', 'Приоритет', 'Статус', 'Исполнитель', 'Deadline', 'Создано'])
+	for d in Defect.objects.select_related('project', 'executor').order_by('-created_at'):
+		ws.append(
+			[
+				d.pk,
+				d.project.name,
+				d.title,
+				d.description,
+				d.get_priority_display(),
+				d.get_status_display(),
+				getattr(d.executor, 'username', ''),
+				d.deadline.isoformat(),
+				d.created_at.strftime('%Y-%m-%d %H:%M'),
+			]
+		)
+	bio = io.BytesIO()
+	wb.save(bio)
+	bio.seek(0)
+	return bio.getvalue()
+
+
+def write_only_xlsx() -> None:
+	# Как во view: спулинг во временный файл и чтение порциями (как FileResponse).
+	with tempfile.TemporaryFile(suffix='.xlsx') as tmp:
+		write_xlsx(Defect.objects.all(), tmp)
+		tmp.seek(0)
+		while tmp.read(64 * 1024):
+			pass
+
+
+CASES = {
+	'csv': (('before', legacy_csv), ('after', streaming_csv)),
+	'xlsx': (('before', legacy_xlsx), ('after', write_only_xlsx)),
+}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 500_000])
+	parser.add_argument('--format', choices=['csv', 'xlsx', 'all'], default='all')
+	args = parser.parse_args()
+
+	formats = list(CASES) if args.format == 'all' else [args.format]
+	print(f"{'rows':>8} {'format':>6} {'variant':>8} {'time, s':>9} {'peak mem':>11}")
+	for size in args.sizes:
+		with bench_database():
+			seed_defects(size)
+			for fmt in formats:
+				for variant, fn in CASES[fmt]:
+					elapsed, peak = measure(fn)
+					print(f'{size:>8} {fmt:>6} {variant:>8} {elapsed:>9.2f} {format_mb(peak):>11}', flush=True)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,89 @@
+"""Бенчмарк рендера дашборда: без кэша фрагментов и с тёплым кэшем.
+
+Запуск:
+	python loadtest/bench_fragments.py                    # страницы по 20 и 200 строк
+	python loadtest/bench_fragments.py --rows 50 --repeat 100
+
+«before» — DummyCache: {% cache %} ничего не хранит, каждая строка и форма
+фильтров рендерятся заново (как без кэширования); «after» — файловый кэш (как
+по умолчанию в settings) после первого рендера. Время — среднее на один рендер шаблона (без SQL по
+дефектам: строки выбираются один раз заранее).
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+
+from _bench import bench_database, measure, seed_defects
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from defects.cache import fragment_cache_context
+from defects.models import Defect
+
+
+CACHES = {
+	'before': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+	'after': {
+		'default': {
+			'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+			'LOCATION': tempfile.mkdtemp(prefix='bench-fragments-'),
+		}
+	},
+}
+
+
+def make_renderer(rows: int):
+	User = get_user_model()
+	manager = User.objects.create_user(username='bench_manager', role='manager')
+	request = RequestFactory().get('/')
+	request.user = manager
+	defects = list(Defect.objects.select_related('project', 'executor').order_by('-created_at', '-id')[:rows])
+
+	def render() -> None:
+		context = {
+			'defects': defects,
+			'statuses': Defect.Status.choices,
+			'priorities': Defect.Priority.choices,
+			'executors': User.objects.filter(is_active=True).order_by('username'),
+			'filters': {'status': '', 'priority': '', 'executor': '', 'q': '', 'sort': '-created_at'},
+			'is_paginated': False,
+			**fragment_cache_context(),
+		}
+		render_to_string('defects/dashboard.html', context, request=request)
+
+	return render
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--rows', type=int, nargs='+', default=[20, 200])
+	parser.add_argument('--repeat', type=int, default=50)
+	args = parser.parse_args()
+
+	print(f"{'rows':>6} {'variant':>8} {'ms/render':>10}")
+	with bench_database():
+		seed_defects(max(args.rows))
+		for rows in args.rows:
+			for variant, caches in CACHES.items():
+				with override_settings(CACHES=caches):
+					render = make_renderer(rows)
+					cache.clear()
+					render()  # прогрев: для «after» заполняет кэш фрагментов
+
+					def loop():
+						for _ in range(args.repeat):
+							render()
+
+					elapsed, _ = measure(loop)
+					print(f'{rows:>6} {variant:>8} {elapsed / args.repeat * 1000:>10.2f}', flush=True)
+					get_user_model().objects.filter(username='bench_manager').delete()
+
+
+if __name__ == '__main__':
+	main()
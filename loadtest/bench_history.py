@@ -0,0 +1,87 @@
+"""Бенчмарк записи изменений дефекта вместе с историей.
+
+Запуск:
+	python loadtest/bench_history.py                       # 2000 изменений
+	python loadtest/bench_history.py --writes 5000 --batch 50
+
+Для PostgreSQL задайте POSTGRES_* (см. .env.example) — бенчмарк создаст
+временную тестовую БД на том же сервере.
+
+Варианты:
+- before — как было: save() дефекта и INSERT истории в autocommit, два
+  коммита (и два fsync) на изменение;
+- after — recording_history(): изменение и история одним коммитом;
+- batch — recording_history() вокруг --batch изменений (массовые операции):
+  история уходит одним bulk_create на транзакцию.
+"""
+
+from __future__ import annotations
+
+import argparse
+from itertools import cycle, islice
+
+from _bench import bench_database, measure, seed_defects
+
+from django.db import connection
+
+from defects.history import recording_history
+from defects.models import Defect
+from defects.services import log_defect_event
+
+
+PRIORITIES = [key for key, _ in Defect.Priority.choices]
+
+
+def change(defect: Defect, priority: str) -> None:
+	old = defect.get_priority_display()
+	defect.priority = priority
+	defect.save(update_fields=['priority', 'updated_at'])
+	log_defect_event(
+		defect=defect,
+		user=None,
+		action='updated',
+		changes={'priority': {'from': old, 'to': defect.get_priority_display()}},
+	)
+
+
+def make_variants(defects: list[Defect], writes: int, batch: int):
+	def plan():
+		return zip(islice(cycle(defects), writes), cycle(PRIORITIES))
+
+	def before() -> None:
+		for defect, priority in plan():
+			change(defect, priority)
+
+	def after() -> None:
+		for defect, priority in plan():
+			with recording_history():
+				change(defect, priority)
+
+	def batched() -> None:
+		items = list(plan())
+		for start in range(0, len(items), batch):
+			with recording_history():
+				for defect, priority in items[start:start + batch]:
+					change(defect, priority)
+
+	return {'before': before, 'after': after, 'batch': batched}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--writes', type=int, default=2000)
+	parser.add_argument('--batch', type=int, default=100)
+	args = parser.parse_args()
+
+	print(f'database: {connection.vendor}')
+	print(f"{'variant':>8} {'writes':>7} {'seconds':>9} {'writes/s':>9}")
+	with bench_database():
+		seed_defects(500)
+		defects = list(Defect.objects.all())
+		for variant, fn in make_variants(defects, args.writes, args.batch).items():
+			elapsed, _ = measure(fn)
+			print(f'{variant:>8} {args.writes:>7} {elapsed:>9.2f} {args.writes / elapsed:>9.0f}', flush=True)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,109 @@
+"""Бенчмарк импорта дефектов: построчное создание против defects.imports.
+
+Запуск:
+	python loadtest/bench_import.py                       # 1k и 10k строк
+	python loadtest/bench_import.py --sizes 50000 --format xlsx
+
+«before» — то, что делает DefectCreateView на каждую строку: поиск проекта и
+исполнителя, full_clean(), save() (сигналы сводки и поиска) и запись в
+историю; «after» — import_defects() с порциями bulk_create. Оба варианта
+читают один и тот же файл и откатываются после замера.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+
+from _bench import bench_database, format_mb, measure, seed_defects
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from openpyxl import Workbook
+
+from defects.imports import import_defects, read_rows
+from defects.models import Defect, Project
+from defects.services import log_defect_event
+
+
+HEADER = ['Проект', 'Заголовок', 'Описание', 'Приоритет', 'Статус', 'Исполнитель', 'Deadline']
+
+
+class Rollback(Exception):
+	pass
+
+
+def make_file(rows: int, fmt: str) -> bytes:
+	projects = list(Project.objects.values_list('name', flat=True))
+	users = list(get_user_model().objects.values_list('username', flat=True))
+	data = [
+		[projects[i % len(projects)], f'Замечание #{i}', 'Выявлено при обходе объекта.', 'Medium', '', users[i % len(users)], '2025-06-01']
+		for i in range(rows)
+	]
+	buffer = io.BytesIO()
+	if fmt == 'csv':
+		text = io.StringIO()
+		writer = csv.writer(text, delimiter=';')
+		writer.writerow(HEADER)
+		writer.writerows(data)
+		buffer.write(text.getvalue().encode('utf-8'))
+	else:
+		wb = Workbook(write_only=True)
+		ws = wb.create_sheet()
+		ws.append(HEADER)
+		for row in data:
+			ws.append(row)
+		wb.save(buffer)
+	return buffer.getvalue()
+
+
+def per_row(content: bytes, fmt: str) -> None:
+	for _, values in read_rows(io.BytesIO(content), fmt):
+		defect = Defect(
+			project=Project.objects.get(name=values['project']),
+			executor=get_user_model().objects.get(username=values['executor']),
+			title=values['title'],
+			description=values['description'],
+			priority=values['priority'].lower(),
+			deadline=values['deadline'],
+		)
+		defect.full_clean()
+		defect.save()
+		log_defect_event(defect=defect, user=None, action='created', changes={'title': {'to': defect.title}})
+
+
+def rolled_back(fn):
+	def run() -> None:
+		try:
+			with transaction.atomic():
+				fn()
+				raise Rollback
+		except Rollback:
+			pass
+
+	return run
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000])
+	parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+	args = parser.parse_args()
+
+	print(f"{'rows':>8} {'variant':>8} {'seconds':>9} {'rows/s':>9} {'peak mem':>10}")
+	with bench_database():
+		seed_defects(0)
+		for size in args.sizes:
+			content = make_file(size, args.format)
+			variants = {
+				'before': rolled_back(lambda: per_row(content, args.format)),
+				'after': rolled_back(lambda: import_defects(io.BytesIO(content), args.format)),
+			}
+			for variant, fn in variants.items():
+				elapsed, peak = measure(fn)
+				print(f'{size:>8} {variant:>8} {elapsed:>9.2f} {size / elapsed:>9.0f} {format_mb(peak):>10}', flush=True)
+
+
+if __name__ == '__main__':
+	main()
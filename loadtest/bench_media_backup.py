@@ -0,0 +1,66 @@
+"""Бенчмарк инкрементальной копии MEDIA_ROOT (backup_media).
+
+Запуск:
+	python loadtest/bench_media_backup.py                     # 2000 файлов по 128 KB
+	python loadtest/bench_media_backup.py --files 20000 --size 64 --workers 8
+
+Три прогона на синтетическом дереве blobs/ab/cd/<sha>: первая полная копия,
+повторная на неизменном дереве (только обход и stat) и копия после изменения
+1% файлов. БД не нужна.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+from pathlib import Path
+
+from _bench import format_mb
+
+from django.conf import settings
+
+from defects.media_backup import backup_media
+
+
+def make_tree(root: Path, files: int, size_kb: int) -> list[Path]:
+	paths = []
+	for i in range(files):
+		name = f'{i:08x}'
+		path = root / 'blobs' / name[-2:] / name[-4:-2] / f'{name}.jpg'
+		path.parent.mkdir(parents=True, exist_ok=True)
+		path.write_bytes(os.urandom(size_kb * 1024))
+		paths.append(path)
+	return paths
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--files', type=int, default=2000)
+	parser.add_argument('--size', type=int, default=128, help='Размер файла, KB.')
+	parser.add_argument('--workers', type=int, default=settings.BACKUP_MEDIA_WORKERS)
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as tmp:
+		root, out_dir = Path(tmp) / 'media', Path(tmp) / 'backup'
+		paths = make_tree(root, args.files, args.size)
+
+		print(f"{'run':>10} {'files':>7} {'hashed':>7} {'copied':>10} {'seconds':>9}")
+
+		def run(label: str, stamp: str) -> None:
+			result = backup_media(root, out_dir, stamp=stamp, workers=args.workers)
+			print(
+				f'{label:>10} {result.files:>7} {result.hashed:>7} {format_mb(result.copied_bytes):>10} '
+				f'{result.seconds:>9.2f}',
+				flush=True,
+			)
+
+		run('full', '20260101_000000')
+		run('unchanged', '20260102_000000')
+		for path in paths[::100]:
+			path.write_bytes(os.urandom(args.size * 1024))
+		run('1% new', '20260103_000000')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,71 @@
+"""Бенчмарк копии, проверки и восстановления БД (backup_db / verify_backup / restore_db).
+
+Запуск:
+	python loadtest/bench_restore.py                  # 100 000 дефектов
+	python loadtest/bench_restore.py --defects 500000
+
+Для PostgreSQL задайте POSTGRES_* (см. .env.example) и установите клиент
+PostgreSQL (pg_dump/pg_restore) — бенчмарк создаст временную тестовую БД на
+том же сервере; проверка создаёт и удаляет ещё одну (нужно право CREATEDB).
+
+Печатает время копии, проверки копии в одноразовой базе и восстановления
+поверх рабочей базы для каждого вида сжатия — это время восстановления (RTO)
+на заданном объёме данных.
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+from pathlib import Path
+
+from _bench import bench_database, format_mb, seed_defects
+
+from django.db import connection
+
+from defects.backups import (
+	COMPRESSIONS,
+	backup_postgres,
+	backup_sqlite,
+	restore_postgres,
+	restore_sqlite,
+	verify_postgres,
+	verify_sqlite,
+)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--defects', type=int, default=100_000)
+	parser.add_argument('--jobs', type=int, default=4, help='Postgres: pg_dump/pg_restore -j.')
+	args = parser.parse_args()
+
+	with bench_database(), tempfile.TemporaryDirectory() as tmp:
+		seed_defects(args.defects)
+		out_dir = Path(tmp)
+		print(f"{'variant':>10} {'db':>9} {'backup':>9} {'backup s':>9} {'verify s':>9} {'restore s':>10}")
+
+		if connection.vendor == 'sqlite':
+			variants = [(compression, compression) for compression in ('none', 'gzip', 'xz')]
+		else:
+			variants = [(f'pg -j{args.jobs}', None)]
+		for label, compression in variants:
+			if compression is None:
+				result = backup_postgres(connection, out_dir, jobs=args.jobs, name='pg_bench.dir')
+				verified = verify_postgres(result.path, connection, jobs=args.jobs)
+				restore_seconds = restore_postgres(result.path, connection.settings_dict, jobs=args.jobs)
+			else:
+				result = backup_sqlite(connection, out_dir, compression=compression, name=f'db_bench.sqlite3{COMPRESSIONS[compression]}')
+				verified = verify_sqlite(result.path)
+				restore_seconds = restore_sqlite(result.path, connection).seconds
+			assert verified.row_counts == result.row_counts
+			print(
+				f'{label:>10} {format_mb(result.source_bytes):>9} {format_mb(result.size_bytes):>9} '
+				f'{result.seconds:>9.2f} {verified.restore_seconds + verified.check_seconds:>9.2f} '
+				f'{restore_seconds:>10.2f}',
+				flush=True,
+			)
+
+
+if __name__ == '__main__':
+	main()
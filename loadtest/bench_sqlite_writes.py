@@ -0,0 +1,147 @@
+"""Бенчмарк конкурентной записи в SQLite: настройки по умолчанию против SQLITE_PRODUCTION.
+
+Запуск:
+	python loadtest/bench_sqlite_writes.py                          # 3 писателя, 3 читателя, 5 с
+	python loadtest/bench_sqlite_writes.py --writers 6 --readers 6 --seconds 10
+
+Как три worker'а gunicorn из entrypoint.sh: отдельные процессы со своими
+соединениями к одному файлу БД. Писатель повторяет то, что делает
+defect_add_comment (чтение дефекта, комментарий и событие истории в одной
+транзакции), читатель — выборку первой страницы дефектов проекта.
+
+Варианты:
+- default — как settings по умолчанию: журнал отката, BEGIN DEFERRED, без
+  повторов;
+- production — SQLITE_PRODUCTION_OPTIONS (WAL, synchronous=NORMAL, mmap,
+  cache_size, busy_timeout, BEGIN IMMEDIATE) и retry_on_lock.
+
+Каждый вариант работает на своей свежей временной БД: режим WAL
+сохраняется в файле базы.
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import time
+
+from _bench import bench_database, seed_defects
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections
+
+
+def write_worker(seconds: float, retries: int, worker: int, results) -> None:
+	from django.contrib.auth import get_user_model
+
+	from defects.history import recording_history
+	from defects.locking import is_lock_error, retry_on_lock
+	from defects.models import Comment, Defect
+	from defects.services import log_defect_event
+
+	user = get_user_model().objects.order_by('pk').first()
+	ids = list(Defect.objects.order_by('pk').values_list('pk', flat=True)[:500])
+
+	@retry_on_lock(attempts=retries)
+	@recording_history()
+	def add_comment(pk: int, text: str) -> None:
+		defect = Defect.objects.get(pk=pk)
+		Comment.objects.create(defect=defect, author=user, text=text)
+		log_defect_event(defect=defect, user=user, action='comment_added', changes={'comment': {'to': text}})
+
+	done = errors = 0
+	latencies = []
+	deadline = time.perf_counter() + seconds
+	i = worker
+	while time.perf_counter() < deadline:
+		started = time.perf_counter()
+		try:
+			add_comment(ids[i % len(ids)], f'Комментарий {worker}-{i}')
+		except OperationalError as exc:
+			if not is_lock_error(exc):
+				raise
+			errors += 1
+		else:
+			done += 1
+			latencies.append(time.perf_counter() - started)
+		i += 7
+	connections.close_all()
+	results.put(('write', done, errors, latencies))
+
+
+def read_worker(seconds: float, worker: int, results) -> None:
+	from defects.models import Defect, Project
+
+	projects = list(Project.objects.values_list('pk', flat=True))
+	done = errors = 0
+	deadline = time.perf_counter() + seconds
+	i = worker
+	while time.perf_counter() < deadline:
+		try:
+			list(Defect.objects.filter(project_id=projects[i % len(projects)]).order_by('-updated_at')[:50])
+		except OperationalError:
+			errors += 1
+		else:
+			done += 1
+		i += 1
+	connections.close_all()
+	results.put(('read', done, errors, []))
+
+
+def p95(values: list[float]) -> float:
+	if not values:
+		return 0.0
+	values = sorted(values)
+	return values[min(len(values) - 1, int(len(values) * 0.95))]
+
+
+def run_variant(label: str, options: dict, retries: int, args) -> None:
+	connection.settings_dict['OPTIONS'] = options
+	with bench_database():
+		seed_defects(args.defects)
+		# Дочерние процессы открывают свои соединения, как worker'ы gunicorn
+		connections.close_all()
+		context = multiprocessing.get_context('fork')
+		results = context.Queue()
+		processes = [
+			context.Process(target=write_worker, args=(args.seconds, retries, i, results)) for i in range(args.writers)
+		] + [context.Process(target=read_worker, args=(args.seconds, i, results)) for i in range(args.readers)]
+		for process in processes:
+			process.start()
+		collected = [results.get() for _ in processes]
+		for process in processes:
+			process.join()
+
+	writes = sum(done for kind, done, _, _ in collected if kind == 'write')
+	write_errors = sum(errors for kind, _, errors, _ in collected if kind == 'write')
+	reads = sum(done for kind, done, _, _ in collected if kind == 'read')
+	latencies = [value for kind, _, _, values in collected if kind == 'write' for value in values]
+	print(
+		f'{label:>10} {writes / args.seconds:>9.1f} {write_errors:>7} {p95(latencies) * 1000:>10.1f} '
+		f'{reads / args.seconds:>9.1f}',
+		flush=True,
+	)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--writers', type=int, default=3)
+	parser.add_argument('--readers', type=int, default=3)
+	parser.add_argument('--seconds', type=float, default=5.0)
+	parser.add_argument('--defects', type=int, default=5000)
+	args = parser.parse_args()
+
+	if connection.vendor != 'sqlite':
+		parser.error('бенчмарк только для SQLite (уберите POSTGRES_HOST)')
+
+	original = connection.settings_dict.get('OPTIONS', {})
+	print(f"{'variant':>10} {'writes/s':>9} {'errors':>7} {'p95 ms':>10} {'reads/s':>9}")
+	try:
+		run_variant('default', {}, 0, args)
+		run_variant('production', dict(settings.SQLITE_PRODUCTION_OPTIONS), settings.SQLITE_LOCK_RETRIES, args)
+	finally:
+		connection.settings_dict['OPTIONS'] = original
+
+
+if __name__ == '__main__':
+	main()
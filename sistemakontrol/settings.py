@@ -7,6 +7,7 @@
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -89,6 +90,41 @@ DATABASES = {
     }
 }
 
+# Профиль SQLite для небольших площадок без Postgres (несколько worker'ов gunicorn на одной базе).
+# WAL — чтение не ждёт записи; synchronous=NORMAL — в WAL fsync только при checkpoint;
+# mmap и кэш страниц — меньше системных вызовов на чтение; busy_timeout — ждать блокировку,
+# а не падать сразу; BEGIN IMMEDIATE — транзакция берёт блокировку записи в начале: иначе
+# две транзакции, начавшие с чтения, при первой записи получают «database is locked» без ожидания.
+SQLITE_PRODUCTION = env('SQLITE_PRODUCTION', '0') == '1'
+SQLITE_BUSY_TIMEOUT_MS = int(env('SQLITE_BUSY_TIMEOUT_MS', '5000') or 5000)
+SQLITE_MMAP_SIZE = int(env('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)) or 0)
+SQLITE_CACHE_SIZE_KB = int(env('SQLITE_CACHE_SIZE_KB', '65536') or 0)
+
+SQLITE_PRODUCTION_OPTIONS = {
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': ';'.join(
+        [
+            'PRAGMA journal_mode=WAL',
+            'PRAGMA synchronous=NORMAL',
+            f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}',
+            f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}',
+            # Отрицательное значение — размер в KiB, а не в страницах
+            f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}',
+            'PRAGMA temp_store=MEMORY',
+        ]
+    ),
+}
+
+if SQLITE_PRODUCTION:
+    DATABASES['default']['OPTIONS'] = dict(SQLITE_PRODUCTION_OPTIONS)
+    # PRAGMA действуют на соединение: постоянные соединения не повторяют их на каждый запрос
+    DATABASES['default']['CONN_MAX_AGE'] = int(env('SQLITE_CONN_MAX_AGE', '60') or 60)
+
+# Повтор записи при «database is locked» (defects.locking.retry_on_lock): число повторов
+# и базовая задержка, сек (удваивается с каждой попыткой)
+SQLITE_LOCK_RETRIES = int(env('SQLITE_LOCK_RETRIES', '3') or 0)
+SQLITE_LOCK_RETRY_DELAY = float(env('SQLITE_LOCK_RETRY_DELAY', '0.05') or 0)
+
 if env('POSTGRES_HOST'):
     DATABASES['default'] = {
         'ENGINE': 'django.db.backends.postgresql',
@@ -152,6 +188,88 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Вложения: одинаковые файлы хранятся один раз, по пути из SHA-256 содержимого
+# (см. defects.blobs). Хеш считается upload handler'ами во время загрузки.
+ATTACHMENT_CONTENT_ADDRESSED = env('ATTACHMENT_CONTENT_ADDRESSED', '1') == '1'
+FILE_UPLOAD_HANDLERS = [
+    'defects.blobs.HashingMemoryFileUploadHandler',
+    'defects.blobs.HashingTemporaryFileUploadHandler',
+]
+
+# Уменьшенные копии фото-вложений (worker run_derivative_jobs): сторона
+# квадрата, в который вписываются миниатюра и превью, качество JPEG и число
+# процессов в пуле worker'а
+ATTACHMENT_THUMBNAIL_SIZE = int(env('ATTACHMENT_THUMBNAIL_SIZE', '320') or 320)
+ATTACHMENT_PREVIEW_SIZE = int(env('ATTACHMENT_PREVIEW_SIZE', '1280') or 1280)
+ATTACHMENT_DERIVATIVE_QUALITY = int(env('ATTACHMENT_DERIVATIVE_QUALITY', '80') or 80)
+ATTACHMENT_DERIVATIVE_WORKERS = int(env('ATTACHMENT_DERIVATIVE_WORKERS', '2') or 2)
+# Blob в обработке дольше стольких секунд считается брошенным упавшим worker'ом
+# и возвращается в очередь run_derivative_jobs (при старте и на каждом опросе)
+ATTACHMENT_DERIVATIVE_STALE_AFTER = int(env('ATTACHMENT_DERIVATIVE_STALE_AFTER', '900') or 900)
+# Копии неизменны (путь из хеша содержимого): браузер может хранить их год
+ATTACHMENT_DERIVATIVE_MAX_AGE = int(env('ATTACHMENT_DERIVATIVE_MAX_AGE', str(365 * 24 * 3600)) or 0)
+
+# Отдача вложений после проверки прав (defects.downloads): кто передаёт байты.
+# '' — сам Django (FileResponse с поддержкой Range), nginx — X-Accel-Redirect на
+# internal location PROTECTED_MEDIA_INTERNAL_URL, sendfile — X-Sendfile (Apache, lighttpd)
+PROTECTED_MEDIA_SERVER = env('PROTECTED_MEDIA_SERVER', '') or ''
+PROTECTED_MEDIA_INTERNAL_URL = env('PROTECTED_MEDIA_INTERNAL_URL', '/protected-media/') or '/protected-media/'
+
+# Резервные копии (manage.py backup_db): сжатие копии SQLite (gzip | xz | none),
+# число процессов pg_dump -j и сколько последних копий хранить (0 — все)
+BACKUP_COMPRESSION = env('BACKUP_COMPRESSION', 'gzip') or 'gzip'
+BACKUP_PG_JOBS = int(env('BACKUP_PG_JOBS', '4') or 4)
+BACKUP_KEEP = int(env('BACKUP_KEEP', '14') or 14)
+# backup_media: потоков для хеширования и копирования новых файлов MEDIA_ROOT
+BACKUP_MEDIA_WORKERS = int(env('BACKUP_MEDIA_WORKERS', '4') or 4)
+
+# Фоновые выгрузки (ExportJob): сколько часов хранится готовый файл.
+EXPORT_JOB_TTL_HOURS = int(env('EXPORT_JOB_TTL_HOURS', '24') or 24)
+# Выгрузка в работе дольше стольких секунд считается брошенной упавшим worker'ом
+# и помечается ошибкой (run_export_jobs, при старте и на каждом опросе)
+EXPORT_JOB_STALE_AFTER = int(env('EXPORT_JOB_STALE_AFTER', '3600') or 3600)
+
+# Пагинация: до этого числа строк считаем точно, выше — оценка/кэш (см. defects.pagination)
+PAGINATOR_EXACT_COUNT_THRESHOLD = int(env('PAGINATOR_EXACT_COUNT_THRESHOLD', '1000') or 1000)
+PAGINATOR_COUNT_CACHE_TTL = int(env('PAGINATOR_COUNT_CACHE_TTL', '300') or 300)
+
+# Карточка дефекта: сколько последних комментариев и событий истории выводится
+# сразу; более ранние подгружаются порциями того же размера
+DEFECT_FEED_PAGE_SIZE = int(env('DEFECT_FEED_PAGE_SIZE', '20') or 20)
+
+# Архивация истории (manage.py archive_defect_history): события закрытых и
+# отменённых дефектов старше стольких дней переносятся в DefectHistoryArchive
+HISTORY_ARCHIVE_AFTER_DAYS = int(env('HISTORY_ARCHIVE_AFTER_DAYS', '365') or 365)
+
+# Кэш. CACHE_BACKEND: file (по умолчанию), redis (нужен пакет redis; подойдёт и
+# совместимый сервер, например Valkey) или locmem (только один процесс).
+# Для gunicorn с несколькими воркерами нужен общий кэш (file/redis), иначе
+# инвалидация по версии не дойдёт до соседних процессов; с locmem кэш
+# фрагментов и ETag страниц отключаются (см. defects.cache.is_shared_cache).
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+CACHE_BACKEND = env('CACHE_BACKEND', 'file') or 'file'
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': env(
+            'CACHE_LOCATION',
+            {'locmem': 'sistemakontrol', 'file': os.path.join(tempfile.gettempdir(), 'sistemakontrol-cache'), 'redis': 'redis://localhost:6379/0'}[CACHE_BACKEND],
+        ),
+        'KEY_PREFIX': env('CACHE_KEY_PREFIX', 'sk') or '',
+    }
+}
+
+# Кэш read-only агрегатов (аналитика): алиас из CACHES и TTL, сек (см. defects.cache)
+AGGREGATE_CACHE_ALIAS = 'default'
+AGGREGATE_CACHE_TTL = int(env('AGGREGATE_CACHE_TTL', '300') or 300)
+
+# Кэш фрагментов шаблонов (строки таблиц дефектов, форма фильтров), сек
+FRAGMENT_CACHE_TTL = int(env('FRAGMENT_CACHE_TTL', '600') or 600)
+
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 AUTH_USER_MODEL = 'users.User'
@@ -1,10 +1,25 @@
 import datetime as dt
 
 import pytest
+from django.core.cache import cache
 
 from defects.models import Defect, Project
 
 
+@pytest.fixture(autouse=True)
+def clear_cache(settings, tmp_path_factory):
+    # Файловый кэш, как по умолчанию, но свой каталог на каждый тест: БД откатывается после теста
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(tmp_path_factory.mktemp('cache')),
+        },
+    }
+    cache.clear()
+    yield
+    cache.clear()
+
+
 @pytest.fixture
 def manager(django_user_model):
     u = django_user_model.objects.create_user(username='manager', password='pass', role='manager')
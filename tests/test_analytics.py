@@ -0,0 +1,111 @@
+import datetime as dt
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+
+from defects.analytics import compute_breakdowns
+from defects.models import Defect, Project
+from users.models import User
+
+
+TODAY = dt.date(2025, 3, 12)  # среда
+
+
+def make_defect(project, executor, status, priority, deadline, created, updated=None):
+    d = Defect.objects.create(
+        project=project,
+        title='Дефект',
+        description='...',
+        priority=priority,
+        status=status,
+        deadline=deadline,
+        executor=executor,
+    )
+    as_dt = lambda day: timezone.make_aware(dt.datetime.combine(day, dt.time(12)))
+    Defect.objects.filter(pk=d.pk).update(created_at=as_dt(created), updated_at=as_dt(updated or created))
+    return d
+
+
+@pytest.fixture
+def dataset(project, engineer):
+    other_project = Project.objects.create(name='ЖК Южный', address='Казань', start_date=dt.date(2025, 1, 1))
+    S, P = Defect.Status, Defect.Priority
+    # открыт и просрочен
+    make_defect(project, engineer, S.NEW, P.HIGH, dt.date(2025, 3, 1), dt.date(2025, 2, 20))
+    # открыт, в срок
+    make_defect(project, engineer, S.IN_PROGRESS, P.LOW, dt.date(2025, 4, 1), dt.date(2025, 3, 10))
+    # закрыт в срок на этой неделе
+    make_defect(other_project, engineer, S.CLOSED, P.HIGH, dt.date(2025, 3, 20), dt.date(2025, 3, 3), dt.date(2025, 3, 11))
+    # закрыт с опозданием, без исполнителя
+    make_defect(other_project, None, S.CLOSED, P.MEDIUM, dt.date(2025, 3, 1), dt.date(2025, 2, 24), dt.date(2025, 3, 5))
+    # отменён: в сроки и исполнителей не попадает
+    make_defect(other_project, None, S.CANCELLED, P.MEDIUM, dt.date(2025, 3, 1), dt.date(2025, 1, 1))
+    return other_project
+
+
+@pytest.mark.django_db
+def test_compute_breakdowns(dataset, project):
+    b = compute_breakdowns(today=TODAY, weeks=3)
+
+    assert b.total == 5
+    assert b.by_project.labels == ['ЖК Южный', project.name]
+    assert b.by_project.series['Закрыта'] == [2, 0]
+    assert b.by_project.series['Новая'] == [0, 1]
+
+    assert b.by_executor.labels == ['engineer', 'Не назначен']
+    assert b.by_executor.series == {'Открыты, в срок': [1, 0], 'Просрочены': [1, 0], 'Закрыты': [1, 1]}
+
+    assert b.by_priority.labels == ['Low', 'Medium', 'High']
+    assert b.by_priority.series['Закрыта'] == [0, 1, 1]
+
+    assert b.deadlines.series['Количество'] == [1, 1, 1, 1]
+
+    assert b.weekly.labels == ['2025-02-24', '2025-03-03', '2025-03-10']
+    assert b.weekly.series == {'Создано': [1, 1, 1], 'Закрыто': [0, 1, 1]}
+
+
+@pytest.mark.django_db
+def test_compute_breakdowns_empty():
+    b = compute_breakdowns(today=TODAY)
+    assert b.total == 0
+    assert b.by_project.labels == []
+    assert b.deadlines.series['Количество'] == [0, 0, 0, 0]
+    assert sum(b.weekly.series['Создано']) == 0
+
+
+@pytest.mark.django_db
+def test_compute_breakdowns_folds_tail_rows(project, engineer):
+    for i in range(4):
+        executor = User.objects.create_user(username=f'eng{i}', password='pass', role=User.Role.ENGINEER)
+        for _ in range(i + 1):
+            make_defect(project, executor, Defect.Status.NEW, Defect.Priority.LOW, dt.date(2025, 4, 1), TODAY)
+
+    b = compute_breakdowns(today=TODAY, top=2)
+    assert b.by_executor.labels == ['eng3', 'eng2', 'Прочие']
+    assert b.by_executor.series['Открыты, в срок'] == [4, 3, 3]
+
+
+@pytest.mark.django_db
+def test_analytics_data_endpoint(client, manager, engineer, dataset):
+    client.force_login(engineer)
+    assert client.get(reverse('analytics_data')).status_code == 403
+
+    client.force_login(manager)
+    data = client.get(reverse('analytics_data')).json()
+    assert data['total'] == 5
+    assert set(data) == {'total', 'by_project', 'by_executor', 'by_priority', 'deadlines', 'weekly'}
+
+
+
+@pytest.mark.django_db
+def test_analytics_page_does_not_compute_breakdowns(client, manager, dataset, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('compute_breakdowns on the page request')
+
+    monkeypatch.setattr('defects.views.compute_breakdowns', fail)
+    client.force_login(manager)
+    page = client.get(reverse('analytics'))
+    assert page.status_code == 200
+    assert 'breakdowns' not in page.context
+    assert reverse('analytics_data').encode() in page.content
@@ -0,0 +1,131 @@
+import hashlib
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopFutureHandlers
+from django.core.management import call_command
+from django.db import transaction
+from django.urls import reverse
+
+from defects.blobs import (
+    HashingMemoryFileUploadHandler,
+    HashingTemporaryFileUploadHandler,
+    blob_path,
+    dedupe_attachments,
+    store_attachment,
+)
+from defects.models import Attachment, AttachmentBlob, Defect
+
+PHOTO = b'\x89PNG fake photo bytes' * 100
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+
+@pytest.fixture
+def other_defect(project):
+    return Defect.objects.create(project=project, title='Скол плитки', priority=Defect.Priority.LOW, deadline='2025-06-01')
+
+
+@pytest.mark.parametrize('handler_class', [HashingMemoryFileUploadHandler, HashingTemporaryFileUploadHandler])
+def test_upload_handlers_hash_chunks_as_they_arrive(handler_class):
+    handler = handler_class()
+    handler.handle_raw_input(None, {}, len(PHOTO), b'boundary')
+    try:
+        handler.new_file('file', 'photo.png', 'image/png', len(PHOTO))
+    except StopFutureHandlers:
+        # Файл целиком в памяти: следующие handler'ы его не получают
+        pass
+    for start in range(0, len(PHOTO), 512):
+        assert handler.receive_data_chunk(PHOTO[start:start + 512], start) is None
+    uploaded = handler.file_complete(len(PHOTO))
+    assert uploaded.sha256 == hashlib.sha256(PHOTO).hexdigest()
+
+
+@pytest.mark.django_db
+def test_same_file_on_two_defects_is_stored_once(client, manager, defect, other_defect, media_root):
+    client.force_login(manager)
+    for target in (defect, other_defect):
+        upload = SimpleUploadedFile('Фото 1.PNG', PHOTO, content_type='image/png')
+        resp = client.post(reverse('defect_add_attachment', kwargs={'pk': target.pk}), {'file': upload})
+        assert resp.status_code == 302
+
+    digest = hashlib.sha256(PHOTO).hexdigest()
+    blob = AttachmentBlob.objects.get()
+    assert (blob.sha256, blob.refcount, blob.size) == (digest, 2, len(PHOTO))
+    assert blob.file.name == blob_path(digest, 'photo.png') == f'blobs/{digest[:2]}/{digest[2:4]}/{digest}.png'
+    assert [a.display_name for a in Attachment.objects.all()] == ['Фото 1.PNG', 'Фото 1.PNG']
+    assert [p.name for p in media_root.rglob('*') if p.is_file()] == [f'{digest}.png']
+
+
+@pytest.mark.django_db
+def test_last_reference_deletes_blob_and_file(django_capture_on_commit_callbacks, defect, other_defect, media_root):
+    first = store_attachment(defect, ContentFile(PHOTO, name='a.png'))
+    store_attachment(other_defect, ContentFile(PHOTO, name='b.png'))
+    path = media_root / first.file.name
+
+    first.delete()
+    assert AttachmentBlob.objects.get().refcount == 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        other_defect.delete()
+    assert not AttachmentBlob.objects.exists()
+    assert not path.exists()
+
+
+@pytest.mark.django_db
+def test_legacy_mode_keeps_per_defect_paths(settings, defect):
+    settings.ATTACHMENT_CONTENT_ADDRESSED = False
+    attachment = store_attachment(defect, ContentFile(PHOTO, name='a.png'))
+    assert attachment.blob is None
+    assert attachment.file.name == f'attachments/defect_{defect.pk}/a.png'
+
+
+@pytest.mark.django_db
+def test_dedupe_command_moves_legacy_files_in_place(django_capture_on_commit_callbacks, settings, defect, other_defect, media_root):
+    settings.ATTACHMENT_CONTENT_ADDRESSED = False
+    legacy = [
+        store_attachment(defect, ContentFile(PHOTO, name='a.png')),
+        store_attachment(other_defect, ContentFile(PHOTO, name='b.png')),
+        store_attachment(other_defect, ContentFile(b'other', name='c.pdf')),
+    ]
+
+    call_command('dedupe_attachments', '--dry-run')
+    assert not AttachmentBlob.objects.exists()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command('dedupe_attachments')
+
+    assert {(b.sha256, b.refcount) for b in AttachmentBlob.objects.all()} == {
+        (hashlib.sha256(PHOTO).hexdigest(), 2),
+        (hashlib.sha256(b'other').hexdigest(), 1),
+    }
+    for attachment in legacy:
+        attachment.refresh_from_db()
+        assert attachment.file.name == attachment.blob.file.name
+        assert attachment.file.read()
+    assert [a.display_name for a in legacy] == ['a.png', 'b.png', 'c.pdf']
+    assert sorted(p.suffix for p in media_root.rglob('*') if p.is_file()) == ['.pdf', '.png']
+    assert not (media_root / 'attachments').joinpath(f'defect_{defect.pk}', 'a.png').exists()
+
+
+@pytest.mark.django_db
+def test_dedupe_rollback_keeps_legacy_files(settings, defect, media_root):
+    settings.ATTACHMENT_CONTENT_ADDRESSED = False
+    attachment = store_attachment(defect, ContentFile(PHOTO, name='a.png'))
+    legacy_path = media_root / attachment.file.name
+
+    with pytest.raises(RuntimeError), transaction.atomic():
+        dedupe_attachments()
+        # Файл уже доступен по пути blob, но старый путь до коммита не трогается
+        assert legacy_path.exists()
+        assert (media_root / AttachmentBlob.objects.get().file.name).read_bytes() == PHOTO
+        raise RuntimeError('rollback')
+
+    attachment.refresh_from_db()
+    assert attachment.blob is None
+    assert attachment.file.read() == PHOTO
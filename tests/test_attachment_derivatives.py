@@ -0,0 +1,166 @@
+import datetime as dt
+import io
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from defects.blobs import store_attachment
+from defects.derivatives import claim_derivative_jobs, derivative_path, process_derivatives, requeue_derivative_jobs
+from defects.imaging import render_derivatives
+from defects.models import Attachment, AttachmentBlob, Defect
+
+
+def photo(size=(2000, 1000), orientation=None, fmt='JPEG', mode='RGB'):
+    image = Image.new(mode, size, (200, 30, 30))
+    exif = Image.Exif()
+    exif[0x010F] = 'PhoneMaker'  # Make
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, exif=exif)
+    return buffer.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    settings.ATTACHMENT_THUMBNAIL_SIZE = 64
+    settings.ATTACHMENT_PREVIEW_SIZE = 256
+    return tmp_path
+
+
+def test_render_strips_exif_and_applies_orientation():
+    # Ориентация 6: снято «на боку», показывать повёрнутым на 90°
+    rendered = render_derivatives(photo(orientation=6), {'thumb': 64, 'preview': 256})
+
+    preview = Image.open(io.BytesIO(rendered['preview']))
+    assert preview.format == 'JPEG'
+    assert preview.size == (128, 256)
+    assert not preview.getexif()
+    assert Image.open(io.BytesIO(rendered['thumb'])).size == (32, 64)
+
+
+def test_render_flattens_transparency_and_does_not_upscale():
+    rendered = render_derivatives(photo(size=(40, 20), fmt='PNG', mode='RGBA'), {'thumb': 64})
+    thumb = Image.open(io.BytesIO(rendered['thumb']))
+    assert (thumb.mode, thumb.size) == ('RGB', (40, 20))
+
+
+@pytest.mark.django_db
+def test_upload_queues_images_only(defect):
+    image = store_attachment(defect, ContentFile(photo(), name='IMG_0001.JPG'))
+    document = store_attachment(defect, ContentFile(b'%PDF-1.4', name='act.pdf'))
+    assert image.blob.derivatives_status == AttachmentBlob.Derivatives.PENDING
+    assert document.blob.derivatives_status == AttachmentBlob.Derivatives.NONE
+
+
+@pytest.mark.django_db
+def test_worker_builds_derivatives_in_process_pool(defect, media_root):
+    attachment = store_attachment(defect, ContentFile(photo(), name='IMG_0001.JPG'))
+    broken = store_attachment(defect, ContentFile(b'not a jpeg', name='broken.jpg'))
+
+    call_command('run_derivative_jobs', '--once', '--workers', '2')
+
+    blob = attachment.blob
+    blob.refresh_from_db()
+    assert blob.derivatives_status == AttachmentBlob.Derivatives.DONE
+    assert blob.thumbnail.name == derivative_path(blob.sha256, 'thumb')
+    assert (media_root / blob.preview.name).stat().st_size < blob.size
+
+    broken.blob.refresh_from_db()
+    assert broken.blob.derivatives_status == AttachmentBlob.Derivatives.FAILED
+    assert broken.blob.derivatives_error
+
+
+@pytest.mark.django_db
+def test_jobs_are_claimed_once(defect):
+    store_attachment(defect, ContentFile(photo(), name='a.jpg'))
+    assert len(claim_derivative_jobs()) == 1
+    assert claim_derivative_jobs() == []
+
+
+@pytest.mark.django_db
+def test_requeue_returns_only_stale_jobs(defect):
+    store_attachment(defect, ContentFile(photo(), name='a.jpg'))
+    store_attachment(defect, ContentFile(photo(size=(80, 40)), name='b.jpg'))
+    fresh, stale = claim_derivative_jobs()
+    AttachmentBlob.objects.filter(pk=stale.pk).update(derivatives_claimed_at=timezone.now() - dt.timedelta(hours=1))
+
+    # Старт ещё одного worker'а не отнимает blob, который обрабатывает соседний
+    assert requeue_derivative_jobs(stale_after=600) == 1
+    statuses = dict(AttachmentBlob.objects.values_list('pk', 'derivatives_status'))
+    assert statuses == {fresh.pk: AttachmentBlob.Derivatives.RUNNING, stale.pk: AttachmentBlob.Derivatives.PENDING}
+
+
+@pytest.mark.django_db
+def test_blob_deleted_during_processing_is_skipped(django_capture_on_commit_callbacks, defect, media_root):
+    attachment = store_attachment(defect, ContentFile(photo(), name='a.jpg'))
+    blobs = claim_derivative_jobs()
+    with django_capture_on_commit_callbacks(execute=True):
+        attachment.delete()
+
+    assert process_derivatives(blobs) == 0
+    assert not AttachmentBlob.objects.exists()
+    assert not list(media_root.glob('derivatives/**/*.jpg'))
+
+
+@pytest.mark.django_db
+def test_blob_deleted_while_files_are_written_cleans_them_up(defect, media_root, monkeypatch):
+    attachment = store_attachment(defect, ContentFile(photo(), name='a.jpg'))
+    blobs = claim_derivative_jobs()
+
+    def delete_attachment_meanwhile(data):
+        # Последнюю ссылку снимают уже после проверки строки, пока пишутся файлы
+        if Attachment.objects.filter(pk=attachment.pk).exists():
+            attachment.delete()
+        return ContentFile(data)
+
+    monkeypatch.setattr('defects.derivatives.ContentFile', delete_attachment_meanwhile)
+    assert process_derivatives(blobs) == 0
+    assert not AttachmentBlob.objects.exists()
+    assert not list(media_root.glob('derivatives/**/*.jpg'))
+
+
+@pytest.mark.django_db
+def test_detail_page_serves_cached_lazy_thumbnails(client, manager, defect, project, django_user_model):
+    attachment = store_attachment(defect, ContentFile(photo(), name='IMG_0001.JPG'))
+    detail = reverse('defect_detail', kwargs={'pk': defect.pk})
+    thumb_url = reverse('attachment_derivative', kwargs={'pk': attachment.pk, 'kind': 'thumb'})
+    client.force_login(manager)
+
+    # Пока копий нет, страница их не показывает, а URL отвечает 404
+    assert thumb_url not in client.get(detail).content.decode()
+    assert client.get(thumb_url).status_code == 404
+
+    process_derivatives(claim_derivative_jobs())
+    html = client.get(detail).content.decode()
+    assert f'src="{thumb_url}"' in html
+    assert 'loading="lazy"' in html
+
+    resp = client.get(thumb_url)
+    assert resp.status_code == 200
+    assert resp['Content-Type'] == 'image/jpeg'
+    assert 'immutable' in resp['Cache-Control'] and 'private' in resp['Cache-Control']
+    assert Image.open(io.BytesIO(b''.join(resp.streaming_content))).size == (64, 32)
+    assert client.get(reverse('attachment_derivative', kwargs={'pk': attachment.pk, 'kind': 'orig'})).status_code == 404
+
+    # Чужой инженер дефекта не видит — и копий тоже
+    client.force_login(django_user_model.objects.create_user(username='other', password='pass', role='engineer'))
+    assert client.get(thumb_url).status_code == 404
+
+
+@pytest.mark.django_db
+def test_last_reference_removes_derivative_files(django_capture_on_commit_callbacks, defect, media_root):
+    attachment = store_attachment(defect, ContentFile(photo(), name='a.jpg'))
+    process_derivatives(claim_derivative_jobs())
+    blob = AttachmentBlob.objects.get()
+    files = [media_root / blob.thumbnail.name, media_root / blob.preview.name]
+    assert all(path.exists() for path in files)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Defect.objects.get(pk=attachment.defect_id).delete()
+    assert not any(path.exists() for path in files)
@@ -0,0 +1,101 @@
+import gzip
+import lzma
+import sqlite3
+import threading
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+
+from defects.backups import backup_sqlite, list_backups, read_backup_manifest, rotate_backups
+
+pytestmark = pytest.mark.skipif(connection.vendor != 'sqlite', reason='онлайн-копия SQLite')
+
+
+def restore(path, tmp_path):
+    opener = {'.gz': gzip.open, '.xz': lzma.open}.get(path.suffix, open)
+    plain = tmp_path / 'restored.sqlite3'
+    with opener(path, 'rb') as src:
+        plain.write_bytes(src.read())
+    return sqlite3.connect(plain)
+
+
+# transaction=True: копия читает базу отдельным соединением и видит только закоммиченное
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('compression', ['gzip', 'xz', 'none'])
+def test_backup_db_makes_consistent_compressed_copy(compression, defect, tmp_path, capsys):
+    out_dir = tmp_path / 'backups'
+    call_command('backup_db', '--out-dir', str(out_dir), '--compress', compression, '--pages', '2')
+
+    [backup] = list_backups(out_dir, 'db_')
+    assert read_backup_manifest(backup)['rows']['defects.Defect'] == 1
+    assert backup.name.startswith('db_') and backup.name.endswith({'gzip': '.gz', 'xz': '.xz', 'none': '.sqlite3'}[compression])
+    copy = restore(backup, tmp_path)
+    assert copy.execute('PRAGMA integrity_check').fetchone() == ('ok',)
+    assert copy.execute('SELECT title FROM defects_defect').fetchall() == [(defect.title,)]
+
+    out = capsys.readouterr().out
+    assert 'Backup created' in out and 'MB/s' in out
+
+
+def test_online_backup_does_not_block_writers(tmp_path):
+    class FileConnection:
+        # Те же методы, что backup_sqlite вызывает у соединения Django
+        def __init__(self, path):
+            self.path = path
+
+        def get_connection_params(self):
+            return {'database': self.path}
+
+        def get_new_connection(self, params):
+            return sqlite3.connect(**params)
+
+    source = tmp_path / 'live.sqlite3'
+    db = sqlite3.connect(source)
+    db.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, payload TEXT)')
+    db.executemany('INSERT INTO t (payload) VALUES (?)', [('x' * 500,)] * 5000)
+    db.commit()
+
+    writes = []
+    stop = threading.Event()
+
+    def writer():
+        conn = sqlite3.connect(source, timeout=5)
+        while not stop.is_set():
+            conn.execute("INSERT INTO t (payload) VALUES ('w')")
+            conn.commit()
+            writes.append(1)
+        conn.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        result = backup_sqlite(FileConnection(source), tmp_path, compression='none', pages=16, name='copy.sqlite3')
+    finally:
+        stop.set()
+        thread.join()
+
+    assert writes
+    copy = sqlite3.connect(result.path)
+    assert copy.execute('PRAGMA integrity_check').fetchone() == ('ok',)
+    assert copy.execute('SELECT count(*) FROM t').fetchone()[0] >= 5000
+
+
+def test_rotation_keeps_latest(tmp_path):
+    names = [f'db_2026010{i}_000000.sqlite3.gz' for i in range(1, 6)]
+    for name in names:
+        (tmp_path / name).write_bytes(b'')
+        (tmp_path / f'{name}.manifest.json').write_text('{}')
+    (tmp_path / 'pg_20260101_000000.dir').mkdir()
+
+    removed = rotate_backups(tmp_path, 'db_', keep=2)
+
+    assert [path.name for path in removed] == names[:3]
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        names[3],
+        f'{names[3]}.manifest.json',
+        names[4],
+        f'{names[4]}.manifest.json',
+        'pg_20260101_000000.dir',
+    ]
+    assert rotate_backups(tmp_path, 'db_', keep=0) == []
@@ -0,0 +1,87 @@
+import os
+
+import pytest
+from django.core.management import call_command
+
+from defects.backups import list_backups
+from defects.media_backup import backup_media, list_manifests, object_path, prune_media_backups, read_manifest
+
+
+@pytest.fixture
+def media(tmp_path):
+    root = tmp_path / 'media'
+    (root / 'blobs' / 'ab' / 'cd').mkdir(parents=True)
+    (root / 'blobs' / 'ab' / 'cd' / 'photo.jpg').write_bytes(b'photo' * 1000)
+    (root / 'attachments' / 'defect_1').mkdir(parents=True)
+    (root / 'attachments' / 'defect_1' / 'act.pdf').write_bytes(b'pdf')
+    (root / 'derivatives').mkdir()
+    (root / 'derivatives' / 'thumb.jpg').write_bytes(b'thumb')
+    return root
+
+
+def test_backup_media_copies_only_new_content(media, tmp_path):
+    out_dir = tmp_path / 'backup'
+
+    first = backup_media(media, out_dir, stamp='20260101_000000', workers=2)
+    assert (first.files, first.hashed, first.copied) == (2, 2, 2)
+    files = read_manifest(first.manifest)
+    assert set(files) == {'blobs/ab/cd/photo.jpg', 'attachments/defect_1/act.pdf'}
+    entry = files['attachments/defect_1/act.pdf']
+    assert object_path(out_dir / 'objects', entry.sha256).read_bytes() == b'pdf'
+
+    # Неизменное дерево: файлы не читаются и не копируются
+    second = backup_media(media, out_dir, stamp='20260102_000000')
+    assert (second.files, second.hashed, second.copied) == (2, 0, 0)
+
+    # Изменённый файл хешируется заново, копия того же содержимого под другим именем не копируется
+    (media / 'attachments' / 'defect_1' / 'act.pdf').write_bytes(b'pdf v2')
+    (media / 'attachments' / 'defect_1' / 'photo-copy.jpg').write_bytes(b'photo' * 1000)
+    third = backup_media(media, out_dir, stamp='20260103_000000')
+    assert (third.files, third.hashed, third.copied) == (3, 2, 1)
+    assert read_manifest(third.manifest)['attachments/defect_1/act.pdf'].sha256 != entry.sha256
+
+    # Старые снимки остаются восстановимыми
+    assert read_manifest(first.manifest) == files
+    assert [path.name for path in list_manifests(out_dir)] == [
+        'media_20260101_000000.json.gz',
+        'media_20260102_000000.json.gz',
+        'media_20260103_000000.json.gz',
+    ]
+
+
+def test_backup_media_recopies_missing_object(media, tmp_path):
+    out_dir = tmp_path / 'backup'
+    result = backup_media(media, out_dir, stamp='20260101_000000')
+    entry = read_manifest(result.manifest)['attachments/defect_1/act.pdf']
+    os.remove(object_path(out_dir / 'objects', entry.sha256))
+
+    again = backup_media(media, out_dir, stamp='20260102_000000')
+    assert (again.hashed, again.copied) == (1, 1)
+    assert object_path(out_dir / 'objects', entry.sha256).exists()
+
+
+def test_prune_media_backups_drops_unreferenced_objects(media, tmp_path):
+    out_dir = tmp_path / 'backup'
+    backup_media(media, out_dir, stamp='20260101_000000')
+    old = read_manifest(list_manifests(out_dir)[0])['attachments/defect_1/act.pdf'].sha256
+    (media / 'attachments' / 'defect_1' / 'act.pdf').write_bytes(b'pdf v2')
+    backup_media(media, out_dir, stamp='20260102_000000')
+
+    removed, objects = prune_media_backups(out_dir, keep=1)
+    assert [path.name for path in removed] == ['media_20260101_000000.json.gz']
+    assert objects == 1
+    assert not object_path(out_dir / 'objects', old).exists()
+    assert len(read_manifest(list_manifests(out_dir)[0])) == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_backup_db_with_media_shares_timestamp(media, tmp_path, settings, capsys):
+    settings.MEDIA_ROOT = media
+    out_dir = tmp_path / 'backups'
+    call_command('backup_db', '--out-dir', str(out_dir), '--compress', 'none', '--with-media')
+
+    [db_backup] = list_backups(out_dir, 'db_')
+    [manifest] = list_manifests(out_dir / 'media')
+    stamp = manifest.name.removeprefix('media_').removesuffix('.json.gz')
+    assert stamp in db_backup.name
+    assert 'Media snapshot created' in capsys.readouterr().out
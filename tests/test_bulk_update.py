@@ -0,0 +1,122 @@
+import datetime as dt
+
+import pytest
+from django.contrib.messages import get_messages
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from defects.cache import get_version
+from defects.models import Defect, DefectHistory
+from defects.services import bulk_update_defects, diff_rollup
+
+
+def make_defects(project, executor, statuses):
+    return [
+        Defect.objects.create(
+            project=project,
+            title=f'Дефект {i}',
+            description='...',
+            priority=Defect.Priority.MEDIUM,
+            status=status,
+            deadline=dt.date(2025, 6, 1),
+            executor=executor,
+        )
+        for i, status in enumerate(statuses)
+    ]
+
+
+def post_json(client, data):
+    return client.post(reverse('defect_bulk_update'), data=data, HTTP_ACCEPT='application/json')
+
+
+@pytest.mark.django_db
+def test_bulk_status_change_skips_invalid_items(client, manager, engineer, project):
+    new, closed = make_defects(project, engineer, [Defect.Status.NEW, Defect.Status.CLOSED])
+    client.force_login(manager)
+    version = get_version()
+
+    resp = post_json(client, {'ids': [new.pk, closed.pk, 999999], 'status': Defect.Status.IN_PROGRESS})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data['updated'] == [new.pk]
+    assert set(data['errors']) == {str(closed.pk), '999999'}
+
+    new.refresh_from_db()
+    closed.refresh_from_db()
+    assert new.status == Defect.Status.IN_PROGRESS
+    assert closed.status == Defect.Status.CLOSED
+
+    entry = DefectHistory.objects.get(defect=new)
+    assert entry.action == DefectHistory.Action.STATUS_CHANGED
+    assert entry.changes == {'status': {'from': 'Новая', 'to': 'В работе'}}
+    assert entry.changed_by == manager
+    assert not DefectHistory.objects.filter(defect=closed).exists()
+
+    assert diff_rollup() == {}
+    assert get_version() != version
+
+
+@pytest.mark.django_db
+def test_bulk_reassignment_logs_executor_change(manager, engineer, project, django_user_model):
+    other = django_user_model.objects.create_user(username='eng2', password='pass', role='engineer')
+    defects = make_defects(project, engineer, [Defect.Status.NEW, Defect.Status.ON_REVIEW])
+    before = {d.pk: d.updated_at for d in defects}
+
+    result = bulk_update_defects(user=manager, defect_ids=[d.pk for d in defects], executor=other)
+    assert result.updated == [d.pk for d in defects] and not result.errors
+
+    for d in Defect.objects.filter(pk__in=before):
+        assert d.executor == other
+        assert d.updated_at > before[d.pk]
+    actions = set(DefectHistory.objects.values_list('action', flat=True))
+    assert actions == {DefectHistory.Action.UPDATED}
+
+    # Повтор ничего не меняет — это ошибка по каждому дефекту, а не пустая запись в истории
+    repeat = bulk_update_defects(user=manager, defect_ids=[d.pk for d in defects], executor=other)
+    assert not repeat.updated and len(repeat.errors) == 2
+    assert DefectHistory.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_bulk_update_query_count_does_not_grow_with_selection(manager, engineer, project):
+    warmup, *small = make_defects(project, engineer, [Defect.Status.NEW] * 4)
+    large = make_defects(project, engineer, [Defect.Status.NEW] * 30)
+    # Первый вызов ещё создаёт ячейку сводки «В работе»
+    bulk_update_defects(user=manager, defect_ids=[warmup.pk], status=Defect.Status.IN_PROGRESS)
+
+    with CaptureQueriesContext(connection) as few:
+        bulk_update_defects(user=manager, defect_ids=[d.pk for d in small], status=Defect.Status.IN_PROGRESS)
+    with CaptureQueriesContext(connection) as many:
+        bulk_update_defects(user=manager, defect_ids=[d.pk for d in large], status=Defect.Status.IN_PROGRESS)
+    assert len(many.captured_queries) == len(few.captured_queries)
+    assert DefectHistory.objects.count() == 34
+
+
+@pytest.mark.django_db
+def test_bulk_update_is_manager_only(client, engineer, defect):
+    client.force_login(engineer)
+    resp = post_json(client, {'ids': [defect.pk], 'status': Defect.Status.IN_PROGRESS})
+    assert resp.status_code == 403
+    defect.refresh_from_db()
+    assert defect.status == Defect.Status.NEW
+
+
+@pytest.mark.django_db
+def test_bulk_form_from_dashboard_reports_messages(client, manager, engineer, project):
+    new, closed = make_defects(project, engineer, [Defect.Status.NEW, Defect.Status.CLOSED])
+    client.force_login(manager)
+    assert 'bulk-form' in client.get(reverse('dashboard')).content.decode()
+
+    resp = client.post(
+        reverse('defect_bulk_update'),
+        data={'ids': [new.pk, closed.pk], 'status': Defect.Status.CANCELLED, 'next': '/?status=new'},
+    )
+    assert resp.status_code == 302
+    assert resp['Location'] == '/?status=new'
+    texts = [str(m) for m in get_messages(resp.wsgi_request)]
+    assert texts[0] == 'Изменено дефектов: 1.'
+    assert texts[1].startswith(f'Дефект #{closed.pk}:')
+
+    resp = post_json(client, {'ids': [new.pk]})
+    assert resp.status_code == 400
@@ -0,0 +1,91 @@
+import datetime as dt
+
+import pytest
+from django.core.cache import caches
+from django.core.management import call_command
+from django.urls import reverse
+
+from defects.cache import (
+    ANALYTICS_BREAKDOWNS,
+    ANALYTICS_STATUS,
+    aggregate_cache_key,
+    bump_version,
+    cache_stats,
+    cached_aggregate,
+    get_version,
+)
+from defects.models import Defect
+from defects.services import log_defect_event
+
+
+@pytest.mark.django_db
+def test_analytics_is_cached_until_defects_change(client, customer, defect, engineer):
+    client.force_login(customer)
+    first = client.get(reverse('analytics_data')).json()
+    second = client.get(reverse('analytics_data')).json()
+    assert first == second
+    assert cache_stats()[ANALYTICS_BREAKDOWNS] == {'hit': 1, 'miss': 1, 'hit_ratio': 0.5}
+    client.get(reverse('analytics'))
+
+    Defect.objects.create(
+        project=defect.project,
+        title='Скол плитки',
+        description='...',
+        priority=Defect.Priority.LOW,
+        status=Defect.Status.NEW,
+        deadline=dt.date(2025, 6, 1),
+        executor=engineer,
+    )
+    assert client.get(reverse('analytics_data')).json()['total'] == 2
+    third = client.get(reverse('analytics'))
+    assert dict(third.context['rows'])['Новая'] == 2
+    assert cache_stats()[ANALYTICS_STATUS]['miss'] == 2
+
+
+@pytest.mark.django_db
+def test_keys_depend_on_role_and_scope(manager, customer, engineer, django_user_model):
+    other = django_user_model.objects.create_user(username='eng2', password='pass', role='engineer')
+    keys = {aggregate_cache_key('x', user) for user in (manager, customer, engineer, other)}
+    assert len(keys) == 4
+    assert aggregate_cache_key('x', manager, {'a': 1}) != aggregate_cache_key('x', manager, {'a': 2})
+
+
+@pytest.mark.django_db
+def test_log_defect_event_bumps_version(defect, manager):
+    before = get_version()
+    log_defect_event(defect=defect, user=manager, action='comment_added')
+    assert get_version() > before
+
+
+@pytest.mark.django_db
+def test_cached_aggregate_with_file_backend(settings, tmp_path, manager):
+    settings.CACHES = {
+        **settings.CACHES,
+        'aggregates': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': str(tmp_path)},
+    }
+    settings.AGGREGATE_CACHE_ALIAS = 'aggregates'
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'total': len(calls)}
+
+    assert cached_aggregate('demo', manager, compute) == {'total': 1}
+    assert cached_aggregate('demo', manager, compute) == {'total': 1}
+    bump_version()
+    assert cached_aggregate('demo', manager, compute) == {'total': 2}
+    assert cache_stats(['demo'])['demo'] == {'hit': 1, 'miss': 2, 'hit_ratio': 0.333}
+    caches['aggregates'].clear()
+
+
+@pytest.mark.django_db
+def test_aggregate_cache_stats_command(client, customer, capsys):
+    client.force_login(customer)
+    client.get(reverse('analytics_data'))
+    client.get(reverse('analytics_data'))
+
+    call_command('aggregate_cache_stats', '--reset')
+    out = capsys.readouterr().out
+    assert 'analytics-breakdowns' in out
+    assert '50.0%' in out
+    assert cache_stats()[ANALYTICS_BREAKDOWNS]['hit'] == 0
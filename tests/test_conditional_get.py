@@ -0,0 +1,100 @@
+import pytest
+from django.urls import reverse
+
+from defects.models import Comment
+
+
+def get(client, url, etag=None):
+    headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+    return client.get(url, **headers)
+
+
+@pytest.mark.django_db
+def test_defect_detail_answers_304_until_something_changes(client, manager, defect):
+    client.force_login(manager)
+    url = reverse('defect_detail', kwargs={'pk': defect.pk})
+
+    first = get(client, url)
+    assert first.status_code == 200
+    assert first['Last-Modified']
+    assert 'private' in first['Cache-Control']
+
+    second = get(client, url, first['ETag'])
+    assert second.status_code == 304
+    assert not second.templates
+    assert second['ETag'] == first['ETag']
+
+    Comment.objects.create(defect=defect, author=manager, text='Проверено')
+    third = get(client, url, first['ETag'])
+    assert third.status_code == 200
+    assert 'Проверено' in third.content.decode()
+
+
+@pytest.mark.django_db
+def test_etag_is_per_user_and_role(client, manager, customer, engineer, defect):
+    url = reverse('defect_detail', kwargs={'pk': defect.pk})
+    client.force_login(manager)
+    manager_etag = get(client, url)['ETag']
+
+    client.force_login(customer)
+    resp = get(client, url, manager_etag)
+    assert resp.status_code == 200
+    assert resp['ETag'] != manager_etag
+
+
+@pytest.mark.django_db
+def test_out_of_scope_defect_is_404_even_with_etag(client, manager, defect, django_user_model):
+    url = reverse('defect_detail', kwargs={'pk': defect.pk})
+    client.force_login(manager)
+    etag = get(client, url)['ETag']
+
+    other = django_user_model.objects.create_user(username='eng2', password='pass', role='engineer')
+    client.force_login(other)
+    assert get(client, url, etag).status_code == 404
+
+
+@pytest.mark.django_db
+def test_pending_flash_message_forces_render(client, manager, defect):
+    client.force_login(manager)
+    url = reverse('defect_detail', kwargs={'pk': defect.pk})
+    etag = get(client, url)['ETag']
+
+    # Пустой комментарий: данные не меняются, но остаётся flash-сообщение
+    client.post(reverse('defect_add_comment', kwargs={'pk': defect.pk}), data={'text': ''})
+    resp = get(client, url, etag)
+    assert resp.status_code == 200
+    assert 'Не удалось добавить комментарий.' in resp.content.decode()
+    assert get(client, url, etag).status_code == 304
+
+
+@pytest.mark.django_db
+def test_dashboard_and_project_follow_scope_changes(client, manager, defect, project):
+    client.force_login(manager)
+    dashboard = reverse('dashboard')
+    project_url = reverse('project_detail', kwargs={'pk': project.pk})
+    dashboard_etag = get(client, dashboard)['ETag']
+    project_etag = get(client, project_url)['ETag']
+
+    assert get(client, dashboard, dashboard_etag).status_code == 304
+    assert get(client, project_url, project_etag).status_code == 304
+    # Другие параметры — другая страница
+    assert get(client, dashboard + '?status=new', dashboard_etag).status_code == 200
+
+    # Удаление не двигает updated_at, но меняет версию данных
+    defect.delete()
+    assert get(client, dashboard, dashboard_etag).status_code == 200
+    assert get(client, project_url, project_etag).status_code == 200
+
+    project_etag = get(client, project_url)['ETag']
+    project.stages.create(name='Фундамент', order=1)
+    assert get(client, project_url, project_etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_process_local_cache_disables_etag(client, manager, defect, settings):
+    # У каждого worker'а своя locmem-версия: 304 мог бы подтвердить устаревшую страницу
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    client.force_login(manager)
+    resp = client.get(reverse('defect_detail', kwargs={'pk': defect.pk}))
+    assert resp.status_code == 200
+    assert 'ETag' not in resp
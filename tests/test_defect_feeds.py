@@ -0,0 +1,74 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from defects.models import Comment, DefectHistory
+
+
+@pytest.fixture
+def long_defect(defect, manager, settings):
+    settings.DEFECT_FEED_PAGE_SIZE = 5
+    Comment.objects.bulk_create(Comment(defect=defect, author=manager, text=f'comment-{i:02d}') for i in range(12))
+    DefectHistory.objects.bulk_create(
+        DefectHistory(defect=defect, changed_by=manager, action='updated', changes={'n': {'to': f'event-{i:02d}'}})
+        for i in range(12)
+    )
+    return defect
+
+
+def texts(html, prefix):
+    return [part.split('<')[0].strip() for part in html.split(prefix)[1:]]
+
+
+@pytest.mark.django_db
+def test_detail_page_renders_only_latest_comments_and_history(client, manager, long_defect):
+    client.force_login(manager)
+    resp = client.get(reverse('defect_detail', kwargs={'pk': long_defect.pk}))
+    assert resp.status_code == 200
+
+    # Последние комментарии — в хронологическом порядке, история — новые сверху
+    assert [c.text for c in resp.context['comments']] == [f'comment-{i:02d}' for i in range(7, 12)]
+    assert [e.changes['n']['to'] for e in resp.context['history']] == [f'event-{i:02d}' for i in range(11, 6, -1)]
+    assert resp.context['comments_cursor'] and resp.context['history_cursor']
+    assert 'comment-06' not in resp.content.decode()
+
+
+@pytest.mark.django_db
+def test_comment_feed_walks_back_to_the_first_comment(client, manager, long_defect):
+    client.force_login(manager)
+    url = reverse('defect_comments', kwargs={'pk': long_defect.pk})
+    cursor = client.get(reverse('defect_detail', kwargs={'pk': long_defect.pk})).context['comments_cursor']
+
+    pages = []
+    while cursor:
+        data = client.get(url, {'cursor': cursor}).json()
+        pages.append(texts(data['html'], 'comment-'))
+        cursor = data['next_cursor']
+    assert pages == [[f'{i:02d}' for i in range(2, 7)], ['00', '01']]
+
+
+@pytest.mark.django_db
+def test_history_feed_pages_with_constant_query_count(client, manager, long_defect):
+    client.force_login(manager)
+    url = reverse('defect_history', kwargs={'pk': long_defect.pk})
+    first = client.get(url).json()
+    assert texts(first['html'], 'event-') == [f'{i:02d}' for i in range(11, 6, -1)]
+
+    with CaptureQueriesContext(connection) as ctx:
+        second = client.get(url, {'cursor': first['next_cursor']}).json()
+    assert texts(second['html'], 'event-') == [f'{i:02d}' for i in range(6, 1, -1)]
+    # Сессия, пользователь, дефект и одна страница событий вместе с авторами
+    assert len(ctx.captured_queries) <= 4
+
+
+@pytest.mark.django_db
+def test_feeds_respect_scope_and_reject_bad_cursor(client, long_defect, django_user_model):
+    other = django_user_model.objects.create_user(username='eng2', password='pass', role='engineer')
+    client.force_login(other)
+    assert client.get(reverse('defect_comments', kwargs={'pk': long_defect.pk})).status_code == 404
+    assert client.get(reverse('defect_history', kwargs={'pk': long_defect.pk})).status_code == 404
+
+    client.force_login(long_defect.executor)
+    resp = client.get(reverse('defect_comments', kwargs={'pk': long_defect.pk}), {'cursor': 'garbage'})
+    assert resp.status_code == 404
@@ -0,0 +1,111 @@
+import datetime as dt
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from defects.exports import cleanup_expired_exports
+from defects.models import Defect, ExportJob
+from users.models import User
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+
+@pytest.mark.django_db
+def test_export_job_is_queued_from_ui(client, manager):
+    client.force_login(manager)
+    resp = client.post(reverse('export_job_create'), data={'format': 'xlsx'})
+    assert resp.status_code == 302
+
+    job = ExportJob.objects.get(user=manager)
+    assert job.format == ExportJob.Format.XLSX
+    assert job.status == ExportJob.Status.PENDING
+
+
+@pytest.mark.django_db
+def test_worker_builds_export_in_engineer_scope(client, engineer, project):
+    other = User.objects.create_user(username='eng2', password='pass', role=User.Role.ENGINEER)
+    for title, executor in (('Мой дефект', engineer), ('Чужой дефект', other)):
+        Defect.objects.create(
+            project=project,
+            title=title,
+            description='...',
+            priority=Defect.Priority.LOW,
+            status=Defect.Status.NEW,
+            deadline=dt.date(2025, 4, 1),
+            executor=executor,
+        )
+    job = ExportJob.objects.create(user=engineer, format=ExportJob.Format.CSV)
+
+    call_command('run_export_jobs', '--once')
+
+    job.refresh_from_db()
+    assert job.status == ExportJob.Status.DONE
+    assert job.total_rows == job.processed_rows == 1
+    assert job.progress == 100
+    assert job.expires_at > timezone.now()
+
+    client.force_login(engineer)
+    status = client.get(reverse('export_job_status')).json()
+    assert status['jobs'][0]['download_url'] == reverse('export_job_download', kwargs={'pk': job.pk})
+
+    resp = client.get(reverse('export_job_download', kwargs={'pk': job.pk}))
+    assert resp.status_code == 200
+    body = b''.join(resp.streaming_content).decode('utf-8')
+    assert 'Мой дефект' in body
+    assert 'Чужой дефект' not in body
+
+
+@pytest.mark.django_db
+def test_export_job_download_is_owner_only(client, manager, customer, defect):
+    job = ExportJob.objects.create(user=manager, format=ExportJob.Format.XLSX)
+    call_command('run_export_jobs', '--once')
+
+    client.force_login(customer)
+    resp = client.get(reverse('export_job_download', kwargs={'pk': job.pk}))
+    assert resp.status_code == 404
+
+
+@pytest.mark.django_db
+def test_expired_export_files_are_removed(manager, defect, media_root):
+    job = ExportJob.objects.create(user=manager, format=ExportJob.Format.CSV)
+    call_command('run_export_jobs', '--once')
+    job.refresh_from_db()
+    path = media_root / job.file.name
+    assert path.exists()
+
+    assert cleanup_expired_exports(now=job.expires_at + dt.timedelta(seconds=1)) == 1
+
+    job.refresh_from_db()
+    assert job.status == ExportJob.Status.EXPIRED
+    assert not job.file
+    assert not path.exists()
+
+
+@pytest.mark.django_db
+def test_worker_fails_exports_left_running_by_dead_worker(manager):
+    stale = ExportJob.objects.create(
+        user=manager,
+        format=ExportJob.Format.CSV,
+        status=ExportJob.Status.RUNNING,
+        started_at=timezone.now() - dt.timedelta(hours=2),
+    )
+    busy = ExportJob.objects.create(
+        user=manager,
+        format=ExportJob.Format.CSV,
+        status=ExportJob.Status.RUNNING,
+        started_at=timezone.now(),
+    )
+    call_command('run_export_jobs', '--once', '--stale-after', '3600')
+
+    stale.refresh_from_db()
+    busy.refresh_from_db()
+    assert stale.status == ExportJob.Status.FAILED
+    assert stale.error and stale.finished_at
+    # Задание, которое прямо сейчас собирает другой worker, не трогается
+    assert busy.status == ExportJob.Status.RUNNING
@@ -0,0 +1,72 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from defects.cache import FRAGMENTS_NAMESPACE, get_version
+from defects.models import Defect
+
+
+@pytest.mark.django_db
+def test_dashboard_filter_lists_are_cached(client, manager, defect):
+    client.force_login(manager)
+    client.get(reverse('dashboard'))
+
+    with CaptureQueriesContext(connection) as ctx:
+        resp = client.get(reverse('dashboard'))
+    assert resp.status_code == 200
+    assert 'engineer</option>' in resp.content.decode()
+    # Список исполнителей взят из кэша фрагмента, запроса пользователей по username нет
+    assert not [q for q in ctx.captured_queries if 'ORDER BY "users_user"."username"' in q['sql']]
+
+
+@pytest.mark.django_db
+def test_defect_row_follows_defect_changes(client, manager, defect):
+    client.force_login(manager)
+    assert 'Трещина в стене' in client.get(reverse('dashboard')).content.decode()
+
+    d = Defect.objects.get(pk=defect.pk)
+    d.title = 'Трещина в перекрытии'
+    d.save()
+    body = client.get(reverse('dashboard')).content.decode()
+    assert 'Трещина в перекрытии' in body
+    assert 'Трещина в стене' not in body
+
+
+@pytest.mark.django_db
+def test_rows_follow_user_and_project_changes(client, manager, engineer, defect, project):
+    client.force_login(manager)
+    client.get(reverse('dashboard'))
+    client.get(reverse('project_detail', kwargs={'pk': project.pk}))
+
+    engineer.username = 'ivanov'
+    engineer.save()
+    project.name = 'ЖК Заречный'
+    project.save()
+
+    body = client.get(reverse('dashboard')).content.decode()
+    assert '<td>ivanov</td>' in body
+    assert 'ЖК Заречный' in body
+    assert '<td>ivanov</td>' in client.get(reverse('project_detail', kwargs={'pk': project.pk})).content.decode()
+
+
+@pytest.mark.django_db
+def test_login_does_not_invalidate_fragments(client, engineer):
+    version = get_version(FRAGMENTS_NAMESPACE)
+    assert client.login(username='engineer', password='pass')
+    assert get_version(FRAGMENTS_NAMESPACE) == version
+
+    get_user_model().objects.create_user(username='eng2', password='pass', role='engineer')
+    assert get_version(FRAGMENTS_NAMESPACE) > version
+
+
+@pytest.mark.django_db
+def test_process_local_cache_renders_fragments_every_time(client, manager, defect, settings):
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    client.force_login(manager)
+    client.get(reverse('dashboard'))
+
+    with CaptureQueriesContext(connection) as ctx:
+        client.get(reverse('dashboard'))
+    assert [q for q in ctx.captured_queries if 'ORDER BY "users_user"."username"' in q['sql']]
@@ -0,0 +1,120 @@
+import datetime as dt
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from defects.archive import archive_defect_history, load_archived_history, unpack_events
+from defects.models import Defect, DefectHistory, DefectHistoryArchive
+from defects.partitions import ensure_history_partitions, history_partitions, is_partitioned, partition_history_table
+
+
+OLD = timezone.now() - dt.timedelta(days=500)
+
+
+def make_events(defect, user, count, *, at):
+    DefectHistory.objects.bulk_create(
+        DefectHistory(defect=defect, changed_by=user, action='updated', changes={'n': {'to': f'event-{i:02d}'}})
+        for i in range(count)
+    )
+    DefectHistory.objects.filter(defect=defect).update(created_at=at)
+
+
+@pytest.fixture
+def closed_defect(defect, manager):
+    make_events(defect, manager, 7, at=OLD)
+    Defect.objects.filter(pk=defect.pk).update(status=Defect.Status.CLOSED, updated_at=OLD)
+    return defect
+
+
+@pytest.mark.django_db
+def test_archive_moves_old_history_of_closed_defects(closed_defect, project, manager):
+    active = Defect.objects.create(
+        project=project, title='Открытый', priority=Defect.Priority.LOW, deadline=dt.date(2025, 6, 1)
+    )
+    make_events(active, manager, 3, at=OLD)
+    Defect.objects.filter(pk=active.pk).update(updated_at=OLD)
+
+    result = archive_defect_history(older_than=dt.timedelta(days=365))
+
+    assert (result.defects, result.events) == (1, 7)
+    assert result.compressed_bytes < result.raw_bytes
+    assert not DefectHistory.objects.filter(defect=closed_defect).exists()
+    assert DefectHistory.objects.filter(defect=active).count() == 3
+
+    archive = DefectHistoryArchive.objects.get(defect=closed_defect)
+    assert archive.events_count == 7
+    assert [event['changes']['n']['to'] for event in unpack_events(archive.data)] == [f'event-{i:02d}' for i in range(7)]
+
+    # Повторный запуск ничего не находит
+    assert archive_defect_history(older_than=dt.timedelta(days=365)).events == 0
+
+
+@pytest.mark.django_db
+def test_archive_keeps_recent_history_and_dry_run_changes_nothing(closed_defect, manager):
+    DefectHistory.objects.create(defect=closed_defect, changed_by=manager, action='updated', changes={})
+
+    result = archive_defect_history(older_than=dt.timedelta(days=365), dry_run=True)
+    assert result.events == 7
+    assert DefectHistory.objects.filter(defect=closed_defect).count() == 8
+    assert not DefectHistoryArchive.objects.exists()
+
+    archive_defect_history(older_than=dt.timedelta(days=365))
+    assert DefectHistory.objects.filter(defect=closed_defect).count() == 1
+
+
+@pytest.mark.django_db
+def test_archived_history_restores_entries_newest_first(closed_defect, manager):
+    archive_defect_history(older_than=dt.timedelta(days=365))
+
+    entries = load_archived_history(closed_defect)
+    assert [entry.changes['n']['to'] for entry in entries] == [f'event-{i:02d}' for i in range(6, -1, -1)]
+    assert entries[0].changed_by == manager
+    assert entries[0].created_at == OLD
+
+
+@pytest.mark.django_db
+def test_detail_page_reads_archive_on_demand(client, settings, closed_defect, manager, django_user_model):
+    settings.DEFECT_FEED_PAGE_SIZE = 5
+    call_command('archive_defect_history', '--older-than-days', '365')
+
+    client.force_login(manager)
+    resp = client.get(reverse('defect_detail', kwargs={'pk': closed_defect.pk}))
+    assert resp.context['archived_history_count'] == 7
+    assert 'Показать архив' in resp.content.decode()
+
+    url = reverse('defect_history_archive', kwargs={'pk': closed_defect.pk})
+    first = client.get(url, {'cursor': '1'}).json()
+    assert (first['count'], first['next_cursor']) == (5, '2')
+    assert 'event-06' in first['html']
+    second = client.get(url, {'cursor': first['next_cursor']}).json()
+    assert (second['count'], second['next_cursor']) == (2, '')
+    assert client.get(url, {'cursor': '9'}).status_code == 404
+
+    # Вне области видимости — 404, как и у карточки
+    other = django_user_model.objects.create_user(username='other', password='pass', role='engineer')
+    client.force_login(other)
+    assert client.get(url).status_code == 404
+
+
+@pytest.mark.django_db
+def test_admin_shows_archived_events_read_only(admin_client, closed_defect):
+    archive_defect_history(older_than=dt.timedelta(days=365))
+    archive = DefectHistoryArchive.objects.get()
+
+    resp = admin_client.get(reverse('admin:defects_defecthistoryarchive_change', args=[archive.pk]))
+    assert resp.status_code == 200
+    assert 'event-03' in resp.content.decode()
+    assert admin_client.get(reverse('admin:defects_defecthistoryarchive_add')).status_code == 403
+
+
+@pytest.mark.django_db
+def test_partition_helpers_are_noops_outside_postgres():
+    if connection.vendor == 'postgresql':
+        pytest.skip('проверка для SQLite')
+    assert not is_partitioned(connection)
+    assert not partition_history_table(connection)
+    assert ensure_history_partitions(connection) == []
+    assert history_partitions(connection) == []
@@ -0,0 +1,78 @@
+import pytest
+from django.db import connection
+from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from defects.history import recording_history
+from defects.models import Defect, DefectHistory
+from defects.services import log_defect_event
+
+
+def history_inserts(ctx):
+    return [q for q in ctx.captured_queries if q['sql'].startswith(f'INSERT INTO "{DefectHistory._meta.db_table}"')]
+
+
+@pytest.mark.django_db
+def test_events_are_flushed_once_at_the_end_of_the_block(defect, manager):
+    with CaptureQueriesContext(connection) as ctx:
+        with recording_history():
+            for action in ('comment_added', 'attachment_added', 'updated'):
+                entry = log_defect_event(defect=defect, user=manager, action=action)
+                assert entry.pk is None
+            assert not DefectHistory.objects.exists()
+    assert len(history_inserts(ctx)) == 1
+    assert DefectHistory.objects.filter(defect=defect).count() == 3
+
+
+@pytest.mark.django_db
+def test_error_rolls_back_both_the_change_and_its_history(defect, manager):
+    with pytest.raises(RuntimeError):
+        with recording_history():
+            Defect.objects.filter(pk=defect.pk).update(status=Defect.Status.IN_PROGRESS)
+            log_defect_event(defect=defect, user=manager, action='status_changed')
+            raise RuntimeError
+    defect.refresh_from_db()
+    assert defect.status == Defect.Status.NEW
+    assert not DefectHistory.objects.exists()
+
+
+@pytest.mark.django_db
+def test_failed_nested_block_drops_only_its_events(defect, manager):
+    with recording_history():
+        log_defect_event(defect=defect, user=manager, action='updated')
+        try:
+            with recording_history():
+                log_defect_event(defect=defect, user=manager, action='comment_added')
+                raise ValueError
+        except ValueError:
+            pass
+    assert list(DefectHistory.objects.values_list('action', flat=True)) == ['updated']
+
+
+@pytest.mark.django_db
+def test_failed_history_write_rolls_back_the_status_change(client, engineer, defect, monkeypatch):
+    original = QuerySet.bulk_create
+
+    def broken(self, *args, **kwargs):
+        if self.model is DefectHistory:
+            raise RuntimeError('disk full')
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(QuerySet, 'bulk_create', broken)
+    client.raise_request_exception = False
+    client.force_login(engineer)
+    resp = client.post(reverse('defect_change_status', kwargs={'pk': defect.pk}), data={'status': Defect.Status.IN_PROGRESS})
+    assert resp.status_code == 500
+    defect.refresh_from_db()
+    assert defect.status == Defect.Status.NEW
+
+
+@pytest.mark.django_db
+def test_comment_view_writes_comment_and_history_together(client, manager, defect):
+    client.force_login(manager)
+    with CaptureQueriesContext(connection) as ctx:
+        client.post(reverse('defect_add_comment', kwargs={'pk': defect.pk}), data={'text': 'Принято'})
+    assert len(history_inserts(ctx)) == 1
+    assert defect.comments.get().text == 'Принято'
+    assert DefectHistory.objects.get(defect=defect).action == DefectHistory.Action.COMMENT_ADDED
@@ -0,0 +1,129 @@
+import datetime as dt
+import io
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from openpyxl import Workbook
+
+from defects.imports import ImportFormatError, import_defects
+from defects.models import Defect, DefectHistory
+from defects.search import search_defects
+from defects.services import diff_rollup
+
+
+HEADER = ['Проект', 'Заголовок', 'Описание', 'Приоритет', 'Статус', 'Исполнитель', 'Deadline']
+
+
+def csv_bytes(rows, header=HEADER):
+    lines = [';'.join(header)] + [';'.join(str(v) for v in row) for row in rows]
+    return ('﻿' + '\n'.join(lines) + '\n').encode('utf-8')
+
+
+def xlsx_bytes(rows, header=HEADER):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def rows(project, engineer):
+    return [
+        [project.name, 'Скол плитки', 'Подъезд 2', 'High', '', engineer.username, '2025-05-01'],
+        [project.name, 'Протечка кровли', 'Кв. 14', 'low', 'in_progress', '', '01.06.2025'],
+        ['Нет такого', 'Трещина', '...', 'Medium', '', '', '2025-05-01'],
+        [project.name, 'Поздний срок', '...', 'Medium', '', '', '2026-03-01'],
+        [project.name, 'Без приоритета', '...', 'Срочный', '', 'nobody', 'завтра'],
+    ]
+
+
+@pytest.mark.django_db
+def test_csv_import_creates_valid_rows_and_reports_errors(manager, project, engineer, rows):
+    result = import_defects(io.BytesIO(csv_bytes(rows)), 'csv', user=manager)
+
+    assert (result.rows, result.created) == (5, 2)
+    assert [error.row for error in result.errors] == [4, 5, 6]
+    assert 'не найден' in result.errors[0].message
+    assert 'Deadline' in result.errors[1].message
+    assert 'priority' in result.errors[2].message and 'executor' in result.errors[2].message
+
+    tile = Defect.objects.get(title='Скол плитки')
+    assert (tile.priority, tile.status, tile.executor) == (Defect.Priority.HIGH, Defect.Status.NEW, engineer)
+    roof = Defect.objects.get(title='Протечка кровли')
+    assert (roof.status, roof.deadline) == (Defect.Status.IN_PROGRESS, dt.date(2025, 6, 1))
+
+    history = DefectHistory.objects.filter(action=DefectHistory.Action.CREATED)
+    assert {entry.defect_id for entry in history} == {tile.pk, roof.pk}
+    assert all(entry.changed_by == manager for entry in history)
+
+    assert diff_rollup() == {}
+    assert list(search_defects(Defect.objects.all(), 'кровли').values_list('pk', flat=True)) == [roof.pk]
+
+
+@pytest.mark.django_db
+def test_xlsx_dry_run_writes_nothing(manager, rows):
+    result = import_defects(io.BytesIO(xlsx_bytes(rows)), 'xlsx', user=manager, dry_run=True)
+    assert (result.rows, result.created, len(result.errors)) == (5, 2, 3)
+    assert not Defect.objects.exists()
+    assert not DefectHistory.objects.exists()
+
+    result = import_defects(io.BytesIO(xlsx_bytes(rows)), 'xlsx', user=manager)
+    assert Defect.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_import_query_count_does_not_depend_on_rows(project, engineer):
+    def run(count):
+        data = [[project.name, f'Дефект {i}', '...', 'Medium', '', engineer.username, '2025-05-01'] for i in range(count)]
+        with CaptureQueriesContext(connection) as ctx:
+            result = import_defects(io.BytesIO(csv_bytes(data)), 'csv', batch_size=100)
+        assert result.created == count
+        return len(ctx.captured_queries)
+
+    # Первый импорт создаёт ячейку сводки, поэтому сравниваем два последующих
+    run(1)
+    assert run(10) == run(90)
+
+
+@pytest.mark.django_db
+def test_missing_required_column_is_rejected(manager):
+    with pytest.raises(ImportFormatError):
+        import_defects(io.BytesIO(csv_bytes([['x', 'y']], header=['Проект', 'Заголовок'])), 'csv')
+
+
+@pytest.mark.django_db
+def test_import_view_is_manager_only(client, manager, engineer, rows):
+    client.force_login(engineer)
+    assert client.get(reverse('defect_import')).status_code == 403
+
+    client.force_login(manager)
+    upload = SimpleUploadedFile('findings.xlsx', xlsx_bytes(rows))
+    resp = client.post(reverse('defect_import'), data={'file': upload})
+    assert resp.status_code == 200
+    assert resp.context['result'].created == 2
+    assert 'Нет такого' in resp.content.decode()
+
+    resp = client.post(reverse('defect_import'), data={'file': SimpleUploadedFile('findings.txt', b'...')})
+    assert resp.context['form'].errors['file']
+
+
+@pytest.mark.django_db
+def test_import_command_writes_error_report(tmp_path, manager, rows):
+    source = tmp_path / 'findings.csv'
+    source.write_bytes(csv_bytes(rows))
+    report = tmp_path / 'errors.csv'
+    out = io.StringIO()
+
+    call_command('import_defects', str(source), '--user', manager.username, '--report', str(report), stdout=out)
+    assert 'Imported 2 of 5 rows, 3 rows with errors.' in out.getvalue()
+    lines = report.read_text(encoding='utf-8-sig').splitlines()
+    assert lines[0] == 'Строка;Ошибка'
+    assert [line.split(';')[0] for line in lines[1:]] == ['4', '5', '6']
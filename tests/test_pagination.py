@@ -0,0 +1,167 @@
+import datetime as dt
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from defects.models import Defect
+from defects.pagination import EstimatedCountPaginator, KeysetPaginator
+from defects.views import DashboardView
+
+SORTS = ['created_at', '-created_at', 'deadline', '-deadline', 'priority', '-priority', 'status', '-status']
+
+
+@pytest.fixture
+def many_defects(project, engineer):
+    priorities = [key for key, _ in Defect.Priority.choices]
+    statuses = [key for key, _ in Defect.Status.choices]
+    Defect.objects.bulk_create(
+        [
+            Defect(
+                project=project,
+                title=f'Дефект {i}',
+                description='...',
+                priority=priorities[i % 3],
+                status=statuses[i % 5],
+                deadline=dt.date(2025, 4, 1) + dt.timedelta(days=i % 4),
+                executor=engineer,
+            )
+            for i in range(47)
+        ]
+    )
+    # Много одинаковых значений, чтобы проверить tie-breaker по id
+    stamp = timezone.now()
+    Defect.objects.filter(id__in=Defect.objects.order_by('id').values('id')[:30]).update(created_at=stamp)
+
+
+def walk(paginator):
+    ids, cursor, pages = [], None, []
+    while True:
+        page = paginator.page(cursor)
+        pages.append(page)
+        ids += [d.id for d in page]
+        if not page.has_next:
+            return ids, pages
+        cursor = page.next_cursor
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('sort', SORTS)
+def test_keyset_pages_match_full_ordering(many_defects, sort):
+    tie = '-id' if sort.startswith('-') else 'id'
+    expected = list(Defect.objects.order_by(sort, tie).values_list('id', flat=True))
+
+    ids, pages = walk(KeysetPaginator(Defect.objects.all(), 10, sort))
+    assert ids == expected
+    assert len(pages) == 5
+
+    # Переход назад возвращает ровно предыдущую страницу
+    back = KeysetPaginator(Defect.objects.all(), 10, sort).page(pages[2].previous_cursor)
+    assert [d.id for d in back] == [d.id for d in pages[1]]
+    assert back.has_previous and back.has_next
+
+
+@pytest.mark.django_db
+def test_dashboard_switches_to_cursor_pages_for_large_results(client, manager, many_defects, monkeypatch):
+    monkeypatch.setattr(DashboardView, 'offset_pagination_max_rows', 30)
+    client.force_login(manager)
+
+    first = client.get(reverse('dashboard'), {'sort': 'deadline'})
+    page = first.context['page_obj']
+    assert page.is_keyset and page.has_next
+
+    with CaptureQueriesContext(connection) as queries:
+        second = client.get(reverse('dashboard'), {'sort': 'deadline', 'cursor': page.next_cursor})
+    assert second.status_code == 200
+    sqls = [q['sql'].upper() for q in queries.captured_queries]
+    assert not any('OFFSET' in sql for sql in sqls)
+    # Подпись «Найдено» считается только ограниченным COUNT
+    assert all('LIMIT' in sql for sql in sqls if 'COUNT(' in sql)
+    assert second.context['page_obj'].has_previous
+
+
+@pytest.mark.django_db
+def test_dashboard_keeps_numbered_pages_for_small_results(client, manager, many_defects):
+    client.force_login(manager)
+    with CaptureQueriesContext(connection) as queries:
+        resp = client.get(reverse('dashboard'))
+    assert not getattr(resp.context['page_obj'], 'is_keyset', False)
+    assert resp.context['paginator'].num_pages == 3
+    # Выбор пагинации и число страниц — по одному ограниченному COUNT
+    counts = [q['sql'] for q in queries.captured_queries if 'COUNT(' in q['sql'].upper() and 'defects_defect' in q['sql']]
+    assert len(counts) == 1
+
+
+@pytest.mark.django_db
+def test_dashboard_rejects_broken_cursor(client, manager):
+    client.force_login(manager)
+    assert client.get(reverse('dashboard'), {'cursor': 'not-a-cursor'}).status_code == 404
+
+
+@pytest.mark.django_db
+def test_estimated_paginator_counts_exactly_below_threshold(settings, many_defects):
+    settings.PAGINATOR_EXACT_COUNT_THRESHOLD = 100
+    paginator = EstimatedCountPaginator(Defect.objects.all(), 20)
+    assert paginator.count == 47
+    assert paginator.count_display == '47'
+    assert paginator.num_pages == 3
+
+
+@pytest.mark.django_db
+def test_estimated_paginator_caches_count_above_threshold(settings, many_defects):
+    settings.PAGINATOR_EXACT_COUNT_THRESHOLD = 10
+    cache.clear()
+    qs = Defect.objects.filter(status__in=[Defect.Status.NEW, Defect.Status.CLOSED])
+    expected = qs.count()
+
+    assert EstimatedCountPaginator(qs, 20).count == expected
+
+    with CaptureQueriesContext(connection) as queries:
+        assert EstimatedCountPaginator(qs, 20).count == expected
+    # Остаётся только ограниченный COUNT по LIMIT, полный COUNT берётся из кэша
+    assert len(queries.captured_queries) == 1
+    assert 'LIMIT' in queries.captured_queries[0]['sql'].upper()
+
+
+@pytest.mark.django_db
+def test_approximate_count_hides_last_pages(settings, many_defects, monkeypatch):
+    settings.PAGINATOR_EXACT_COUNT_THRESHOLD = 10
+    # Завышенная оценка планировщика для фильтрованной выборки
+    monkeypatch.setattr(EstimatedCountPaginator, '_planner_estimate', staticmethod(lambda qs: 10_000))
+    monkeypatch.setattr(EstimatedCountPaginator, '_cache_exact_count_later', lambda self, qs, key: None)
+    paginator = EstimatedCountPaginator(Defect.objects.all(), 5)
+
+    assert paginator.count == 10_000 and paginator.is_approximate
+    pages = list(paginator.get_elided_page_range(1))
+    assert pages == [1, 2, 3, 4, paginator.ELLIPSIS]
+    assert paginator.num_pages not in pages
+    assert paginator.num_pages not in paginator.get_elided_page_range(50)
+
+
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason='оценка планировщика есть только в PostgreSQL')
+@pytest.mark.django_db(transaction=True)
+def test_postgres_exact_count_is_cached_off_the_request(settings, many_defects):
+    settings.PAGINATOR_EXACT_COUNT_THRESHOLD = 10
+    qs = Defect.objects.filter(status__in=[Defect.Status.NEW, Defect.Status.CLOSED])
+    first = EstimatedCountPaginator(qs, 20)
+    first.count
+    assert first.is_approximate
+    first.exact_count_thread.join(timeout=10)
+
+    second = EstimatedCountPaginator(qs, 20)
+    assert second.count == qs.count()
+    assert not second.is_approximate
+
+
+@pytest.mark.django_db
+def test_admin_changelists_use_estimated_paginator(client, django_user_model, defect):
+    admin = django_user_model.objects.create_superuser(username='root', password='pass', email='r@example.com')
+    client.force_login(admin)
+
+    for name in ('admin:defects_defect_changelist', 'admin:defects_defecthistory_changelist'):
+        resp = client.get(reverse(name))
+        assert resp.status_code == 200
+        assert isinstance(resp.context['cl'].paginator, EstimatedCountPaginator)
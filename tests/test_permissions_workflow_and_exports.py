@@ -1,7 +1,9 @@
 import datetime as dt
+import io
 
 import pytest
 from django.urls import reverse
+from openpyxl import load_workbook
 
 from defects.models import Defect, Project
 from defects.models import DefectHistory
@@ -178,11 +180,34 @@ def test_csv_export_scoped_for_engineer(client, engineer, project):
     resp = client.get(reverse('export_defects_csv'))
     assert resp.status_code == 200
 
-    body = resp.content.decode('utf-8', errors='ignore')
+    body = b''.join(resp.streaming_content).decode('utf-8', errors='ignore')
     assert 'Мой дефект' in body
     assert 'Чужой дефект' not in body
 
 
+@pytest.mark.django_db
+def test_csv_export_is_streamed_with_display_values(client, manager, defect):
+    client.force_login(manager)
+    resp = client.get(reverse('export_defects_csv'))
+    assert resp.status_code == 200
+    assert resp.streaming
+
+    lines = b''.join(resp.streaming_content).decode('utf-8').lstrip('\ufeff').splitlines()
+    assert lines[0].startswith('ID;Проект;Заголовок')
+    assert lines[1] == ';'.join(
+        [
+            str(defect.pk),
+            defect.project.name,
+            defect.title,
+            defect.get_priority_display(),
+            defect.get_status_display(),
+            defect.executor.username,
+            defect.deadline.isoformat(),
+            defect.created_at.strftime('%Y-%m-%d %H:%M'),
+        ]
+    )
+
+
 @pytest.mark.django_db
 def test_xlsx_export_requires_login(client):
     resp = client.get(reverse('export_defects_xlsx'))
@@ -218,7 +243,12 @@ def test_xlsx_export_scoped_for_engineer(client, engineer, project):
     assert resp.status_code == 200
     assert resp['Content-Type'].startswith('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
     # XLSX - это zip, начинается с PK
-    assert resp.content[:2] == b'PK'
+    content = b''.join(resp.streaming_content)
+    assert content[:2] == b'PK'
+
+    wb = load_workbook(io.BytesIO(content), read_only=True)
+    titles = [row[2] for row in wb['Defects'].iter_rows(min_row=2, values_only=True)]
+    assert titles == ['Мой дефект']
 
 
 @pytest.mark.django_db
@@ -0,0 +1,148 @@
+import pytest
+from django.core.files.base import ContentFile
+from django.urls import reverse
+
+from defects.blobs import store_attachment
+from defects.downloads import parse_range
+
+CONTENT = bytes(range(256)) * 40
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    settings.PROTECTED_MEDIA_SERVER = ''
+    return tmp_path
+
+
+@pytest.fixture
+def attachment(defect):
+    return store_attachment(defect, ContentFile(CONTENT, name='Акт осмотра.pdf'))
+
+
+@pytest.fixture
+def url(attachment):
+    return reverse('attachment_download', kwargs={'pk': attachment.pk})
+
+
+def body(resp):
+    return b''.join(resp.streaming_content)
+
+
+@pytest.mark.parametrize(
+    'header, expected',
+    [
+        ('bytes=0-9', (0, 10)),
+        ('bytes=100-', (100, 900)),
+        ('bytes=-50', (950, 50)),
+        ('bytes=990-5000', (990, 10)),
+        ('bytes=0-1,5-6', None),
+        ('items=0-1', None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=5-1', 'bytes=-0'])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 1000)
+
+
+@pytest.mark.django_db
+def test_download_checks_can_view(client, url, engineer, django_user_model):
+    assert client.get(url).status_code == 302  # на страницу входа
+
+    client.force_login(django_user_model.objects.create_user(username='other', password='pass', role='engineer'))
+    assert client.get(url).status_code == 404
+
+    client.force_login(engineer)
+    resp = client.get(url)
+    assert resp.status_code == 200
+    assert body(resp) == CONTENT
+    assert resp['Content-Type'] == 'application/pdf'
+    assert resp['Accept-Ranges'] == 'bytes'
+    assert 'inline' in resp['Content-Disposition']
+    assert resp['X-Content-Type-Options'] == 'nosniff'
+    assert 'attachment' in client.get(url, {'download': '1'})['Content-Disposition']
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'name, content',
+    [
+        ('report.html', b'<script>alert(document.cookie)</script>'),
+        ('plan.svg', b'<svg xmlns="http://www.w3.org/2000/svg" onload="alert(1)"/>'),
+        ('notes', b'<html><script>alert(1)</script></html>'),
+    ],
+)
+def test_active_content_is_never_served_inline(client, manager, defect, name, content):
+    attachment = store_attachment(defect, ContentFile(content, name=name))
+    client.force_login(manager)
+
+    resp = client.get(reverse('attachment_download', kwargs={'pk': attachment.pk}))
+
+    assert resp.status_code == 200
+    assert resp['Content-Type'] == 'application/octet-stream'
+    assert resp['Content-Disposition'].startswith('attachment')
+    assert resp['X-Content-Type-Options'] == 'nosniff'
+    assert resp['Content-Security-Policy'] == 'sandbox'
+
+
+@pytest.mark.django_db
+def test_repeat_view_is_not_modified(client, manager, attachment, url):
+    client.force_login(manager)
+    resp = client.get(url)
+    assert resp['ETag'] == f'"{attachment.blob.sha256}"'
+    assert 'no-cache' in resp['Cache-Control'] and 'private' in resp['Cache-Control']
+
+    assert client.get(url, headers={'If-None-Match': resp['ETag']}).status_code == 304
+    assert client.get(url, headers={'If-Modified-Since': resp['Last-Modified']}).status_code == 304
+
+
+@pytest.mark.django_db
+def test_range_requests(client, manager, url):
+    client.force_login(manager)
+
+    resp = client.get(url, headers={'Range': 'bytes=10-19'})
+    assert resp.status_code == 206
+    assert body(resp) == CONTENT[10:20]
+    assert resp['Content-Range'] == f'bytes 10-19/{len(CONTENT)}'
+    assert resp['Content-Length'] == '10'
+
+    assert body(client.get(url, headers={'Range': 'bytes=-5'})) == CONTENT[-5:]
+
+    resp = client.get(url, headers={'Range': f'bytes={len(CONTENT)}-'})
+    assert resp.status_code == 416
+    assert resp['Content-Range'] == f'bytes */{len(CONTENT)}'
+
+    # If-Range со старым ETag: файл изменился, отдаём целиком
+    resp = client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert resp.status_code == 200
+    assert body(resp) == CONTENT
+
+
+@pytest.mark.django_db
+def test_proxy_modes_hand_off_transfer(client, settings, manager, attachment, url, media_root):
+    client.force_login(manager)
+
+    settings.PROTECTED_MEDIA_SERVER = 'nginx'
+    resp = client.get(url, headers={'Range': 'bytes=0-9'})
+    assert resp.status_code == 200
+    assert resp['X-Accel-Redirect'] == f'/protected-media/{attachment.file.name}'
+    assert resp.content == b''
+    assert resp['ETag'] == f'"{attachment.blob.sha256}"' and resp['Last-Modified']
+    assert client.get(url, headers={'If-None-Match': resp['ETag']}).status_code == 304
+
+    settings.PROTECTED_MEDIA_SERVER = 'sendfile'
+    resp = client.get(url)
+    assert resp['X-Sendfile'] == str(media_root / attachment.file.name)
+    assert "filename*=utf-8''" in resp['Content-Disposition']
+
+
+@pytest.mark.django_db
+def test_missing_file_is_404(client, manager, attachment, url, media_root):
+    (media_root / attachment.file.name).unlink()
+    client.force_login(manager)
+    assert client.get(url).status_code == 404
@@ -0,0 +1,189 @@
+"""Проверка планов запросов: горячие формы запросов не должны читать таблицу
+дефектов полным сканированием.
+
+Формы запросов берутся из самих view (DashboardView, ProjectDetailView,
+экспорт), а не переписываются вручную, чтобы тест ловил расхождения
+между запросами и индексами.
+"""
+
+import datetime as dt
+import json
+import re
+
+import pytest
+from django.db import connection
+from django.test import RequestFactory
+
+from defects.conditional import defect_validators_queryset, latest_updated_queryset
+from defects.exports import export_values
+from defects.models import Comment, Defect, DefectHistory, Project
+from defects.pagination import KeysetPaginator
+from defects.views import DashboardView, ProjectDetailView
+from users.models import User
+
+DEFECT_TABLE = Defect._meta.db_table
+
+
+@pytest.fixture
+def seeded(db):
+    projects = Project.objects.bulk_create(
+        [Project(name=f'Объект {i}', address='Адрес', start_date=dt.date(2024, 1, 1)) for i in range(20)]
+    )
+    engineers = User.objects.bulk_create([User(username=f'eng{i}', role=User.Role.ENGINEER) for i in range(20)])
+    priorities = [key for key, _ in Defect.Priority.choices]
+    statuses = [key for key, _ in Defect.Status.choices]
+    Defect.objects.bulk_create(
+        [
+            Defect(
+                project=projects[i % 20],
+                executor=engineers[i % 20],
+                title=f'Дефект {i}',
+                description='...',
+                priority=priorities[i % 3],
+                status=statuses[i % 5],
+                deadline=dt.date(2024, 1, 1) + dt.timedelta(days=i % 500),
+            )
+            for i in range(3000)
+        ]
+    )
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return {'project': projects[0], 'engineer': engineers[0]}
+
+
+def explain(qs) -> list[str]:
+    sql, params = qs.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Запрещаем seq scan: если подходящего индекса нет, планировщик всё равно выберет его
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            nodes, stack = [], [plan[0]['Plan']]
+            while stack:
+                node = stack.pop()
+                nodes.append(f"{node['Node Type']} on {node.get('Relation Name', '')}")
+                stack.extend(node.get('Plans', []))
+            return nodes
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def assert_uses_index(qs):
+    plan = explain(qs)
+    if connection.vendor == 'postgresql':
+        bad = [line for line in plan if line == f'Seq Scan on {DEFECT_TABLE}']
+    else:
+        # «SCAN t USING INDEX» — проход всего индекса по порядку: допустим только
+        # для top-N запросов с LIMIT, где чтение останавливается на первой странице
+        limited = qs.query.high_mark is not None
+        pattern = rf'SCAN {DEFECT_TABLE}' if limited else rf'SCAN {DEFECT_TABLE}( USING .*)?'
+        bad = [line for line in plan if re.fullmatch(pattern, line)]
+    assert not bad, f'Full scan of {DEFECT_TABLE}:\n' + '\n'.join(plan)
+
+
+def dashboard_queryset(user, **params):
+    view = DashboardView()
+    view.setup(RequestFactory().get('/', params))
+    view.request.user = user
+    return view.get_queryset()
+
+
+@pytest.fixture
+def manager(db):
+    return User.objects.create_user(username='boss', password='pass', role=User.Role.MANAGER)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('sort', ['-created_at', 'created_at', 'deadline', '-deadline', 'priority', '-status'])
+def test_manager_dashboard_sorts_use_index(seeded, manager, sort):
+    qs = dashboard_queryset(manager, sort=sort)
+    assert_uses_index(qs[:21])
+
+    # Следующая keyset-страница
+    first = list(qs[:20])
+    paginator = KeysetPaginator(qs, 20, sort)
+    value, pk, _ = paginator.decode_cursor(paginator.encode_cursor(first[-1], 'next'))
+    assert_uses_index(qs.filter(paginator._seek(value, pk, False))[:21])
+
+
+@pytest.mark.django_db
+def test_engineer_dashboard_uses_executor_index(seeded):
+    assert_uses_index(dashboard_queryset(seeded['engineer'])[:21])
+
+
+@pytest.mark.django_db
+def test_status_filter_uses_index(seeded, manager):
+    assert_uses_index(dashboard_queryset(manager, status=Defect.Status.NEW)[:21])
+
+
+@pytest.mark.django_db
+def test_project_detail_defects_use_project_index(seeded, manager):
+    view = ProjectDetailView()
+    view.setup(RequestFactory().get('/'), pk=seeded['project'].pk)
+    view.request.user = manager
+    view.object = seeded['project']
+    assert_uses_index(view.get_context_data()['defects'])
+
+
+@pytest.mark.django_db
+def test_overdue_lookup_uses_partial_index(seeded):
+    overdue = Defect.objects.overdue(dt.date(2024, 3, 1))
+    assert_uses_index(overdue.order_by('deadline'))
+    assert_uses_index(overdue.order_by().values('id'))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('with_description', [False, True])
+def test_engineer_export_uses_executor_index(seeded, with_description):
+    qs = Defect.objects.filter(executor=seeded['engineer'])
+    assert_uses_index(export_values(qs, with_description=with_description))
+
+
+@pytest.mark.django_db
+def test_plan_check_detects_full_scan(seeded):
+    with pytest.raises(AssertionError):
+        assert_uses_index(Defect.objects.filter(title='Дефект 1'))
+
+
+def assert_index_only(qs):
+    """Каждая таблица читается только из индекса (или по первичному ключу)."""
+
+    assert_uses_index(qs)
+    if connection.vendor != 'sqlite':
+        return
+    plan = explain(qs)
+    bad = [
+        line for line in plan
+        if re.match(r'(SCAN|SEARCH) ', line) and not re.search(r'COVERING INDEX|INTEGER PRIMARY KEY', line)
+    ]
+    assert not bad, 'Table access outside of an index:\n' + '\n'.join(plan)
+
+
+@pytest.mark.django_db
+def test_list_validators_are_index_only(seeded, manager):
+    assert_index_only(latest_updated_queryset(Defect.objects.all()))
+    assert_index_only(latest_updated_queryset(Defect.objects.filter(executor=seeded['engineer'])))
+    assert_index_only(latest_updated_queryset(Defect.objects.filter(project=seeded['project'])))
+
+
+@pytest.mark.django_db
+def test_detail_validators_are_index_only(seeded, manager):
+    defect = Defect.objects.filter(project=seeded['project']).first()
+    Comment.objects.create(defect=defect, author=manager, text='...')
+    assert_index_only(defect_validators_queryset(Defect.objects.filter(pk=defect.pk)))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('model', [Comment, DefectHistory])
+def test_detail_feeds_seek_by_defect_index_without_sort(seeded, manager, model):
+    defect = Defect.objects.filter(project=seeded['project']).first()
+    latest = model.objects.filter(defect=defect)
+    qs = latest.filter(created_at__lt=dt.datetime(2030, 1, 1, tzinfo=dt.timezone.utc)).order_by('-created_at', '-id')[:21]
+    plan = explain(qs)
+    if connection.vendor == 'postgresql':
+        assert not any(line.startswith(('Seq Scan', 'Sort')) for line in plan), '\n'.join(plan)
+    else:
+        assert any(re.match(rf'SEARCH {model._meta.db_table} USING INDEX', line) for line in plan), '\n'.join(plan)
+        assert not any('TEMP B-TREE' in line for line in plan), '\n'.join(plan)
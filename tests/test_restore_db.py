@@ -0,0 +1,67 @@
+import json
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+
+from defects.backups import read_backup_manifest
+from defects.models import Defect
+
+pytestmark = [
+    pytest.mark.skipif(connection.vendor != 'sqlite', reason='копии SQLite'),
+    # Копия и восстановление работают отдельным соединением и видят только закоммиченное
+    pytest.mark.django_db(transaction=True),
+]
+
+
+@pytest.fixture
+def backup(defect, tmp_path):
+    out_dir = tmp_path / 'backups'
+    call_command('backup_db', '--out-dir', str(out_dir))
+    [path] = [path for path in out_dir.iterdir() if not path.name.endswith('.manifest.json')]
+    return path
+
+
+def test_backup_manifest_counts_rows(backup):
+    rows = read_backup_manifest(backup)['rows']
+    assert rows['defects.Defect'] == 1
+    assert rows['defects.Project'] == 1
+
+
+def test_verify_backup_restores_into_scratch_db(backup, capsys):
+    call_command('verify_backup', '--out-dir', str(backup.parent))
+
+    out = capsys.readouterr().out
+    assert str(backup) in out
+    assert 'restore' in out and 'Backup verified' in out
+    # Рабочая база не тронута
+    assert Defect.objects.count() == 1
+
+
+def test_verify_backup_fails_on_count_mismatch(backup, capsys):
+    manifest = backup.with_name(backup.name + '.manifest.json')
+    data = json.loads(manifest.read_text())
+    data['rows']['defects.Defect'] = 2
+    manifest.write_text(json.dumps(data))
+
+    with pytest.raises(CommandError, match='verification failed'):
+        call_command('verify_backup', str(backup))
+    assert 'defects.Defect: expected 2, restored 1' in capsys.readouterr().out
+
+
+def test_restore_db_brings_back_backup_state(backup, defect, project, capsys):
+    Defect.objects.create(project=project, title='После копии', description='', deadline=defect.deadline)
+    defect.delete()
+
+    call_command('restore_db', str(backup), '--noinput')
+
+    assert list(Defect.objects.values_list('title', flat=True)) == ['Трещина в стене']
+    assert 'Row counts match the manifest' in capsys.readouterr().out
+
+
+def test_restore_db_rejects_other_engine_dump(tmp_path):
+    dump = tmp_path / 'pg_20260101_000000.dir'
+    dump.mkdir()
+    with pytest.raises(CommandError, match='is for postgresql'):
+        call_command('restore_db', str(dump), '--noinput')
@@ -0,0 +1,164 @@
+import datetime as dt
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+
+from defects.models import Defect, DefectStatusRollup, Project
+from defects.services import compute_rollup, diff_rollup
+
+
+def stored_rollup():
+    return {
+        (r.project_id, r.status, r.priority): r.total
+        for r in DefectStatusRollup.objects.all()
+        if r.total
+    }
+
+
+@pytest.mark.django_db
+def test_rollup_follows_defect_views(client, manager, engineer, project):
+    client.force_login(manager)
+    client.post(
+        reverse('defect_create'),
+        data={
+            'project': project.id,
+            'title': 'Неровность пола',
+            'description': 'Требуется выравнивание.',
+            'priority': Defect.Priority.MEDIUM,
+            'deadline': dt.date(2025, 5, 1),
+            'executor': engineer.id,
+        },
+    )
+    d = Defect.objects.get(title='Неровность пола')
+    assert stored_rollup() == {(project.id, Defect.Status.NEW, Defect.Priority.MEDIUM): 1}
+
+    client.post(reverse('defect_change_status', kwargs={'pk': d.id}), data={'status': Defect.Status.IN_PROGRESS})
+    client.post(
+        reverse('defect_edit', kwargs={'pk': d.id}),
+        data={
+            'project': project.id,
+            'title': d.title,
+            'description': d.description,
+            'priority': Defect.Priority.HIGH,
+            'deadline': dt.date(2025, 5, 1),
+            'executor': engineer.id,
+        },
+    )
+    assert stored_rollup() == {(project.id, Defect.Status.IN_PROGRESS, Defect.Priority.HIGH): 1}
+    assert stored_rollup() == compute_rollup()
+
+    client.post(reverse('defect_delete', kwargs={'pk': d.id}))
+    assert not Defect.objects.exists()
+    assert stored_rollup() == {}
+
+
+@pytest.mark.django_db
+def test_rollup_tracks_project_move_and_cascade(defect):
+    other = Project.objects.create(name='ЖК Южный', address='Казань', start_date=dt.date(2025, 1, 1))
+    defect = Defect.objects.get(pk=defect.pk)
+    defect.project = other
+    defect.save()
+    assert stored_rollup() == {(other.id, Defect.Status.NEW, Defect.Priority.HIGH): 1}
+
+    other_id = other.id
+    other.delete()
+    assert not DefectStatusRollup.objects.filter(project_id=other_id).exists()
+    assert stored_rollup() == compute_rollup() == {}
+
+
+@pytest.mark.django_db
+def test_rebuild_defect_rollup_command(defect):
+    DefectStatusRollup.objects.update(total=5)
+    assert diff_rollup() == {(defect.project_id, defect.status, defect.priority): (5, 1)}
+
+    with pytest.raises(CommandError):
+        call_command('rebuild_defect_rollup', '--verify')
+
+    call_command('rebuild_defect_rollup')
+    call_command('rebuild_defect_rollup', '--verify')
+    assert stored_rollup() == compute_rollup()
+
+
+@pytest.mark.django_db
+def test_analytics_reads_rollup(client, customer, defect):
+    client.force_login(customer)
+    resp = client.get(reverse('analytics'))
+    assert dict(resp.context['rows'])['Новая'] == 1
+
+
+def change_status_concurrently(pk, status):
+    # Другой запрос успевает сменить статус и закоммитить (сигналы обновляют сводку)
+    other = Defect.objects.get(pk=pk)
+    other.status = status
+    other.save()
+
+
+@pytest.mark.django_db
+def test_edit_after_concurrent_status_change_keeps_rollup(client, manager, engineer, defect, monkeypatch):
+    from defects.views import DefectUpdateView
+
+    original = DefectUpdateView.get_object
+
+    def get_object_then_interleave(self, queryset=None):
+        obj = original(self, queryset)
+        if self.request.method == 'POST' and not hasattr(self, '_interleaved'):
+            self._interleaved = True
+            change_status_concurrently(obj.pk, Defect.Status.IN_PROGRESS)
+        return obj
+
+    monkeypatch.setattr(DefectUpdateView, 'get_object', get_object_then_interleave)
+    client.force_login(manager)
+    resp = client.post(
+        reverse('defect_edit', kwargs={'pk': defect.pk}),
+        data={
+            'project': defect.project_id,
+            'title': defect.title,
+            'description': defect.description,
+            'priority': Defect.Priority.LOW,
+            'deadline': defect.deadline,
+            'executor': engineer.id,
+        },
+    )
+
+    assert resp.status_code == 302
+    assert stored_rollup() == compute_rollup()
+
+
+@pytest.mark.django_db
+def test_delete_after_concurrent_status_change_keeps_rollup(client, manager, defect, monkeypatch):
+    from defects.views import DefectDeleteView
+
+    original = DefectDeleteView.get_object
+
+    def get_object_then_interleave(self, queryset=None):
+        obj = original(self, queryset)
+        change_status_concurrently(obj.pk, Defect.Status.IN_PROGRESS)
+        return obj
+
+    monkeypatch.setattr(DefectDeleteView, 'get_object', get_object_then_interleave)
+    client.force_login(manager)
+    client.post(reverse('defect_delete', kwargs={'pk': defect.pk}))
+
+    assert not Defect.objects.exists()
+    assert stored_rollup() == {}
+
+
+@pytest.mark.django_db
+def test_status_change_locks_defect_row(client, manager, defect, monkeypatch):
+    from django.db.models import QuerySet
+
+    locked = []
+    original = QuerySet.select_for_update
+
+    def record(self, *args, **kwargs):
+        locked.append(self.model)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(QuerySet, 'select_for_update', record)
+    client.force_login(manager)
+    client.post(reverse('defect_change_status', kwargs={'pk': defect.pk}), data={'status': Defect.Status.IN_PROGRESS})
+
+    assert Defect in locked
+    assert stored_rollup() == compute_rollup()
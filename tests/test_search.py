@@ -0,0 +1,78 @@
+import datetime as dt
+
+import pytest
+from django.urls import reverse
+
+from defects.models import Defect, Project
+from defects.search import fts_match_expression, search_defects
+from users.models import User
+
+
+def make_defect(project, executor, title, description='...', **kwargs):
+    return Defect.objects.create(
+        project=project,
+        title=title,
+        description=description,
+        priority=kwargs.pop('priority', Defect.Priority.MEDIUM),
+        status=kwargs.pop('status', Defect.Status.NEW),
+        deadline=dt.date(2025, 4, 1),
+        executor=executor,
+        **kwargs,
+    )
+
+
+def dashboard_titles(client, **params):
+    resp = client.get(reverse('dashboard'), params)
+    assert resp.status_code == 200
+    return [d.title for d in resp.context['defects']]
+
+
+def test_fts_match_expression_uses_prefix_terms():
+    assert fts_match_expression('Трещины, стена!') == '"трещины"* "стена"*'
+    assert fts_match_expression('  ') == ''
+
+
+@pytest.mark.django_db
+def test_search_ranks_title_matches_first(client, manager, engineer, project):
+    make_defect(project, engineer, 'Протечка кровли', description='Под кровлей видна трещина.')
+    make_defect(project, engineer, 'Трещина в стене', description='Трещина шириной 2 мм.')
+    make_defect(project, engineer, 'Скол плитки')
+
+    client.force_login(manager)
+    assert dashboard_titles(client, q='трещин') == ['Трещина в стене', 'Протечка кровли']
+
+
+@pytest.mark.django_db
+def test_search_keeps_role_and_status_filters(client, manager, engineer, project):
+    other = User.objects.create_user(username='eng2', password='pass', role=User.Role.ENGINEER)
+    make_defect(project, engineer, 'Трещина мой')
+    make_defect(project, other, 'Трещина чужой')
+    make_defect(project, engineer, 'Трещина закрытый', status=Defect.Status.CLOSED)
+
+    client.force_login(engineer)
+    assert sorted(dashboard_titles(client, q='трещина')) == ['Трещина закрытый', 'Трещина мой']
+    assert dashboard_titles(client, q='трещина', status=Defect.Status.CLOSED) == ['Трещина закрытый']
+
+    client.force_login(manager)
+    assert dashboard_titles(client, q='трещина', executor=other.id) == ['Трещина чужой']
+
+
+@pytest.mark.django_db
+def test_search_index_follows_defect_and_project_changes(engineer):
+    project = Project.objects.create(name='ЖК Южный', address='Казань', start_date=dt.date(2025, 1, 1))
+    d = make_defect(project, engineer, 'Скол плитки')
+
+    assert list(search_defects(Defect.objects.all(), 'казань')) == [d]
+
+    d.title = 'Отслоение штукатурки'
+    d.save()
+    assert not search_defects(Defect.objects.all(), 'плитки').exists()
+    assert search_defects(Defect.objects.all(), 'штукатурки').exists()
+
+    project.address = 'Самара'
+    project.save()
+    assert not search_defects(Defect.objects.all(), 'казань').exists()
+    assert search_defects(Defect.objects.all(), 'самара').exists()
+
+    d.delete()
+    assert not search_defects(Defect.objects.all(), 'самара').exists()
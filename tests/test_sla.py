@@ -0,0 +1,151 @@
+import datetime as dt
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from defects.models import Defect, DefectHistory, ReportState
+from defects.sla import LogHistogram, compute_sla, load_sla_report, update_sla_report
+
+
+T0 = timezone.make_aware(dt.datetime(2025, 3, 3, 9, 0))
+S = Defect.Status
+
+
+def event(defect, action, hours, changes):
+    entry = DefectHistory.objects.create(defect=defect, action=action, changes=changes)
+    DefectHistory.objects.filter(pk=entry.pk).update(created_at=T0 + dt.timedelta(hours=hours))
+    return entry
+
+
+def created(defect, hours=0):
+    return event(defect, 'created', hours, {'status': {'to': S.NEW.label}})
+
+
+def moved(defect, hours, old, new):
+    return event(defect, 'status_changed', hours, {'status': {'from': old.label, 'to': new.label}})
+
+
+def test_log_histogram_percentiles_within_error():
+    hist = LogHistogram()
+    for seconds in range(1, 10001):
+        hist.add(seconds)
+    assert hist.count == 10000
+    assert abs(hist.percentile(50) - 5000) / 5000 < 0.05
+    assert abs(hist.percentile(95) - 9500) / 9500 < 0.05
+
+    restored = LogHistogram.from_dict(hist.to_dict())
+    restored.merge(hist)
+    assert restored.count == 20000
+    assert restored.percentile(50) == hist.percentile(50)
+
+
+@pytest.mark.django_db
+def test_time_in_status_time_to_close_and_deadline(defect):
+    # defect: deadline 2025-06-01, приоритет high
+    created(defect)
+    moved(defect, 2, S.NEW, S.IN_PROGRESS)
+    moved(defect, 26, S.IN_PROGRESS, S.ON_REVIEW)
+    moved(defect, 30, S.ON_REVIEW, S.CLOSED)
+    event(defect, 'comment_added', 31, {})
+
+    groups, watermark = compute_sla()
+    assert watermark == DefectHistory.objects.latest('id').id
+
+    overall = groups[('all', '')]
+    assert overall.time_in_status[S.NEW].count == 1
+    assert abs(overall.time_in_status[S.IN_PROGRESS].percentile(50) - 24 * 3600) / (24 * 3600) < 0.05
+    assert abs(overall.time_to_close.percentile(50) - 30 * 3600) / (30 * 3600) < 0.05
+    assert overall.closed == overall.closed_on_time == 1
+    assert S.CLOSED not in overall.time_in_status
+
+    assert groups[('priority', 'high')].closed == 1
+    assert groups[('project', str(defect.project_id))].closed == 1
+    assert groups[('executor', str(defect.executor_id))].closed == 1
+
+
+@pytest.mark.django_db
+def test_late_close_misses_deadline(defect):
+    Defect.objects.filter(pk=defect.pk).update(deadline=dt.date(2025, 3, 3))
+    created(defect)
+    moved(defect, 48, S.NEW, S.CLOSED)
+    groups, _ = compute_sla()
+    assert groups[('all', '')].closed == 1
+    assert groups[('all', '')].closed_on_time == 0
+
+
+@pytest.mark.django_db
+def test_incremental_run_matches_full_rebuild(defect, project, engineer):
+    other = Defect.objects.create(
+        project=project,
+        title='Скол',
+        description='...',
+        priority=Defect.Priority.LOW,
+        status=S.NEW,
+        deadline=dt.date(2025, 6, 1),
+        executor=engineer,
+    )
+    created(defect)
+    moved(defect, 5, S.NEW, S.IN_PROGRESS)
+    created(other, 1)
+
+    _, processed = update_sla_report()
+    assert processed > 0
+
+    # Новые события продолжают уже учтённые ленты
+    moved(defect, 10, S.IN_PROGRESS, S.CLOSED)
+    moved(other, 12, S.NEW, S.CANCELLED)
+    update_sla_report()
+    incremental = load_sla_report()
+
+    full, _ = update_sla_report(full=True)
+    assert {k: g.to_dict() for k, g in incremental.items()} == {k: g.to_dict() for k, g in full.items()}
+    assert full[('all', '')].time_in_status[S.NEW].count == 2
+    assert full[('all', '')].closed == 1
+
+    _, processed = update_sla_report()
+    assert processed == 0
+    assert ReportState.objects.get(name='sla').watermark == DefectHistory.objects.latest('id').id
+
+
+@pytest.mark.django_db
+def test_event_committed_below_watermark_is_counted(defect, project):
+    other = Defect.objects.create(project=project, title='Скол', description='...', status=S.NEW, deadline=dt.date(2025, 6, 1))
+    created(defect)
+    created(other, 1)
+    late = moved(defect, 5, S.NEW, S.CLOSED)
+    moved(other, 6, S.NEW, S.IN_PROGRESS)
+    # Транзакция с меньшим id ещё не закоммичена, когда отчёт продвигает водяной знак
+    late_id, late_created = late.id, T0 + dt.timedelta(hours=5)
+    late.delete()
+    update_sla_report()
+    report = ReportState.objects.get(name='sla')
+    assert report.watermark > late_id
+    assert report.pending_ids == [late_id]
+
+    DefectHistory.objects.create(
+        id=late_id,
+        defect=defect,
+        action='status_changed',
+        changes={'status': {'from': S.NEW.label, 'to': S.CLOSED.label}},
+    )
+    DefectHistory.objects.filter(pk=late_id).update(created_at=late_created)
+    _, processed = update_sla_report()
+    assert processed == 1
+    assert ReportState.objects.get(name='sla').pending_ids == []
+    incremental = load_sla_report()
+    assert incremental[('all', '')].closed == 1
+
+    full, _ = update_sla_report(full=True)
+    assert {k: g.to_dict() for k, g in incremental.items()} == {k: g.to_dict() for k, g in full.items()}
+
+
+@pytest.mark.django_db
+def test_build_sla_report_command(defect, capsys):
+    created(defect)
+    moved(defect, 3, S.NEW, S.CLOSED)
+    call_command('build_sla_report', '--group', 'project')
+    out = capsys.readouterr().out
+    assert defect.project.name in out
+    assert 'time_to_close' in out
+    assert '100%' in out
@@ -0,0 +1,104 @@
+import runpy
+from pathlib import Path
+
+import pytest
+from django.db import OperationalError, transaction
+from django.db.utils import ConnectionHandler
+from django.urls import reverse
+
+from defects import views
+from defects.locking import retry_on_lock
+from defects.models import Comment
+
+SETTINGS_FILE = Path(__file__).resolve().parent.parent / 'sistemakontrol' / 'settings.py'
+
+
+def flaky(failures, exc=None):
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise exc or OperationalError('database is locked')
+        return 'ok'
+
+    return func, calls
+
+
+def test_retry_on_lock_retries_lock_errors():
+    func, calls = flaky(2)
+    assert retry_on_lock(attempts=3, delay=0)(func)() == 'ok'
+    assert len(calls) == 3
+
+
+def test_retry_on_lock_is_bounded():
+    func, calls = flaky(10)
+    with pytest.raises(OperationalError, match='locked'):
+        retry_on_lock(attempts=2, delay=0)(func)()
+    assert len(calls) == 3
+
+
+def test_retry_on_lock_ignores_other_errors():
+    func, calls = flaky(1, OperationalError('no such table: defects_defect'))
+    with pytest.raises(OperationalError, match='no such table'):
+        retry_on_lock(attempts=3, delay=0)(func)()
+    assert len(calls) == 1
+
+
+@pytest.mark.django_db
+def test_retry_on_lock_does_not_retry_inside_outer_transaction():
+    func, calls = flaky(1)
+    with transaction.atomic(), pytest.raises(OperationalError):
+        retry_on_lock(attempts=3, delay=0)(func)()
+    assert len(calls) == 1
+
+
+# Повтор возможен только вне внешней транзакции теста
+@pytest.mark.django_db(transaction=True)
+def test_comment_view_retries_whole_transaction(client, engineer, defect, monkeypatch, settings):
+    settings.SQLITE_LOCK_RETRY_DELAY = 0
+    original = views.log_defect_event
+    calls = []
+
+    def locked_once(**kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise OperationalError('database is locked')
+        return original(**kwargs)
+
+    monkeypatch.setattr(views, 'log_defect_event', locked_once)
+    client.force_login(engineer)
+    response = client.post(reverse('defect_add_comment', args=[defect.pk]), {'text': 'Проверено'})
+
+    assert response.status_code == 302
+    assert len(calls) == 2
+    # Комментарий первой попытки откатился вместе с транзакцией
+    assert list(Comment.objects.values_list('text', flat=True)) == ['Проверено']
+
+
+def test_sqlite_production_profile_applies_pragmas(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLITE_PRODUCTION', '1')
+    monkeypatch.setenv('SQLITE_BUSY_TIMEOUT_MS', '7000')
+    monkeypatch.delenv('POSTGRES_HOST', raising=False)
+    database = runpy.run_path(str(SETTINGS_FILE))['DATABASES']['default']
+    database['NAME'] = tmp_path / 'profile.sqlite3'
+
+    wrapper = ConnectionHandler({'default': database})['default']
+    # Сырое соединение с теми же init_command, что открывает Django
+    raw = wrapper.get_new_connection(wrapper.get_connection_params())
+    assert wrapper.transaction_mode == 'IMMEDIATE'
+    try:
+        pragmas = {
+            name: raw.execute(f'PRAGMA {name}').fetchone()[0]
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size')
+        }
+    finally:
+        raw.close()
+
+    assert pragmas == {
+        'journal_mode': 'wal',
+        'synchronous': 1,
+        'busy_timeout': 7000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -65536,
+    }